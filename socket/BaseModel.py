@@ -5,6 +5,7 @@ from configparser import ConfigParser
 
 import peewee
 
+from CardBytes import CARD_COLUMN_TYPES, decode_cards, encode_cards
 from CardCollection import CardCollection
 
 parser = ConfigParser()
@@ -12,6 +13,13 @@ parser = ConfigParser()
 # parser.read('database_test.ini')
 parser.read("database.ini")
 postgres_args = dict(parser.items("postgresql"))
+# How card lists are stored. Deployments can switch to the smaller binary columns by adding
+#   [cards]
+#   encoding = binary
+# to database.ini and running MigrateCardLists.py
+CARD_ENCODING = parser.get("cards", "encoding", fallback="json")
+if CARD_ENCODING not in CARD_COLUMN_TYPES:
+    raise Exception(f"Unknown card encoding {CARD_ENCODING}! Use one of {list(CARD_COLUMN_TYPES)}")
 db = peewee.PostgresqlDatabase(**postgres_args)
 
 # Create game types
@@ -40,13 +48,25 @@ class StringListField(peewee.Field):
         return json.dumps(value)
 
 
-class CardListField(peewee.Field):
+class IntListField(peewee.Field):
     field_type = "json"
 
-    def db_value(self, value: CardCollection) -> str:
+    def db_value(self, value: list[int] | None) -> str | None:
+        return None if value is None else json.dumps(list(value))
+
+
+class CardListField(peewee.Field):
+    field_type = CARD_COLUMN_TYPES[CARD_ENCODING]
+
+    def db_value(self, value: CardCollection) -> str | bytes:
+        if CARD_ENCODING == "binary":
+            return encode_cards(value)
         return value.to_json()
 
-    def python_value(self, value: list[dict[str:str]]) -> CardCollection:
+    def python_value(self, value: list[dict[str:str]] | memoryview | bytes) -> CardCollection:
+        # Either encoding can be read so rows can be loaded while a migration is running
+        if isinstance(value, (memoryview, bytes)):
+            return decode_cards(value)
         return CardCollection.from_json_dict(value)
 
 
@@ -0,0 +1,252 @@
+"""
+A reproducible benchmark of the phase-matching engine. For every phase, it deals seeded random hands of every size
+and times building the automaton, isFullyAccepted, isSubsetAccepted, and score. The results are written as JSON so
+that runs on different commits can be compared, along with a table of the latencies and search nodes.
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+
+import numpy as np
+
+from Card import Card, SKIP_CODE, WILD_CODE
+from CardCollection import CardCollection
+from RE import DEFAULT_PHASE_LIST, RE, SCORE_METHODS, SUBSET_METHODS, print_rows, search_stats
+
+# Phases that are much harder than any in DEFAULT_PHASE_LIST
+STRESS_PHASES = ["S3+S3+R7+C4", "S5+S5", "R4+S4+C4"]
+DEFAULT_SEED = 0
+DEFAULT_HANDS = 20
+DEFAULT_MIN_SIZE = 1
+DEFAULT_MAX_SIZE = 15
+DEFAULT_WILD_DENSITY = 0.08
+DEFAULT_SKIP_DENSITY = 0.04
+# The number of times each automaton is built
+DEFAULT_BUILDS = 3
+# A deck has 8 wilds and 4 skips
+_MAX_WILDS = 8
+_MAX_SKIPS = 4
+
+
+def random_hands(
+    rng: random.Random, num_hands: int, size: int, wild_density: float, skip_density: float
+) -> list[CardCollection]:
+    """
+    :param rng: the random number generator
+    :type rng: random.Random
+    :param num_hands: the number of hands
+    :type num_hands: int
+    :param size: the number of cards in each hand
+    :type size: int
+    :param wild_density: the chance that each card is a wild
+    :type wild_density: float
+    :param skip_density: the chance that each card is a skip
+    :type skip_density: float
+    :return: hands drawn from a single deck each. Every card is a wild or a skip with the given chances (as far as the
+    deck allows) and a regular card otherwise
+    :rtype: list[CardCollection]
+    """
+    regular = [card for card in CardCollection.getNewDeck() if card.code < WILD_CODE]
+    hands = []
+    for _ in range(num_hands):
+        num_wilds = min(_MAX_WILDS, sum(rng.random() < wild_density for _ in range(size)))
+        num_skips = min(_MAX_SKIPS, sum(rng.random() < skip_density for _ in range(size - num_wilds)))
+        cards = rng.sample(regular, size - num_wilds - num_skips)
+        cards += [Card.from_code(WILD_CODE) for _ in range(num_wilds)]
+        cards += [Card.from_code(SKIP_CODE) for _ in range(num_skips)]
+        rng.shuffle(cards)
+        hands.append(CardCollection(cards))
+    return hands
+
+
+def _timed(operation, *args) -> tuple[float, int]:
+    # The seconds a call took and the search nodes it explored
+    before = search_stats.snapshot()["nodes"]
+    start = time.perf_counter()
+    operation(*args)
+    return time.perf_counter() - start, search_stats.snapshot()["nodes"] - before
+
+
+def build_table(phase: str) -> RE:
+    """
+    :param phase: the phase
+    :type phase: str
+    :return: the phase compiled for the table backend, which is what the build rows time
+    :rtype: RE
+    :raises Exception: if the phase wasn't compiled to a table
+    """
+    rr = RE(phase, backend="table")
+    if rr.backend != "table" or rr.table is None:
+        raise Exception(f"{phase} wasn't compiled to a table!")
+    return rr
+
+
+def _summarize(phase: str, operation: str, samples: list[tuple[float, int]]) -> dict:
+    seconds = np.array([s for s, _ in samples]) * 1e6
+    nodes = np.array([n for _, n in samples])
+    return {
+        "phase": phase,
+        "operation": operation,
+        "calls": len(samples),
+        "p50_us": round(float(np.percentile(seconds, 50)), 1),
+        "p95_us": round(float(np.percentile(seconds, 95)), 1),
+        "max_us": round(float(seconds.max()), 1),
+        "p50_nodes": int(np.percentile(nodes, 50)),
+        "p95_nodes": int(np.percentile(nodes, 95)),
+        "max_nodes": int(nodes.max()),
+    }
+
+
+def run_benchmark(
+    phase_list: list[str],
+    seed: int = DEFAULT_SEED,
+    num_hands: int = DEFAULT_HANDS,
+    sizes: range = range(DEFAULT_MIN_SIZE, DEFAULT_MAX_SIZE + 1),
+    wild_density: float = DEFAULT_WILD_DENSITY,
+    skip_density: float = DEFAULT_SKIP_DENSITY,
+    score_methods: tuple[str, ...] = ("histogram",),
+    subset_methods: tuple[str, ...] = ("histogram",),
+    builds: int = DEFAULT_BUILDS,
+) -> list[dict]:
+    """
+    Time the phase-matching engine on seeded random hands
+    The cache of matched hands is cleared before every call so that each one does the full search
+
+    :param phase_list: the phases to benchmark
+    :type phase_list: list[str]
+    :param seed: the seed of the random hands
+    :type seed: int
+    :param num_hands: the number of hands of each size
+    :type num_hands: int
+    :param sizes: the sizes of the hands
+    :type sizes: range
+    :param wild_density: the chance that each card is a wild
+    :type wild_density: float
+    :param skip_density: the chance that each card is a skip
+    :type skip_density: float
+    :param score_methods: the score methods to time (see SCORE_METHODS)
+    :type score_methods: tuple[str, ...]
+    :param subset_methods: the isSubsetAccepted methods to time (see SUBSET_METHODS)
+    :type subset_methods: tuple[str, ...]
+    :param builds: the number of times to build each automaton
+    :type builds: int
+    :return: one row of latencies and search nodes per phase and operation
+    :rtype: list[dict]
+    """
+    rows = []
+    for phase in phase_list:
+        # Every phase gets the same hands no matter which phases come before it
+        rng = random.Random(f"{seed}:{phase}")
+        hands = [hand for size in sizes for hand in random_hands(rng, num_hands, size, wild_density, skip_density)]
+
+        rows.append(_summarize(phase, "build", [_timed(build_table, phase) for _ in range(builds)]))
+        rr = build_table(phase)
+
+        rows.append(_summarize(phase, "isFullyAccepted", [_timed(rr.isFullyAccepted, hand) for hand in hands]))
+        for method in subset_methods:
+            samples = []
+            for hand in hands:
+                RE.clear_match_cache()
+                samples.append(_timed(rr.isSubsetAccepted, hand, method))
+            rows.append(_summarize(phase, f"isSubsetAccepted[{method}]", samples))
+        for method in score_methods:
+            samples = []
+            for hand in hands:
+                RE.clear_match_cache()
+                samples.append(_timed(rr.score, hand, method))
+            rows.append(_summarize(phase, f"score[{method}]", samples))
+    return rows
+
+
+def _commit() -> str | None:
+    # The commit being benchmarked, if we're in a git checkout
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="Benchmark", description="Time the phase-matching engine on random hands")
+    parser.add_argument(
+        "phases",
+        nargs="*",
+        default=DEFAULT_PHASE_LIST + STRESS_PHASES,
+        help="The phases to benchmark. By default, every phase in DEFAULT_PHASE_LIST and STRESS_PHASES",
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"By default, it is set to {DEFAULT_SEED}")
+    parser.add_argument(
+        "--hands",
+        type=int,
+        default=DEFAULT_HANDS,
+        help=f"The number of hands of each size. By default, it is set to {DEFAULT_HANDS}",
+    )
+    parser.add_argument("--min-size", type=int, default=DEFAULT_MIN_SIZE, help="The smallest hand")
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_SIZE, help="The largest hand")
+    parser.add_argument(
+        "--wild-density",
+        type=float,
+        default=DEFAULT_WILD_DENSITY,
+        help=f"The chance that each card is a wild. By default, it is set to {DEFAULT_WILD_DENSITY}",
+    )
+    parser.add_argument(
+        "--skip-density",
+        type=float,
+        default=DEFAULT_SKIP_DENSITY,
+        help=f"The chance that each card is a skip. By default, it is set to {DEFAULT_SKIP_DENSITY}",
+    )
+    parser.add_argument(
+        "--score-methods",
+        nargs="+",
+        choices=SCORE_METHODS,
+        default=["histogram"],
+        help="The score methods to time. bnb can take minutes on large hands",
+    )
+    parser.add_argument(
+        "--subset-methods", nargs="+", choices=SUBSET_METHODS, default=["histogram"], help="The subset methods to time"
+    )
+    parser.add_argument(
+        "--builds",
+        type=int,
+        default=DEFAULT_BUILDS,
+        help=f"The number of times to build each automaton. By default, it is set to {DEFAULT_BUILDS}",
+    )
+    parser.add_argument("--json", metavar="FILENAME", help="Also write the results to this file")
+
+    parsed_args = parser.parse_args()
+    rows = run_benchmark(
+        parsed_args.phases,
+        seed=parsed_args.seed,
+        num_hands=parsed_args.hands,
+        sizes=range(parsed_args.min_size, parsed_args.max_size + 1),
+        wild_density=parsed_args.wild_density,
+        skip_density=parsed_args.skip_density,
+        score_methods=tuple(parsed_args.score_methods),
+        subset_methods=tuple(parsed_args.subset_methods),
+        builds=parsed_args.builds,
+    )
+
+    if parsed_args.json:
+        with open(parsed_args.json, "w") as f:
+            json.dump(
+                {
+                    "commit": _commit(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "arguments": vars(parsed_args),
+                    "results": rows,
+                },
+                f,
+                indent=2,
+            )
+
+    print_rows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -156,55 +156,178 @@ class Color(Enum):
                 raise Exception(f"{data} is not a valid color!")
 
 
-@dataclasses.dataclass(frozen=True)
+# Every kind of card has a small integer code
+# The regular cards are numbered by color and then rank (R1 is 0, R2 is 1, ..., Y12 is 47)
+# The wild and skip cards come after them
+NUM_REGULAR_RANKS = 12
+WILD_CODE = 48
+SKIP_CODE = 49
+NUM_CARD_CODES = 50
+
+
+class CardKind:
+    """
+    Everything about a card except which copy of it we have
+    There is exactly one CardKind per code and every Card with that code shares it, so cards only store a reference
+    to their kind and their id
+    """
+
+    __slots__ = ("color", "rank", "code", "name", "json")
+
+    def __init__(self, color: Color, rank: Rank, code: int):
+        object.__setattr__(self, "color", color)
+        object.__setattr__(self, "rank", rank)
+        object.__setattr__(self, "code", code)
+        object.__setattr__(self, "name", "W" if rank is Rank.WILD else "S" if rank is Rank.SKIP else f"{color}{rank}")
+        # The color and rank as they're written in JSON
+        object.__setattr__(self, "json", (str(color), str(rank)))
+
+    def __setattr__(self, key, value):
+        raise dataclasses.FrozenInstanceError(f"cannot assign to field {key!r}")
+
+    def __hash__(self):
+        return self.code
+
+    def __repr__(self):
+        return f"CardKind({self.name})"
+
+    def __reduce__(self):
+        return _kind_from_code, (self.code,)
+
+
+def _kind_code(color: Color, rank: Rank) -> int | None:
+    # The code of a valid combination of color and rank or None if the combination is invalid
+    if rank is Rank.WILD or color is Color.WILD:
+        return WILD_CODE if rank is Rank.WILD and color is Color.WILD else None
+    if rank is Rank.SKIP or color is Color.SKIP:
+        return SKIP_CODE if rank is Rank.SKIP and color is Color.SKIP else None
+    return color.value * NUM_REGULAR_RANKS + rank.value - 1
+
+
+# The kind of every code and of every valid (color, rank) and (color, rank) as written in JSON
+_KINDS: list[CardKind | None] = [None] * NUM_CARD_CODES
+_KIND_BY_PAIR: dict[tuple[Color, Rank], CardKind] = {}
+_KIND_BY_JSON: dict[tuple[str, str], CardKind] = {}
+for _color in Color:
+    for _rank in Rank:
+        _code = _kind_code(_color, _rank)
+        if _code is not None:
+            _KINDS[_code] = CardKind(_color, _rank, _code)
+            _KIND_BY_PAIR[(_color, _rank)] = _KINDS[_code]
+            _KIND_BY_JSON[_KINDS[_code].json] = _KINDS[_code]
+_KINDS: tuple[CardKind, ...] = tuple(_KINDS)
+
+
+def _kind_from_code(code: int) -> CardKind:
+    return _KINDS[code]
+
+
 class Card:
-    color: Color = dataclasses.field(default_factory=lambda: Color.WILD)
-    rank: Rank = dataclasses.field(default_factory=lambda: Rank.WILD)
-    id: str = dataclasses.field(default_factory=lambda: str(uuid.uuid4()))
-
-    def __post_init__(self):
-        if self.color is Color.WILD and self.rank is not Rank.WILD:
-            raise Exception(
-                f"Cannot create a card with color {self.color} and rank {self.rank}!"
-            )
-
-        if self.color is not Color.WILD and self.rank is Rank.WILD:
-            raise Exception(
-                f"Cannot create a card with color {self.color} and rank {self.rank}!"
-            )
-
-        if self.color is Color.SKIP and self.rank is not Rank.SKIP:
-            raise Exception(
-                f"Cannot create a card with color {self.color} and rank {self.rank}!"
-            )
-
-        if self.color is not Color.SKIP and self.rank is Rank.SKIP:
-            raise Exception(
-                f"Cannot create a card with color {self.color} and rank {self.rank}!"
-            )
+    """
+    One physical card. Cards are immutable and compare equal when they have the same color and rank, no matter their
+    id
+    """
+
+    __slots__ = ("kind", "_id")
+
+    def __init__(self, color: Color = Color.WILD, rank: Rank = Rank.WILD, id: int | str | None = None):
+        """
+        :param color: the color of the card
+        :type color: Color
+        :param rank: the rank of the card
+        :type rank: Rank
+        :param id: the id of the card. Cards dealt from a deck are numbered by their position in the new deck.
+        A random one is generated the first time it's needed if this is None
+        :type id: int | str | None
+        :raises Exception: if a wild or skip card is given a different rank or color
+        """
+        kind = _KIND_BY_PAIR.get((color, rank))
+        if kind is None:
+            raise Exception(f"Cannot create a card with color {color} and rank {rank}!")
+        object.__setattr__(self, "kind", kind)
+        object.__setattr__(self, "_id", id)
+
+    @classmethod
+    def _make(cls, kind: CardKind, card_id: int | str | None):
+        # Create a card of a kind we've already looked up
+        card = object.__new__(cls)
+        object.__setattr__(card, "kind", kind)
+        object.__setattr__(card, "_id", card_id)
+        return card
+
+    def __setattr__(self, key, value):
+        raise dataclasses.FrozenInstanceError(f"cannot assign to field {key!r}")
+
+    def __delattr__(self, key):
+        raise dataclasses.FrozenInstanceError(f"cannot delete field {key!r}")
+
+    def __reduce__(self):
+        return Card._make, (self.kind, self.id)
+
+    @property
+    def color(self) -> Color:
+        return self.kind.color
+
+    @property
+    def rank(self) -> Rank:
+        return self.kind.rank
+
+    @property
+    def id(self) -> int | str:
+        """
+        :return: the id of this copy of the card. Cards dealt from a deck have an integer id and other cards (including
+        the ones stored before decks were numbered) have a string
+        :rtype: int | str
+        """
+        if self._id is None:
+            object.__setattr__(self, "_id", str(uuid.uuid4()))
+        return self._id
 
     def __eq__(self, other):
         if isinstance(other, Card):
-            return self.rank is other.rank and self.color is other.color
+            return self.kind is other.kind
         else:
             raise Exception(f"Cannot compare card with type {type(other)}")
 
     def __hash__(self):
-        return self.rank.value * len(Rank) + self.color.value
+        return self.kind.code
 
-    def __str__(self):
-        if self.color is Color.WILD and self.rank is Rank.WILD:
-            return "W"
-        if self.color is Color.SKIP and self.rank is Rank.SKIP:
-            return "S"
+    def __repr__(self):
+        return f"Card(color={self.kind.color!r}, rank={self.kind.rank!r}, id={self.id!r})"
 
-        return f"{self.color}{self.rank}"
+    @property
+    def code(self) -> int:
+        """
+        :return: the integer code of this kind of card. Cards with the same color and rank share the same code
+        :rtype: int
+        """
+        return self.kind.code
+
+    @staticmethod
+    def from_code(code: int, card_id: int | str | None = None):
+        """
+        Create a card from its integer code
+
+        :param code: the code of the card
+        :type code: int
+        :param card_id: the id of the new card. A random one is generated if this is None
+        :type card_id: int | str | None
+        :return: the card with the given code
+        :rtype: Card
+        """
+        if not 0 <= code < NUM_CARD_CODES:
+            raise Exception(f"{code} is not a valid card code!")
+        return Card._make(_KINDS[code], card_id)
+
+    def __str__(self):
+        return self.kind.name
 
     def toJSON(self):
         return json.dumps(self.to_json_dict())
 
     def to_json_dict(self):
-        return {"color": str(self.color), "rank": str(self.rank), "id": self.id}
+        (color, rank) = self.kind.json
+        return {"color": color, "rank": rank, "id": self.id}
 
     @staticmethod
     def fromJSON(data):
@@ -214,9 +337,26 @@ class Card:
 
     @staticmethod
     def fromJSONDict(data):
-        return Card(
-            Color.fromJSON(data["color"]), Rank.fromJSON(data["rank"]), data["id"]
-        )
+        kind = _KIND_BY_JSON.get((data["color"], data["rank"]))
+        if kind is None:
+            # Let Color, Rank, and Card explain what's wrong
+            return Card(Color.fromJSON(data["color"]), Rank.fromJSON(data["rank"]), Card.normalize_id(data["id"]))
+        return Card._make(kind, Card.normalize_id(data["id"]))
+
+    @staticmethod
+    def normalize_id(card_id: int | str) -> int | str:
+        """
+        Clients that predate numbered decks send every id as a string, so ids like "17" are turned back into integers.
+        Any other string (such as the uuid of a card stored before decks were numbered) is kept as it is
+
+        :param card_id: the id as it was received
+        :type card_id: int | str
+        :return: the id as the server stores it
+        :rtype: int | str
+        """
+        if isinstance(card_id, str) and card_id.isdecimal():
+            return int(card_id)
+        return card_id
 
     @staticmethod
     def from_string(data):
@@ -0,0 +1,156 @@
+import array
+from typing import Iterable, Iterator, Self
+
+import numpy as np
+
+from Card import Card, NUM_CARD_CODES, NUM_REGULAR_RANKS, WILD_CODE
+from CardCollection import CardCollection, DECK_SIZE
+from CardSet import MAX_DECK_ID, deck_card, is_deck_card
+from PhaseSolver import NUM_REGULAR_COLORS
+
+# The code of the card at each position of a new deck as an array so that ids can be turned into codes all at once
+_DECK_LAYOUT = np.array([card.code for card in CardCollection.getNewDeck()], dtype=np.uint8)
+# Ids are stored as unsigned 16 bit numbers, which every id is_deck_card accepts fits in
+_TYPECODE = "H"
+assert MAX_DECK_ID <= 1 << 8 * array.array(_TYPECODE).itemsize
+
+
+class CardArray:
+    """
+    An immutable sequence of cards dealt from numbered decks, stored as an array of their ids
+    Slicing returns a view of the same buffer and concatenating copies the ids without creating any Card objects.
+    The cards themselves are only looked up when they're read, and the codes of the whole sequence can be read as a
+    NumPy array to count ranks and colors. Use to_collection to get the list form back
+    """
+
+    __slots__ = ("_ids", "_start", "_stop")
+
+    def __init__(self, cards: Iterable[Card] = ()):
+        """
+        :param cards: the cards. They must all come from CardCollection.getNewDeck
+        :type cards: Iterable[Card]
+        :raises ValueError: if a card doesn't have a deck id
+        """
+        ids = array.array(_TYPECODE)
+        for card in cards:
+            if not is_deck_card(card):
+                raise ValueError(f"{card} with id {card.id!r} wasn't dealt from a numbered deck!")
+            ids.append(card.id)
+        self._ids = ids
+        self._start = 0
+        self._stop = len(ids)
+
+    @classmethod
+    def _view(cls, ids: array.array, start: int, stop: int) -> Self:
+        view = cls.__new__(cls)
+        view._ids = ids
+        view._start = start
+        view._stop = stop
+        return view
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[int] | np.ndarray) -> Self:
+        """
+        :param ids: the ids given to the cards by CardCollection.getNewDeck
+        :type ids: Iterable[int] | np.ndarray
+        :return: the cards with those ids
+        :rtype: CardArray
+        :raises ValueError: if an id isn't one that a numbered deck has
+        """
+        if isinstance(ids, np.ndarray):
+            # Checked and copied all at once instead of one id at a time
+            bad = (ids < 0) | (ids >= MAX_DECK_ID)
+            if bad.any():
+                raise ValueError(f"There is no card with id {ids[bad.argmax()]} in a numbered deck!")
+            ids = array.array(_TYPECODE, ids.astype(np.uint16).tobytes())
+            return cls._view(ids, 0, len(ids))
+        ids = list(ids)
+        for card_id in ids:
+            if not 0 <= card_id < MAX_DECK_ID:
+                raise ValueError(f"There is no card with id {card_id} in a numbered deck!")
+        ids = array.array(_TYPECODE, ids)
+        return cls._view(ids, 0, len(ids))
+
+    def ids(self) -> memoryview:
+        """
+        :return: the ids of the cards without copying them
+        :rtype: memoryview
+        """
+        return memoryview(self._ids)[self._start: self._stop]
+
+    def codes(self) -> np.ndarray:
+        """
+        :return: the code of every card
+        :rtype: np.ndarray
+        """
+        ids = np.frombuffer(self._ids, dtype=np.uint16)[self._start: self._stop]
+        return _DECK_LAYOUT[ids % DECK_SIZE]
+
+    def code_counts(self) -> np.ndarray:
+        """
+        :return: the number of cards of each code
+        :rtype: np.ndarray
+        """
+        return np.bincount(self.codes(), minlength=NUM_CARD_CODES)
+
+    def rank_histogram(self) -> np.ndarray:
+        """
+        :return: the number of regular cards of each rank. This is the same as PhaseSolver.rank_histogram
+        :rtype: np.ndarray
+        """
+        return self.code_counts()[:WILD_CODE].reshape(NUM_REGULAR_COLORS, NUM_REGULAR_RANKS).sum(axis=0)
+
+    def color_histogram(self) -> np.ndarray:
+        """
+        :return: the number of regular cards of each color. This is the same as PhaseSolver.color_histogram
+        :rtype: np.ndarray
+        """
+        return self.code_counts()[:WILD_CODE].reshape(NUM_REGULAR_COLORS, NUM_REGULAR_RANKS).sum(axis=1)
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __iter__(self) -> Iterator[Card]:
+        ids = self._ids
+        for i in range(self._start, self._stop):
+            yield deck_card(ids[i])
+
+    def __getitem__(self, index: int | slice) -> Card | Self:
+        if isinstance(index, slice):
+            (start, stop, step) = index.indices(len(self))
+            if step == 1:
+                return CardArray._view(self._ids, self._start + start, self._start + max(start, stop))
+            return CardArray._view(self._ids[self._start: self._stop][index], 0, len(range(start, stop, step)))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("CardArray index out of range")
+        return deck_card(self._ids[self._start + index])
+
+    def __add__(self, other: Iterable[Card]) -> Self:
+        if not isinstance(other, CardArray):
+            other = CardArray(other)
+        ids = self._ids[self._start: self._stop]
+        ids.extend(other._ids[other._start: other._stop])
+        return CardArray._view(ids, 0, len(ids))
+
+    def __eq__(self, other):
+        # Like CardCollection, two sequences are equal if their cards have the same colors and ranks in the same order
+        if isinstance(other, CardArray):
+            return len(self) == len(other) and bool(np.array_equal(self.codes(), other.codes()))
+        if isinstance(other, CardCollection):
+            return self.to_collection() == other
+        raise Exception(f"Cannot compare CardArray with item of type {type(other)}!")
+
+    def __str__(self):
+        return f"{[str(c) for c in self]}"
+
+    def to_collection(self) -> CardCollection:
+        """
+        :return: the cards as a CardCollection
+        :rtype: CardCollection
+        """
+        return CardCollection(self)
+
+    def to_json_dict(self):
+        return [card.to_json_dict() for card in self]
@@ -0,0 +1,149 @@
+"""
+A compact binary form of a card list for bytea columns
+The first byte is the version of the format. Every card follows as a byte with its code, and the top bits of that byte
+say how its id is stored:
+    no flag     the id is a number below MAX_DECK_ID, stored in the next 2 bytes (little endian)
+    _UUID_ID    the id is a uuid, stored in the next 16 bytes
+    _TEXT_ID    any other id (negative ids can't be stored), stored as its length in the next 2 bytes followed by its UTF-8 text
+Cards dealt from numbered decks take 3 bytes each, so a full deck takes 325 bytes instead of about 4 KB of JSON
+"""
+
+import struct
+import uuid
+from typing import Iterable
+
+import numpy as np
+
+from Card import Card, NUM_CARD_CODES
+from CardArray import CardArray
+from CardCollection import CardCollection
+from CardSet import MAX_DECK_ID, deck_card, deck_code
+
+CARD_BYTES_VERSION = 1
+# The column type used for card lists in each encoding. database.ini picks one in its cards section
+CARD_COLUMN_TYPES = {"json": "json", "binary": "bytea"}
+_UUID_ID = 0x40
+_TEXT_ID = 0x80
+_CODE_MASK = 0x3F
+_NUMBERED = struct.Struct("<BH")
+_LENGTH = struct.Struct("<H")
+# The same layout as _NUMBERED so that a list of numbered cards can be read as an array without unpacking it
+_NUMBERED_ARRAY = np.dtype([("code", "u1"), ("id", "<u2")])
+
+
+def encode_cards(cards: Iterable[Card]) -> bytes:
+    """
+    :param cards: the cards to encode
+    :type cards: Iterable[Card]
+    :return: the cards in the binary format
+    :rtype: bytes
+    :raises ValueError: if a card has a negative id. It would be stored as text and read back as a string
+    """
+    data = bytearray([CARD_BYTES_VERSION])
+    for card in cards:
+        card_id = card.id
+        if type(card_id) is int:
+            if card_id < 0:
+                raise ValueError(f"{card} has the negative id {card_id}!")
+            if card_id < MAX_DECK_ID:
+                data += _NUMBERED.pack(card.code, card_id)
+                continue
+        card_id = str(card_id)
+        try:
+            uuid_bytes = uuid.UUID(card_id).bytes
+        except ValueError:
+            uuid_bytes = None
+        if uuid_bytes is not None and str(uuid.UUID(bytes=uuid_bytes)) == card_id:
+            data.append(card.code | _UUID_ID)
+            data += uuid_bytes
+        else:
+            text = card_id.encode()
+            data.append(card.code | _TEXT_ID)
+            data += _LENGTH.pack(len(text))
+            data += text
+    return bytes(data)
+
+
+def _numbered_card(code: int, card_id: int) -> Card:
+    if card_id >= MAX_DECK_ID:
+        raise ValueError(f"The card id {card_id} is too large for a numbered card!")
+    # Cards are immutable, so cards with the id and code a new deck gives them can be shared instead of created
+    if deck_code(card_id) == code:
+        return deck_card(card_id)
+    return Card.from_code(code, card_id)
+
+
+def _check_version(data: bytes):
+    if not data or data[0] != CARD_BYTES_VERSION:
+        raise ValueError(f"Unknown card list version {data[:1]!r}!")
+
+
+def decode_card_array(data: bytes | memoryview) -> CardArray | None:
+    """
+    Read a list of cards dealt from numbered decks without creating any Card objects. Use this when only the length,
+    codes, or counts of the cards are needed
+
+    :param data: cards encoded by encode_cards
+    :type data: bytes | memoryview
+    :return: the cards, or None if one of them isn't a card that a numbered deck has. decode_cards reads those
+    :rtype: CardArray | None
+    :raises ValueError: if the data is in an unknown version
+    """
+    data = bytes(data)
+    _check_version(data)
+    if (len(data) - 1) % _NUMBERED.size:
+        return None
+    cards = np.frombuffer(data, dtype=_NUMBERED_ARRAY, offset=1)
+    ids = cards["id"]
+    # A card with another kind of id has a flag set in its code byte, so its code can't match the one in the deck
+    if (ids >= MAX_DECK_ID).any():
+        return None
+    card_array = CardArray.from_ids(ids)
+    if not np.array_equal(card_array.codes(), cards["code"]):
+        return None
+    return card_array
+
+
+def decode_cards(data: bytes | memoryview) -> CardCollection:
+    """
+    :param data: cards encoded by encode_cards
+    :type data: bytes | memoryview
+    :return: the cards
+    :rtype: CardCollection
+    :raises ValueError: if the data is in an unknown version, is cut short, or has an id no numbered card can have
+    """
+    data = bytes(data)
+    card_array = decode_card_array(data)
+    if card_array is not None:
+        return card_array.to_collection()
+
+    # Numbered cards whose codes were changed are read in one pass. If a card has another kind of id, its code byte
+    # has a flag set, and it lands on a position checked here because every card before it is 3 bytes long
+    if (len(data) - 1) % _NUMBERED.size == 0 and all(b < NUM_CARD_CODES for b in data[1::_NUMBERED.size]):
+        return CardCollection(_numbered_card(code, card_id) for code, card_id in _NUMBERED.iter_unpack(data[1:]))
+
+    cards = CardCollection()
+    i = 1
+    try:
+        while i < len(data):
+            kind = data[i]
+            code = kind & _CODE_MASK
+            if code >= NUM_CARD_CODES:
+                raise ValueError(f"Unknown card code {code}!")
+            if kind & _UUID_ID:
+                cards.append(Card.from_code(code, str(uuid.UUID(bytes=data[i + 1: i + 17]))))
+                i += 17
+            elif kind & _TEXT_ID:
+                (length,) = _LENGTH.unpack_from(data, i + 1)
+                text = data[i + 3: i + 3 + length]
+                if len(text) != length:
+                    raise ValueError("The card list is cut short!")
+                cards.append(Card.from_code(code, Card.normalize_id(text.decode())))
+                i += 3 + length
+            else:
+                (_, card_id) = _NUMBERED.unpack_from(data, i)
+                cards.append(_numbered_card(code, card_id))
+                i += _NUMBERED.size
+    except struct.error as e:
+        raise ValueError("The card list is cut short!") from e
+    return cards
@@ -3,6 +3,11 @@ from typing import Self
 
 from Card import Card, Color, Rank
 
+# The number of cards in one deck
+DECK_SIZE = 108
+# The most decks that can be shuffled together. This bounds the ids that cards dealt from numbered decks can have
+MAX_DECKS = 16
+
 
 class CardCollection(list):
     
@@ -38,22 +43,35 @@ class CardCollection(list):
         return CardCollection([Card.fromJSONDict(card) for card in data])
     
     @staticmethod
-    def getNewDeck() -> Self:
+    def getNewDeck(num_decks: int = 1) -> Self:
+        """
+        Every card is numbered by its position in the new deck, so the ids of one deck are 0 to DECK_SIZE - 1 and the
+        ids of the ith extra deck follow on from i * DECK_SIZE
+
+        :param num_decks: the number of decks shuffled together
+        :type num_decks: int
+        :return: the cards of the decks in order
+        :rtype: CardCollection
+        :raises ValueError: if num_decks is more than MAX_DECKS
+        """
+        if num_decks > MAX_DECKS:
+            raise ValueError(f"Cannot shuffle more than {MAX_DECKS} decks together!")
         deck = CardCollection()
-        for color in Color:
-            if color is Color.WILD or color is Color.SKIP:
-                continue
-            for rank in Rank:
-                if rank is Rank.WILD or rank is Rank.SKIP:
+        for _ in range(num_decks):
+            for color in Color:
+                if color is Color.WILD or color is Color.SKIP:
                     continue
-                deck.append(Card(color, rank))
-                deck.append(Card(color, rank))
-        
-        for _ in range(4):
-            deck.append(Card(Color.SKIP, Rank.SKIP))
-        
-        for _ in range(8):
-            deck.append(Card(Color.WILD, Rank.WILD))
+                for rank in Rank:
+                    if rank is Rank.WILD or rank is Rank.SKIP:
+                        continue
+                    deck.append(Card(color, rank, len(deck)))
+                    deck.append(Card(color, rank, len(deck)))
+
+            for _ in range(4):
+                deck.append(Card(Color.SKIP, Rank.SKIP, len(deck)))
+
+            for _ in range(8):
+                deck.append(Card(Color.WILD, Rank.WILD, len(deck)))
         return deck
 
 
@@ -0,0 +1,303 @@
+import functools
+from typing import Iterable, Iterator, Self
+
+from Card import Card, NUM_CARD_CODES, NUM_REGULAR_RANKS
+from CardCollection import CardCollection, DECK_SIZE, MAX_DECKS
+from PhaseSolver import NUM_REGULAR_COLORS
+
+# The code of the card at each position of a new deck (see CardCollection.getNewDeck)
+_DECK_LAYOUT = tuple(card.code for card in CardCollection.getNewDeck())
+# One more than the highest id a card dealt from numbered decks can have
+MAX_DECK_ID = MAX_DECKS * DECK_SIZE
+# One shared card per id. Cards are immutable, so every hand holding the card with a given id can use the same object
+_deck_cards: list[Card] = []
+
+
+def deck_code(card_id: int) -> int:
+    """
+    :param card_id: the id given to a card by CardCollection.getNewDeck
+    :type card_id: int
+    :return: the code of the card with that id
+    :rtype: int
+    """
+    return _DECK_LAYOUT[card_id % DECK_SIZE]
+
+
+def deck_card(card_id: int) -> Card:
+    """
+    :param card_id: the id given to a card by CardCollection.getNewDeck
+    :type card_id: int
+    :return: the card with that id
+    :rtype: Card
+    :raises ValueError: if no numbered deck has a card with that id
+    """
+    if not 0 <= card_id < MAX_DECK_ID:
+        raise ValueError(f"There is no card with id {card_id} in {MAX_DECKS} decks!")
+    while len(_deck_cards) <= card_id:
+        _deck_cards.append(Card.from_code(deck_code(len(_deck_cards)), len(_deck_cards)))
+    return _deck_cards[card_id]
+
+
+def is_deck_card(card: Card) -> bool:
+    """
+    :return: if the card has the id and code that CardCollection.getNewDeck would give it
+    :rtype: bool
+    """
+    card_id = card.id
+    return type(card_id) is int and 0 <= card_id < MAX_DECK_ID and deck_code(card_id) == card.code
+
+
+@functools.cache
+def _code_masks(num_decks: int) -> tuple[int, ...]:
+    # The ids of the cards with each code in num_decks decks as bitmasks
+    masks = [0] * NUM_CARD_CODES
+    for card_id in range(num_decks * DECK_SIZE):
+        masks[deck_code(card_id)] |= 1 << card_id
+    return tuple(masks)
+
+
+@functools.cache
+def _rank_masks(num_decks: int) -> tuple[int, ...]:
+    code_masks = _code_masks(num_decks)
+    return tuple(
+        functools.reduce(int.__or__, (code_masks[c * NUM_REGULAR_RANKS + r] for c in range(NUM_REGULAR_COLORS)))
+        for r in range(NUM_REGULAR_RANKS)
+    )
+
+
+@functools.cache
+def _color_masks(num_decks: int) -> tuple[int, ...]:
+    code_masks = _code_masks(num_decks)
+    return tuple(
+        functools.reduce(int.__or__, code_masks[c * NUM_REGULAR_RANKS: (c + 1) * NUM_REGULAR_RANKS])
+        for c in range(NUM_REGULAR_COLORS)
+    )
+
+
+class CardSet:
+    """
+    A collection of cards dealt from numbered decks, stored as a bitmask of their ids
+    Bit i of mask is set if the card with id i is in the collection, so checking, adding, and removing a card is a
+    single bit operation and copies only copy an integer and a list. The codes of the cards follow from their ids, so
+    the rank and color histograms used by the matcher are popcounts of the mask. The order the cards were added in is
+    kept for displaying the hand. Removed ids are only dropped from the order once enough of them pile up
+    """
+
+    __slots__ = ("mask", "_order", "_stale")
+
+    def __init__(self, cards: Iterable[Card] = ()):
+        """
+        :param cards: the cards to start with. They must all come from CardCollection.getNewDeck
+        :type cards: Iterable[Card]
+        :raises ValueError: if a card doesn't have a deck id or appears twice
+        """
+        self.mask = 0
+        self._order: list[int] = []
+        # The ids in _order which have since been removed
+        self._stale = 0
+        for card in cards:
+            self.add(card)
+
+    @staticmethod
+    def supports(cards: Iterable[Card]) -> bool:
+        """
+        :param cards: a collection of cards
+        :type cards: Iterable[Card]
+        :return: if the cards can be put in a CardSet. Cards stored before decks were numbered have uuid ids and can't
+        :rtype: bool
+        """
+        return all(is_deck_card(card) for card in cards)
+
+    def copy(self) -> Self:
+        """
+        :return: an independent copy of the collection
+        :rtype: CardSet
+        """
+        other = CardSet.__new__(CardSet)
+        other.mask = self.mask
+        other._order = list(self._order)
+        other._stale = self._stale
+        return other
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def __iter__(self) -> Iterator[Card]:
+        mask = self.mask
+        for card_id in self._order:
+            if mask >> card_id & 1:
+                yield deck_card(card_id)
+
+    def __contains__(self, card: Card) -> bool:
+        return is_deck_card(card) and self.contains_id(card.id)
+
+    def contains_id(self, card_id: int) -> bool:
+        """
+        :param card_id: the id of a card
+        :type card_id: int
+        :return: if the card with that id is in the collection
+        :rtype: bool
+        """
+        return type(card_id) is int and 0 <= card_id < MAX_DECK_ID and self.mask >> card_id & 1 == 1
+
+    def add(self, card: Card):
+        """
+        :param card: the card to add at the end
+        :type card: Card
+        :raises ValueError: if the card doesn't have a deck id or is already in the collection
+        """
+        if not is_deck_card(card):
+            raise ValueError(f"{card} with id {card.id!r} wasn't dealt from a numbered deck!")
+        bit = 1 << card.id
+        if self.mask & bit:
+            raise ValueError(f"{card} with id {card.id} is already in the collection!")
+        if self._stale & bit:
+            # The id is still somewhere in the order, so drop every removed id before adding it again
+            self._compact()
+        self.mask |= bit
+        self._order.append(card.id)
+
+    def remove_id(self, card_id: int) -> Card:
+        """
+        :param card_id: the id of the card to remove
+        :type card_id: int
+        :return: the removed card
+        :rtype: Card
+        :raises ValueError: if the card isn't in the collection
+        """
+        if not self.contains_id(card_id):
+            raise ValueError(f"The card with id {card_id} is not in the collection!")
+        self.mask &= ~(1 << card_id)
+        self._stale |= 1 << card_id
+        if self._stale.bit_count() > len(self._order) // 2:
+            self._compact()
+        return deck_card(card_id)
+
+    def remove(self, card: Card):
+        """
+        Remove a card with the same id
+
+        :param card: the card to remove
+        :type card: Card
+        :raises ValueError: if the card isn't in the collection
+        """
+        if card not in self:
+            raise ValueError(f"{card} with id {card.id!r} is not in the collection!")
+        self.remove_id(card.id)
+
+    def take(self, card: Card) -> Card | None:
+        """
+        Remove the card with the same id or, failing that, any card with the same color and rank
+
+        :param card: the card to remove
+        :type card: Card
+        :return: the removed card or None if there is no card with the same color and rank
+        :rtype: Card | None
+        """
+        if card in self:
+            return self.remove_id(card.id)
+        same_code = self.mask & self._masks(_code_masks)[card.code]
+        if not same_code:
+            return None
+        return self.remove_id((same_code & -same_code).bit_length() - 1)
+
+    def take_all(self, cards: Iterable[Card]) -> Card | None:
+        """
+        Take every card (see take) or, if one of them isn't in the collection, none of them
+
+        :param cards: the cards to remove
+        :type cards: Iterable[Card]
+        :return: the first card that isn't in the collection or None if every card was removed
+        :rtype: Card | None
+        """
+        # Removing cards only clears bits and replaces the order when compacting it, so a failed removal is undone by
+        # putting the old values back
+        (mask, stale, order) = (self.mask, self._stale, self._order)
+        for card in cards:
+            if self.take(card) is None:
+                (self.mask, self._stale, self._order) = (mask, stale, order)
+                return card
+        return None
+
+    def _compact(self):
+        mask = self.mask
+        self._order = [card_id for card_id in self._order if mask >> card_id & 1]
+        self._stale = 0
+
+    def _masks(self, masks_of) -> tuple[int, ...]:
+        # The masks for as many decks as the ids in the collection need
+        return masks_of(self.mask.bit_length() // DECK_SIZE + 1)
+
+    def code_counts(self) -> list[int]:
+        """
+        :return: the number of cards of each code
+        :rtype: list[int]
+        """
+        mask = self.mask
+        return [(mask & m).bit_count() for m in self._masks(_code_masks)]
+
+    def rank_histogram(self) -> list[int]:
+        """
+        :return: the number of regular cards of each rank. This is the same as PhaseSolver.rank_histogram
+        :rtype: list[int]
+        """
+        mask = self.mask
+        return [(mask & m).bit_count() for m in self._masks(_rank_masks)]
+
+    def color_histogram(self) -> list[int]:
+        """
+        :return: the number of regular cards of each color. This is the same as PhaseSolver.color_histogram
+        :rtype: list[int]
+        """
+        mask = self.mask
+        return [(mask & m).bit_count() for m in self._masks(_color_masks)]
+
+    def to_collection(self) -> CardCollection:
+        """
+        :return: the cards in the order they were added
+        :rtype: CardCollection
+        """
+        return CardCollection(self)
+
+    def to_json_dict(self):
+        return self.to_collection().to_json_dict()
+
+
+def remove_cards(hand: CardCollection | CardSet, cards: Iterable[Card]) -> Card | None:
+    """
+    Remove cards from a hand, preferring the copies with the same ids. Either every card is removed or, if one of them
+    isn't in the hand, the hand is left unchanged
+    A CardSet removes the cards with bit operations. Lists of cards dealt from numbered decks are checked with a
+    CardSet too. Older hands, and hands that somehow hold the same id twice, fall back to comparing the cards one by
+    one
+
+    :param hand: the hand to remove the cards from
+    :type hand: CardCollection | CardSet
+    :param cards: the cards to remove
+    :type cards: Iterable[Card]
+    :return: the first card that isn't in the hand or None if every card was removed
+    :rtype: Card | None
+    """
+    if isinstance(hand, CardSet):
+        return hand.take_all(cards)
+
+    held = None
+    if CardSet.supports(hand):
+        try:
+            held = CardSet(hand)
+        except ValueError:
+            # A duplicate id
+            held = None
+    if held is not None:
+        missing = held.take_all(cards)
+        if missing is None:
+            hand[:] = held.to_collection()
+        return missing
+
+    remaining = CardCollection(hand)
+    for card in cards:
+        if card not in remaining:
+            return card
+        remaining.remove(card)
+    hand[:] = remaining
+    return None
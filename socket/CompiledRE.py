@@ -0,0 +1,462 @@
+import array
+import collections
+import dataclasses
+import functools
+import itertools
+import struct
+import sys
+import zlib
+from typing import Self
+
+from Card import Card, NUM_CARD_CODES, NUM_REGULAR_RANKS, WILD_CODE
+from CardCollection import CardCollection
+from PhaseSolver import NUM_REGULAR_COLORS
+
+# Every card we can possibly see, indexed by its code
+_CARD_BY_CODE = tuple(Card.from_code(code, "") for code in range(NUM_CARD_CODES))
+
+BUNDLE_MAGIC = b"P10A"
+# Bump this whenever the layout of the bundle or the meaning of the states changes
+BUNDLE_VERSION = 2
+# magic, version, number of automata, crc32 of everything after the header
+_BUNDLE_HEADER = struct.Struct("<4sHHI")
+# length of the phase, number of cards in the phase, number of states, start state
+_AUTOMATON_HEADER = struct.Struct("<HHIi")
+# The longest phase (in UTF-8 bytes) that fits in the automaton header
+MAX_PHASE_BYTES = 0xFFFF
+
+
+@dataclasses.dataclass(frozen=True)
+class CompiledRE:
+    """
+    A table-driven version of the automaton built by RE
+    The states are numbered from 0 to num_states - 1 and every card is replaced with its integer code.
+    The empty transitions which connect phase components are removed ahead of time, so checking a sequence of cards
+    costs one lookup per card
+    """
+
+    phase: str
+    # The number of cards in the phase (0 if the phase has no size like R, S, or C)
+    len: int
+    num_states: int
+    start: int
+    # transitions[state * NUM_CARD_CODES + card.code] is the next state or -1 if the card is rejected
+    transitions: tuple[int, ...]
+    # final[state] indicates if we have accepted the cards once we reach this state
+    final: tuple[bool, ...]
+
+    @classmethod
+    def from_graph(cls, phase: str, length: int, start_state) -> Self:
+        """
+        Number the states of the graph built by RE and record their transitions in a flat table
+        Only the states reachable from start_state with at least one card are kept
+
+        :param phase: the phase that the graph represents
+        :type phase: str
+        :param length: the number of cards in the phase
+        :type length: int
+        :param start_state: the start state of the graph
+        :type start_state: _State
+        :return: the table-driven automaton
+        :rtype: CompiledRE
+        """
+        index = {start_state: 0}
+        state_list = [start_state]
+        transitions = []
+
+        q = collections.deque([start_state])
+        while q:
+            state = q.popleft()
+            # Follow the empty transitions so that the next card is read by the next phase component
+            closure = state
+            while closure.emptyTransition is not None:
+                closure = closure.emptyTransition
+
+            for card in _CARD_BY_CODE:
+                if not closure.isAccepted(card):
+                    transitions.append(-1)
+                    continue
+                next_state = closure.getNext(card)
+                if next_state not in index:
+                    index[next_state] = len(state_list)
+                    state_list.append(next_state)
+                    q.append(next_state)
+                transitions.append(index[next_state])
+
+        return cls(
+            phase=phase,
+            len=length,
+            num_states=len(state_list),
+            start=0,
+            transitions=tuple(transitions),
+            final=tuple(state.is_final for state in state_list),
+        )
+
+    def minimize(self) -> Self:
+        """
+        Merge the states that accept exactly the same sequences of cards using Hopcroft's partition refinement
+        The graphs built by RE have one chain of states per starting rank or color and separate chains for the wilds,
+        so many of their states are interchangeable. The result accepts the same sequences as this automaton.
+        States from which the phase can no longer be completed are removed, so run may reject a card earlier than
+        before
+
+        :return: the automaton with the fewest states
+        :rtype: CompiledRE
+        """
+        n = self.num_states
+        # Missing transitions go to an extra state which rejects everything
+        dead = n
+        transitions = list(self.transitions) + [-1] * NUM_CARD_CODES
+
+        def target(state: int, code: int) -> int:
+            next_state = transitions[state * NUM_CARD_CODES + code]
+            return dead if next_state < 0 else next_state
+
+        # inverse[code][state] lists the states which move to state on code
+        inverse = [[[] for _ in range(n + 1)] for _ in range(NUM_CARD_CODES)]
+        for state in range(n + 1):
+            for code in range(NUM_CARD_CODES):
+                inverse[code][target(state, code)].append(state)
+
+        final_states = set(s for s in range(n) if self.final[s])
+        blocks = [b for b in (final_states, set(range(n + 1)) - final_states) if b]
+        block_of = [0] * (n + 1)
+        for i, block in enumerate(blocks):
+            for state in block:
+                block_of[state] = i
+
+        waiting = set(range(len(blocks)))
+        while waiting:
+            splitter = list(blocks[waiting.pop()])
+            for code in range(NUM_CARD_CODES):
+                # Split every block by whether its states move into the splitter on code
+                touched = {}
+                for state in splitter:
+                    for source in inverse[code][state]:
+                        touched.setdefault(block_of[source], set()).add(source)
+                for b, moved in touched.items():
+                    if len(moved) == len(blocks[b]):
+                        continue
+                    blocks[b] -= moved
+                    blocks.append(moved)
+                    new = len(blocks) - 1
+                    for state in moved:
+                        block_of[state] = new
+                    # Only the smaller half needs to be used as a splitter unless b is still waiting
+                    if b in waiting or len(moved) <= len(blocks[b]):
+                        waiting.add(new)
+                    else:
+                        waiting.add(b)
+
+        # Number the blocks in the order we reach them from the start so the result doesn't depend on set ordering
+        dead_block = block_of[dead]
+        index = {block_of[self.start]: 0}
+        representatives = [self.start]
+        new_transitions = []
+        q = collections.deque([self.start])
+        while q:
+            state = q.popleft()
+            for code in range(NUM_CARD_CODES):
+                next_block = block_of[target(state, code)]
+                if next_block == dead_block:
+                    new_transitions.append(-1)
+                    continue
+                if next_block not in index:
+                    index[next_block] = len(representatives)
+                    representatives.append(target(state, code))
+                    q.append(target(state, code))
+                new_transitions.append(index[next_block])
+
+        return dataclasses.replace(
+            self,
+            num_states=len(representatives),
+            start=0,
+            transitions=tuple(new_transitions),
+            final=tuple(self.final[state] for state in representatives),
+        )
+
+    def run(self, card_list: CardCollection, state: int | None = None) -> int:
+        """
+        Feed a sequence of cards to the automaton
+
+        :param card_list: the sequence of cards
+        :type card_list: CardCollection
+        :param state: the state to begin from. The start state is used if this is None
+        :type state: int | None
+        :return: the state we end up in or -1 if one of the cards was rejected
+        :rtype: int
+        """
+        transitions = self.transitions
+        if state is None:
+            state = self.start
+        for c in card_list:
+            state = transitions[state * NUM_CARD_CODES + c.code]
+            if state < 0:
+                return -1
+        return state
+
+    def isFullyAccepted(self, card_list: CardCollection) -> bool:
+        """
+        Determines if a sequence of cards matches the phase exactly as stated. This gives the same result as
+        RE.isFullyAccepted
+
+        :param card_list: the sequence of card to test
+        :return: if the cards match the phase
+        :rtype: bool
+        """
+        state = self.run(card_list)
+        return state >= 0 and self.final[state]
+
+    def final_mask(self, state: int) -> int:
+        """
+        :param state: the state we're in
+        :type state: int
+        :return: a bitmask where bit code is set if a card with that code takes us from state to a final state
+        :rtype: int
+        """
+        mask = 0
+        if state < 0:
+            return mask
+        base = state * NUM_CARD_CODES
+        for code in range(NUM_CARD_CODES):
+            next_state = self.transitions[base + code]
+            if next_state >= 0 and self.final[next_state]:
+                mask |= 1 << code
+        return mask
+
+    def prefix_mask(self, card_list: CardCollection) -> int:
+        """
+        :param card_list: a sequence of cards
+        :type card_list: CardCollection
+        :return: a bitmask where bit code is set if a card with that code followed by card_list is accepted
+        :rtype: int
+        """
+        return self.start_mask(self.run_map(card_list))
+
+    def run_map(self, card_list: CardCollection, run_map: tuple[int, ...] | None = None) -> tuple[int, ...]:
+        """
+        Where every state ends up after reading a sequence of cards
+        A deck's run map is all that matters for putting cards down on either side of it, and it can be updated from
+        the cards being put down without reading the deck again
+
+        :param card_list: a sequence of cards
+        :type card_list: CardCollection
+        :param run_map: the run map of the cards that come before card_list. None if there aren't any
+        :type run_map: tuple[int, ...] | None
+        :return: the state each state ends in after reading the cards of run_map and then card_list, or -1 if one of
+        them is rejected
+        :rtype: tuple[int, ...]
+        """
+        if run_map is None:
+            run_map = range(self.num_states)
+        return tuple(self.run(card_list, state) if state >= 0 else -1 for state in run_map)
+
+    def prepend_run_map(self, card_list: CardCollection, run_map: tuple[int, ...]) -> tuple[int, ...]:
+        """
+        :param card_list: a sequence of cards
+        :type card_list: CardCollection
+        :param run_map: the run map of the cards that come after card_list
+        :type run_map: tuple[int, ...]
+        :return: the run map of card_list followed by the cards of run_map
+        :rtype: tuple[int, ...]
+        """
+        new_map = []
+        for state in range(self.num_states):
+            state = self.run(card_list, state)
+            new_map.append(run_map[state] if state >= 0 else -1)
+        return tuple(new_map)
+
+    def start_mask(self, run_map: tuple[int, ...]) -> int:
+        """
+        :param run_map: the run map of a sequence of cards
+        :type run_map: tuple[int, ...]
+        :return: a bitmask where bit code is set if a card with that code followed by the sequence is accepted
+        :rtype: int
+        """
+        mask = 0
+        for code in range(NUM_CARD_CODES):
+            state = self.transitions[self.start * NUM_CARD_CODES + code]
+            if state < 0:
+                continue
+            state = run_map[state]
+            if state >= 0 and self.final[state]:
+                mask |= 1 << code
+        return mask
+
+    @functools.cached_property
+    def fingerprint(self) -> int:
+        """
+        :return: a checksum of the automaton. States of automata with different fingerprints can't be compared
+        :rtype: int
+        """
+        return zlib.crc32(self.to_bytes())
+
+    @functools.cached_property
+    def code_classes(self) -> tuple[int, ...]:
+        """
+        Cards whose codes move every state to the same next state are interchangeable. For phases made only of sets
+        and runs this groups the cards by rank and for phases made only of colors it groups them by color
+
+        :return: for every code, the smallest code with exactly the same transitions
+        :rtype: tuple[int, ...]
+        """
+        first = {}
+        return tuple(
+            first.setdefault(self.transitions[code::NUM_CARD_CODES], code) for code in range(NUM_CARD_CODES)
+        )
+
+    @functools.cached_property
+    def color_symmetries(self) -> tuple[tuple[tuple[int, ...], tuple[int, ...]], ...]:
+        """
+        Relabeling the colors of every card doesn't change whether a phase is completed as long as every color
+        component is relabeled too. The automaton then ends up in a different but equivalent state, which lets a
+        search treat a hand and its relabeled copy as the same position
+
+        :return: a (new color of each color, new state of each state) for every relabeling of the colors that moves
+        at least one state
+        :rtype: tuple[tuple[tuple[int, ...], tuple[int, ...]], ...]
+        """
+        symmetries = []
+        for perm in itertools.permutations(range(NUM_REGULAR_COLORS)):
+            code_map = [
+                perm[code // NUM_REGULAR_RANKS] * NUM_REGULAR_RANKS + code % NUM_REGULAR_RANKS
+                if code < WILD_CODE
+                else code
+                for code in range(NUM_CARD_CODES)
+            ]
+            state_map = self._state_map(code_map)
+            if state_map is not None and any(state != image for state, image in enumerate(state_map)):
+                symmetries.append((perm, state_map))
+        return tuple(symmetries)
+
+    def _state_map(self, code_map: list[int]) -> tuple[int, ...] | None:
+        # Walk the automaton twice at once, reading each code on one side and its image on the other. This gives the
+        # image of every state, or None if relabeling the codes changes which sequences are accepted
+        transitions = self.transitions
+        state_map = [-1] * self.num_states
+        state_map[self.start] = self.start
+        q = collections.deque([self.start])
+        while q:
+            state = q.popleft()
+            image = state_map[state]
+            if self.final[state] != self.final[image]:
+                return None
+            for code in range(NUM_CARD_CODES):
+                next_state = transitions[state * NUM_CARD_CODES + code]
+                next_image = transitions[image * NUM_CARD_CODES + code_map[code]]
+                if (next_state < 0) != (next_image < 0):
+                    return None
+                if next_state < 0:
+                    continue
+                if state_map[next_state] < 0:
+                    state_map[next_state] = next_image
+                    q.append(next_state)
+                elif state_map[next_state] != next_image:
+                    return None
+        return tuple(state_map)
+
+    def num_edges(self) -> int:
+        """
+        :return: the number of transitions that don't reject a card
+        :rtype: int
+        """
+        return sum(1 for t in self.transitions if t >= 0)
+
+    def to_bytes(self) -> bytes:
+        """
+        :return: the automaton in the format read by from_bytes
+        :rtype: bytes
+        :raises ValueError: if the phase is longer than MAX_PHASE_BYTES
+        """
+        phase = self.phase.encode()
+        if len(phase) > MAX_PHASE_BYTES:
+            raise ValueError(f"The phase {self.phase[:20]}... is {len(phase)} bytes long, more than {MAX_PHASE_BYTES}!")
+        transitions = array.array("i", self.transitions)
+        if sys.byteorder != "little":
+            transitions.byteswap()
+        return b"".join(
+            [
+                _AUTOMATON_HEADER.pack(len(phase), self.len, self.num_states, self.start),
+                phase,
+                bytes(self.final),
+                transitions.tobytes(),
+            ]
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes | memoryview, offset: int = 0) -> tuple[Self, int]:
+        """
+        :param data: the bytes written by to_bytes
+        :type data: bytes | memoryview
+        :param offset: where the automaton begins in data
+        :type offset: int
+        :return: the automaton and the offset just past it
+        :rtype: tuple[CompiledRE, int]
+        """
+        (phase_len, length, num_states, start) = _AUTOMATON_HEADER.unpack_from(data, offset)
+        offset += _AUTOMATON_HEADER.size
+        phase = bytes(data[offset: offset + phase_len]).decode()
+        offset += phase_len
+        final = tuple(bool(b) for b in data[offset: offset + num_states])
+        offset += num_states
+        transitions = array.array("i")
+        transitions.frombytes(data[offset: offset + num_states * NUM_CARD_CODES * transitions.itemsize])
+        if sys.byteorder != "little":
+            transitions.byteswap()
+        offset += num_states * NUM_CARD_CODES * transitions.itemsize
+        return (
+            cls(
+                phase=phase,
+                len=length,
+                num_states=num_states,
+                start=start,
+                transitions=tuple(transitions),
+                final=final,
+            ),
+            offset,
+        )
+
+
+def save_bundle(path: str, tables: list[CompiledRE]):
+    """
+    Write compiled automata to a single file so that they can be loaded without building any graphs
+
+    :param path: where to write the bundle
+    :type path: str
+    :param tables: the automata to write
+    :type tables: list[CompiledRE]
+    """
+    payload = b"".join(table.to_bytes() for table in tables)
+    with open(path, "wb") as f:
+        f.write(_BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(tables), zlib.crc32(payload)))
+        f.write(payload)
+
+
+def load_bundle(path: str) -> dict[str, CompiledRE]:
+    """
+    Read the automata written by save_bundle
+
+    :param path: the bundle to read
+    :type path: str
+    :return: the automata indexed by their phase
+    :rtype: dict[str, CompiledRE]
+    :raises Exception: if the file isn't a bundle of the current version
+    :raises ValueError: if the bundle is truncated or corrupted
+    """
+    with open(path, "rb") as f:
+        data = memoryview(f.read())
+
+    if len(data) < _BUNDLE_HEADER.size:
+        raise ValueError(f"{path} is too short to be an automata bundle!")
+    (magic, version, num_tables, checksum) = _BUNDLE_HEADER.unpack_from(data, 0)
+    if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+        raise Exception(f"{path} is not a version {BUNDLE_VERSION} automata bundle!")
+    if zlib.crc32(data[_BUNDLE_HEADER.size:]) != checksum:
+        raise ValueError(f"{path} is truncated or corrupted!")
+
+    offset = _BUNDLE_HEADER.size
+    tables = {}
+    for _ in range(num_tables):
+        table, offset = CompiledRE.from_bytes(data, offset)
+        tables[table.phase] = table
+    return tables
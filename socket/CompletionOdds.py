@@ -0,0 +1,131 @@
+import math
+
+from Card import Card, NUM_CARD_CODES, NUM_REGULAR_RANKS, SKIP_CODE, WILD_CODE
+from CardCollection import CardCollection
+from HandMatcher import HandMatcher
+from PhaseSolver import NUM_REGULAR_COLORS
+from RE import RE
+
+# The number of cards of each code in a new deck
+_DECK_COUNTS = [0] * NUM_CARD_CODES
+for _card in CardCollection.getNewDeck():
+    _DECK_COUNTS[_card.code] += 1
+
+
+def unseen_counts(known: CardCollection) -> list[int]:
+    """
+    The cards we haven't seen are the ones in a new deck minus the ones we know about (our hand, the discard pile,
+    and the phase decks on the table)
+
+    :param known: the cards we can see
+    :type known: CardCollection
+    :return: the number of unseen cards of each code
+    :rtype: list[int]
+    """
+    counts = list(_DECK_COUNTS)
+    for card in known:
+        if counts[card.code] > 0:
+            counts[card.code] -= 1
+    return counts
+
+
+def _categories(rr: RE, unseen: list[int]) -> list[tuple[int | None, int]]:
+    """
+    Group the unseen cards into kinds which are interchangeable for the phase
+    Phases made only of sets and runs only care about ranks and phases made only of colors only care about colors.
+    Skip cards never help
+
+    :return: a list of (code of a card of that kind or None if the kind never helps, number of unseen cards)
+    :rtype: list[tuple[int | None, int]]
+    """
+    categories = []
+    match rr.solver.axis:
+        case "rank":
+            for r in range(NUM_REGULAR_RANKS):
+                categories.append((r, sum(unseen[c * NUM_REGULAR_RANKS + r] for c in range(NUM_REGULAR_COLORS))))
+        case "color":
+            for c in range(NUM_REGULAR_COLORS):
+                categories.append(
+                    (c * NUM_REGULAR_RANKS, sum(unseen[c * NUM_REGULAR_RANKS: (c + 1) * NUM_REGULAR_RANKS]))
+                )
+        case _:
+            for code in range(WILD_CODE):
+                categories.append((code, unseen[code]))
+    categories.append((WILD_CODE, unseen[WILD_CODE]))
+    categories.append((None, unseen[SKIP_CODE]))
+    return [(code, count) for code, count in categories if count > 0]
+
+
+def completion_probability(
+    rr: RE,
+    card_list: CardCollection,
+    unseen: list[int],
+    draws: int,
+    node_budget: int | None = None,
+    time_budget: float | None = None,
+) -> float:
+    """
+    The exact probability that the phase can be completed after drawing some number of cards at random from the
+    unseen cards
+    Drawing cards only ever lowers the score, so this is also the probability of completing the phase at some point
+    within those draws. Instead of sampling, we go through every way to split the draws between the kinds of cards
+    that matter for the phase, weighting each one by its hypergeometric probability. As soon as a split completes the
+    phase, every way of drawing the rest of the cards counts without being looked at, and a split is abandoned as
+    soon as the remaining draws can't make up the score
+
+    :param rr: the compiled phase
+    :type rr: RE
+    :param card_list: the hand
+    :type card_list: CardCollection
+    :param unseen: the number of unseen cards of each code, such as from unseen_counts
+    :type unseen: list[int]
+    :param draws: the number of cards to draw
+    :type draws: int
+    :param node_budget: the most choices of keys to evaluate whenever a hand has to be solved again
+    :type node_budget: int | None
+    :param time_budget: the most seconds to spend whenever a hand has to be solved again
+    :type time_budget: float | None
+    :return: the probability
+    :rtype: float
+    """
+    matcher = HandMatcher(rr, card_list, node_budget, time_budget)
+    if matcher.score == 0:
+        return 1.0
+
+    categories = _categories(rr, unseen)
+    num_unseen = sum(count for _, count in categories)
+    draws = min(draws, num_unseen)
+    if draws <= 0:
+        return 0.0
+
+    # suffix[i] is the number of unseen cards in the ith category and after
+    suffix = [0] * (len(categories) + 1)
+    for i in range(len(categories) - 1, -1, -1):
+        suffix[i] = suffix[i + 1] + categories[i][1]
+    # The cards we pretend to draw from each category
+    pool = [
+        [Card.from_code(code) for _ in range(min(count, draws))] if code is not None else []
+        for code, count in categories
+    ]
+
+    def search(i: int, remaining: int) -> int:
+        # The number of ways to draw remaining cards from categories i and after which complete the phase
+        score = matcher.score
+        if score == 0:
+            return math.comb(suffix[i], remaining)
+        # Every card drawn lowers the score by at most one
+        if score > remaining or suffix[i] < remaining:
+            return 0
+
+        code, count = categories[i]
+        ways = search(i + 1, remaining)
+        for d in range(1, min(count, remaining) + 1):
+            if code is not None:
+                matcher.add(pool[i][d - 1])
+            ways += math.comb(count, d) * search(i + 1, remaining - d)
+        if code is not None:
+            for d in range(min(count, remaining)):
+                matcher.remove(pool[i][d])
+        return ways
+
+    return search(0, draws) / math.comb(num_unseen, draws)
@@ -5,10 +5,15 @@ import uuid
 
 import peewee
 
-from BaseModel import BaseModel, CardListField
+from BaseModel import BaseModel, CardListField, IntListField
 from Card import Card
 from CardCollection import CardCollection
+from CompiledRE import CompiledRE
 from Games import Games
+from RE import RE
+
+# The directions cards can be put down on a phase deck
+DIRECTIONS = ("start", "end")
 
 
 @dataclasses.dataclass(init=False)
@@ -18,10 +23,97 @@ class Gamephasedecks(BaseModel):
     )
     phase: str = peewee.TextField(null=False)
     deck: CardCollection = CardListField(null=False)
+    # The state of the phase's automaton after reading the deck, or -1 if the deck isn't accepted
+    end_state: int | None = peewee.IntegerField(null=True)
+    # Bitmasks of the card codes that can be put down on their own at the start or end of the deck
+    start_mask: int | None = peewee.BigIntegerField(null=True)
+    end_mask: int | None = peewee.BigIntegerField(null=True)
+    # The state every state of the automaton ends in after reading the deck (see CompiledRE.run_map). The other
+    # fields of the index follow from it, and it's updated from the cards put down without reading the deck again
+    run_map: list[int] | None = IntListField(null=True)
+    # The fingerprint of the automaton that end_state belongs to. The index is rebuilt if the automaton changes
+    automaton: int | None = peewee.BigIntegerField(null=True)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
+    def refresh_index(self) -> CompiledRE:
+        """
+        Recompute the index from the whole deck
+
+        :return: the automaton of the phase
+        :rtype: CompiledRE
+        """
+        table = RE.compile(self.phase).table
+        self._set_run_map(table, table.run_map(self.deck))
+        self.automaton = table.fingerprint
+        return table
+
+    def _set_run_map(self, table: CompiledRE, run_map: tuple[int, ...]):
+        self.run_map = list(run_map)
+        self.end_state = run_map[table.start]
+        self.end_mask = table.final_mask(self.end_state)
+        self.start_mask = table.start_mask(run_map)
+
+    def _index(self) -> CompiledRE:
+        # Rows saved before the index existed or with an older automaton are indexed again when first used
+        table = RE.compile(self.phase).table
+        if self.end_state is None or self.run_map is None or self.automaton != table.fingerprint:
+            table = self.refresh_index()
+        return table
+
+    def accepts(self, cards: CardCollection, direction: str) -> bool:
+        """
+        Determines if cards can be put down on the deck. A single card is checked with one bit lookup and
+        several cards only need to be read once, from end_state or into the run map
+
+        :param cards: the cards to put down in the order they'll appear in the deck
+        :type cards: CardCollection
+        :param direction: start or end (see DIRECTIONS)
+        :type direction: str
+        :return: if the deck with the cards added is still a valid phase
+        :rtype: bool
+        :raises Exception: if direction is invalid
+        """
+        table = self._index()
+        if len(cards) == 0:
+            return False
+        match direction:
+            case "start":
+                if len(cards) == 1:
+                    return bool(self.start_mask >> cards[0].code & 1)
+                state = table.run(cards)
+                state = self.run_map[state] if state >= 0 else -1
+                return state >= 0 and table.final[state]
+            case "end":
+                if len(cards) == 1:
+                    return bool(self.end_mask >> cards[0].code & 1)
+                state = table.run(cards, self.end_state) if self.end_state >= 0 else -1
+                return state >= 0 and table.final[state]
+            case _:
+                raise Exception(f"{direction} is not a valid direction! Must be one of {DIRECTIONS}")
+
+    def extend(self, cards: CardCollection, direction: str):
+        """
+        Put cards down on the deck and update the index from the new cards. The caller must check accepts first
+
+        :param cards: the cards to put down in the order they'll appear in the deck
+        :type cards: CardCollection
+        :param direction: start or end (see DIRECTIONS)
+        :type direction: str
+        :raises Exception: if direction is invalid
+        """
+        table = self._index()
+        match direction:
+            case "start":
+                self.deck = CardCollection(cards + self.deck)
+                self._set_run_map(table, table.prepend_run_map(cards, self.run_map))
+            case "end":
+                self.deck = CardCollection(self.deck + cards)
+                self._set_run_map(table, table.run_map(cards, self.run_map))
+            case _:
+                raise Exception(f"{direction} is not a valid direction! Must be one of {DIRECTIONS}")
+
     def toJSON(self):
         return json.dumps(self.to_json_dict())
 
@@ -0,0 +1,236 @@
+from Card import Card, NUM_CARD_CODES, NUM_REGULAR_RANKS, SKIP_CODE, WILD_CODE
+from CardCollection import CardCollection
+from PhaseSolver import NUM_REGULAR_COLORS, PhaseMatch, SearchBudget
+from RE import RE
+
+
+class HandMatcher:
+    """
+    Keeps track of how close a hand is to completing a phase as cards are added and removed one at a time
+
+    For phases made only of sets and runs (or only of colors), we remember how many regular cards every choice of
+    component keys can hold. Adding or removing a card only changes the choices that cover its rank (or color) and
+    each of them changes by at most one, so we can keep the best choice current by counting how many choices hold
+    each number of cards. Other phases are solved again the next time the score is needed.
+    """
+
+    def __init__(
+        self,
+        rr: RE,
+        card_list: CardCollection = (),
+        node_budget: int | None = None,
+        time_budget: float | None = None,
+    ):
+        """
+        :param rr: the compiled phase to match against
+        :type rr: RE
+        :param card_list: the cards that are initially in the hand
+        :type card_list: CardCollection
+        :param node_budget: the most choices of keys to evaluate whenever the hand has to be solved again
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend whenever the hand has to be solved again
+        :type time_budget: float | None
+        """
+        self.rr = rr
+        self.node_budget = node_budget
+        self.time_budget = time_budget
+        self.solver = rr.solver
+        self._cards: dict = {}
+        self._counts = [0] * NUM_CARD_CODES
+
+        # For every rank (or color), the choices of keys that can hold it along with how many cards they can take
+        self._touching: list[list[tuple[int, int]]] = []
+        # The number of regular cards each choice of keys currently holds
+        self._placed: list[int] = []
+        # _num_at[n] is the number of choices that currently hold n cards
+        self._num_at: list[int] = []
+        self._best = 0
+        self._hist: list[int] = []
+        if self.solver.axis is not None and self.solver.len > 0:
+            width = NUM_REGULAR_RANKS if self.solver.axis == "rank" else NUM_REGULAR_COLORS
+            self._touching = [[] for _ in range(width)]
+            for i, (_, caps) in enumerate(self.solver.combos):
+                for index, cap in caps:
+                    self._touching[index].append((i, cap))
+            self._placed = [0] * len(self.solver.combos)
+            self._num_at = [0] * (self.solver.len + 1)
+            self._num_at[0] = len(self.solver.combos)
+            self._hist = [0] * width
+
+        # The result of the last full solve. It's thrown away whenever the hand changes
+        self._match: PhaseMatch | None = None
+
+        for card in card_list:
+            self.add(card)
+
+    def _index(self, code: int) -> int:
+        # The rank or color of a regular card, depending on what the phase counts
+        if self.solver.axis == "rank":
+            return code % NUM_REGULAR_RANKS
+        return code // NUM_REGULAR_RANKS
+
+    @property
+    def incremental(self) -> bool:
+        """
+        :return: if the score is updated on every change instead of being solved again
+        :rtype: bool
+        """
+        return bool(self._placed)
+
+    def add(self, card: Card):
+        """
+        Put a card into the hand
+
+        :param card: the card to add
+        :type card: Card
+        :raises ValueError: if a card with the same id is already in the hand
+        """
+        if card.id in self._cards:
+            raise ValueError(f"{card} with id {card.id!r} is already in the hand!")
+        self._cards[card.id] = card
+        code = card.code
+        self._counts[code] += 1
+        self._match = None
+
+        if self.incremental and code < WILD_CODE:
+            index = self._index(code)
+            held = self._hist[index]
+            self._hist[index] += 1
+            for i, cap in self._touching[index]:
+                if held < cap:
+                    self._move(i, self._placed[i] + 1)
+
+    def remove(self, card: Card):
+        """
+        Take a card out of the hand
+
+        :param card: the card to remove
+        :type card: Card
+        :raises Exception: if the card isn't in the hand
+        """
+        if card.id not in self._cards:
+            raise Exception(f"{card} is not in the hand!")
+        del self._cards[card.id]
+        code = card.code
+        self._counts[code] -= 1
+        self._match = None
+
+        if self.incremental and code < WILD_CODE:
+            index = self._index(code)
+            self._hist[index] -= 1
+            held = self._hist[index]
+            for i, cap in self._touching[index]:
+                if held < cap:
+                    self._move(i, self._placed[i] - 1)
+
+    def _move(self, i: int, placed: int):
+        # Move a choice of keys to a new number of held cards and keep track of the best one
+        self._num_at[self._placed[i]] -= 1
+        self._num_at[placed] += 1
+        self._placed[i] = placed
+        if placed > self._best:
+            self._best = placed
+        elif self._num_at[self._best] == 0:
+            # Values only change by one at a time, so the best can only drop by one
+            self._best -= 1
+
+    @property
+    def cards(self) -> CardCollection:
+        """
+        :return: the cards currently in the hand
+        :rtype: CardCollection
+        """
+        return CardCollection(self._cards.values())
+
+    @property
+    def score(self) -> int:
+        """
+        :return: the number of cards needed to complete the phase. This is the same as RE.score on the hand
+        :rtype: int
+        """
+        if self.solver.len == 0:
+            return 0
+        if self.incremental:
+            return max(0, self.solver.len - self._best - self._counts[WILD_CODE])
+        return self.match().score
+
+    def match(self) -> PhaseMatch:
+        """
+        The best partial phase for the current hand. It's computed when first asked for after a change
+
+        :return: the score and the cards which make up the best partial phase
+        :rtype: PhaseMatch
+        """
+        if self._match is None:
+            self._match = self.solver.solve(self.cards, self.node_budget, self.time_budget)
+        return self._match
+
+    def score_if(self, remove: Card | None = None, add: Card | None = None) -> int:
+        """
+        Compute what the score would be after a change to the hand without making the change
+        For example, score_if(remove=card, add=game.discard[-1]) is the score after discarding card and taking the
+        top of the discard pile
+
+        :param remove: a card to take out of the hand
+        :type remove: Card | None
+        :param add: a card to put into the hand
+        :type add: Card | None
+        :return: the score of the changed hand
+        :rtype: int
+        :raises Exception: if remove isn't in the hand
+        :raises ValueError: if add is already in the hand
+        """
+        if remove is not None and remove.id not in self._cards:
+            raise Exception(f"{remove} is not in the hand!")
+        if add is not None and add.id in self._cards and (remove is None or add.id != remove.id):
+            raise ValueError(f"{add} with id {add.id!r} is already in the hand!")
+        if self.solver.len == 0:
+            return 0
+
+        wilds = self._counts[WILD_CODE]
+        changes = []
+        if remove is not None:
+            changes.append((remove.code, -1))
+        if add is not None:
+            changes.append((add.code, 1))
+
+        if not self.incremental:
+            counts = list(self._counts)
+            for code, delta in changes:
+                counts[code] += delta
+            placed, _ = self.solver.best_keys(counts, SearchBudget(self.node_budget, self.time_budget))
+            return max(0, self.solver.len - placed - counts[WILD_CODE])
+
+        # Only the choices which cover the changed ranks (or colors) can change
+        placed = {}
+        hist = {}
+        for code, delta in changes:
+            if code == WILD_CODE:
+                wilds += delta
+                continue
+            if code == SKIP_CODE:
+                continue
+            index = self._index(code)
+            held = hist.get(index, self._hist[index])
+            hist[index] = held + delta
+            for i, cap in self._touching[index]:
+                if (delta > 0 and held < cap) or (delta < 0 and held + delta < cap):
+                    placed[i] = placed.get(i, self._placed[i]) + delta
+
+        best = max(placed.values(), default=-1)
+        changed_at_best = sum(1 for i in placed if self._placed[i] == self._best)
+        if self._num_at[self._best] > changed_at_best:
+            # Some choice that didn't change still holds the most cards
+            best = max(best, self._best)
+        elif best < self._best:
+            best = max(
+                best,
+                max((p for i, p in enumerate(self._placed) if i not in placed), default=-1),
+            )
+        return max(0, self.solver.len - best - wilds)
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __contains__(self, card: Card):
+        return card.id in self._cards
@@ -0,0 +1,120 @@
+import collections
+import threading
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    """
+    A thread-safe cache with a bounded number of entries
+    Once the cache is full, the least recently used entry is evicted to make room for a new one
+    The cache also counts its hits, misses, and evictions so that we can monitor how well it's working
+    """
+
+    def __init__(self, maxsize: int = 128):
+        """
+        :param maxsize: the maximum number of entries to hold at once
+        :type maxsize: int
+        """
+        if maxsize < 1:
+            raise Exception(f"Invalid cache size {maxsize}. Must be at least 1!")
+
+        self.maxsize = maxsize
+        self._data: collections.OrderedDict = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up an entry and mark it as the most recently used one
+
+        :param key: the key of the entry
+        :param default: what to return if the key is not in the cache
+        :return: the cached value or default
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Insert an entry, evicting the least recently used one if the cache is full
+
+        :param key: the key of the entry
+        :param value: the value to cache
+        """
+        with self._lock:
+            self._put(key, value)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Look up an entry and create it with factory if it isn't cached yet
+        factory is called without holding the lock so that a slow build doesn't block other threads.
+        If two threads build the same entry at once, the first one to finish wins and both get the same object
+
+        :param key: the key of the entry
+        :param factory: a function with no arguments which builds the value
+        :return: the cached value
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+
+        value = factory()
+
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+            self._put(key, value)
+            return value
+
+    def _put(self, key: Hashable, value: Any):
+        # Callers must already hold the lock
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        :return: the hit, miss, and eviction counters along with the current size of the cache
+        :rtype: dict[str, int | float]
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,140 @@
+"""
+Converts the card list columns of an existing database between the JSON and binary encodings.
+Every column is rewritten in batches inside a single transaction, so either the whole database is converted or
+nothing changes. Set the encoding in the cards section of database.ini to match once this has run.
+"""
+
+import argparse
+from configparser import ConfigParser
+
+import psycopg2
+import psycopg2.extras
+
+from CardBytes import CARD_COLUMN_TYPES, decode_cards, encode_cards
+from CardCollection import CardCollection
+from create_databases import VIEWS
+
+# The columns that hold card lists in each table
+CARD_COLUMNS = {
+    "games": ["deck", "discard"],
+    "players": ["hand", "skip_cards"],
+    "gamephasedecks": ["deck"],
+}
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _convert(value, encoding: str):
+    # psycopg2 gives json columns as lists and bytea columns as memoryviews
+    if isinstance(value, (memoryview, bytes)):
+        cards = decode_cards(value)
+    else:
+        cards = CardCollection.from_json_dict(value)
+    if encoding == "binary":
+        return psycopg2.Binary(encode_cards(cards))
+    return cards.to_json()
+
+
+def migrate_column(
+    conn, table: str, column: str, encoding: str, batch_size: int = DEFAULT_BATCH_SIZE
+) -> tuple[int, int]:
+    """
+    Rewrite one card list column in another encoding. The values are written to a new column which then replaces the
+    old one
+
+    :param conn: the connection to the database
+    :param table: the name of the table
+    :type table: str
+    :param column: the name of the column
+    :type column: str
+    :param encoding: the encoding to convert to
+    :type encoding: str
+    :param batch_size: the number of rows to read and write at once
+    :type batch_size: int
+    :return: the total size of the column in bytes before and after
+    :rtype: tuple[int, int]
+    """
+    column_type = CARD_COLUMN_TYPES[encoding]
+    new_column = f"{column}__{encoding}"
+    cur = conn.cursor()
+    cur.execute(f'SELECT COALESCE(SUM(pg_column_size("{column}")), 0) FROM public.{table}')
+    (before,) = cur.fetchone()
+    cur.execute(
+        "SELECT data_type FROM information_schema.columns WHERE table_schema = 'public' AND table_name = %s AND "
+        "column_name = %s",
+        (table, column),
+    )
+    if cur.fetchone()[0] == column_type:
+        return before, before
+
+    cur.execute(f'ALTER TABLE public.{table} ADD COLUMN "{new_column}" {column_type}')
+    rows = conn.cursor(name=f"migrate_{table}_{column}")
+    rows.itersize = batch_size
+    rows.execute(f'SELECT id, "{column}" FROM public.{table}')
+    while batch := rows.fetchmany(batch_size):
+        psycopg2.extras.execute_values(
+            cur,
+            f'UPDATE public.{table} AS t SET "{new_column}" = v.data FROM (VALUES %s) AS v(id, data) '
+            f"WHERE t.id = v.id",
+            [(row_id, _convert(value, encoding)) for row_id, value in batch],
+            template=f"(%s::uuid, %s::{column_type})",
+            page_size=batch_size,
+        )
+    rows.close()
+
+    cur.execute(f'ALTER TABLE public.{table} DROP COLUMN "{column}"')
+    cur.execute(f'ALTER TABLE public.{table} RENAME COLUMN "{new_column}" TO "{column}"')
+    cur.execute(f'ALTER TABLE public.{table} ALTER COLUMN "{column}" SET NOT NULL')
+    cur.execute(f'SELECT COALESCE(SUM(pg_column_size("{column}")), 0) FROM public.{table}')
+    (after,) = cur.fetchone()
+    return before, after
+
+
+def migrate_card_lists(encoding: str, batch_size: int = DEFAULT_BATCH_SIZE) -> dict[str, tuple[int, int]]:
+    """
+    Convert every card list column to an encoding
+
+    :param encoding: the encoding to convert to. One of CARD_COLUMN_TYPES
+    :type encoding: str
+    :param batch_size: the number of rows to read and write at once
+    :type batch_size: int
+    :return: the total size in bytes of each column before and after
+    :rtype: dict[str, tuple[int, int]]
+    """
+    parser = ConfigParser()
+    parser.read("database.ini")
+    config = dict(parser.items("postgresql"))
+
+    sizes = {}
+    with psycopg2.connect(**config) as conn:
+        cur = conn.cursor()
+        # The views use the card list columns, so they are made again once the columns are replaced
+        cur.execute("DROP VIEW IF EXISTS public.players_with_names, public.completed_games, public.noncompleted_games")
+        for table, columns in CARD_COLUMNS.items():
+            for column in columns:
+                sizes[f"{table}.{column}"] = migrate_column(conn, table, column, encoding, batch_size)
+        cur.execute(VIEWS)
+        conn.commit()
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="MigrateCardLists",
+        description="Convert the card lists stored in the database between the JSON and binary encodings",
+    )
+    parser.add_argument("encoding", choices=list(CARD_COLUMN_TYPES), help="The encoding to convert to")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"The number of rows converted at once. By default, it is set to {DEFAULT_BATCH_SIZE}",
+    )
+
+    parsed_args = parser.parse_args()
+    sizes = migrate_card_lists(parsed_args.encoding, parsed_args.batch_size)
+    for column, (before, after) in sizes.items():
+        print(f"{column:>22}  {before:>12} bytes  ->  {after:>12} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Estimates how hard each phase of a phase list is by dealing millions of random hands. Every simulated player is dealt
+INITIAL_HAND_SIZE cards and then draws one card per turn until the cards they've seen complete the phase. The
+simulation never discards, so the number of turns is a lower bound on what a real player needs and is meant for
+comparing phases against each other.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from Card import NUM_CARD_CODES, NUM_REGULAR_RANKS, SKIP_CODE, WILD_CODE
+from CardCollection import CardCollection
+from PhaseSolver import NUM_REGULAR_COLORS, PhaseSolver
+from RE import DEFAULT_PHASE_LIST
+
+# The same as app.INITIAL_HAND_SIZE. app.py connects to the database on import, so it isn't imported here
+INITIAL_HAND_SIZE = 10
+DEFAULT_SAMPLES = 250_000
+# Phases which mix colors with sets or runs are scored one hand at a time, so they get fewer samples
+DEFAULT_MIXED_SAMPLES = 2_000
+DEFAULT_MAX_TURNS = 60
+# The most simulated players dealt at once
+_BATCH_SIZE = 50_000
+# The most hands whose histograms are compared with every choice of component keys at once
+_CHUNK_ROWS = 4_096
+
+# Every card of a new deck as its code
+DECK_CODES = np.array([card.code for card in CardCollection.getNewDeck()], dtype=np.int8)
+
+
+def _category_map(solver: PhaseSolver) -> np.ndarray:
+    """
+    :return: an array mapping every card code to the column of the histogram used by the phase. The regular cards are
+    grouped by rank or color, followed by a column for the wilds and one for the skips
+    :rtype: np.ndarray
+    """
+    codes = np.arange(NUM_CARD_CODES)
+    if solver.axis == "rank":
+        width = NUM_REGULAR_RANKS
+        category = codes % NUM_REGULAR_RANKS
+    else:
+        width = NUM_REGULAR_COLORS
+        category = codes // NUM_REGULAR_RANKS
+    category[WILD_CODE] = width
+    category[SKIP_CODE] = width + 1
+    return category.astype(np.intp)
+
+
+def deal(rng: np.random.Generator, num_players: int) -> np.ndarray:
+    """
+    :param rng: the random number generator
+    :type rng: np.random.Generator
+    :param num_players: the number of decks to shuffle
+    :type num_players: int
+    :return: an array of shape (num_players, number of cards in a deck) where each row is a shuffled deck of card
+    codes
+    :rtype: np.ndarray
+    """
+    return rng.permuted(np.broadcast_to(DECK_CODES, (num_players, len(DECK_CODES))), axis=1)
+
+
+def _simulate_axis(solver: PhaseSolver, decks: np.ndarray, hand_size: int, max_turns: int, turns: np.ndarray):
+    # Only the rank (or color) histogram and the number of wilds matter. For every choice of component keys we keep
+    # how many regular cards it holds. A drawn card adds one to the choices that still have room for its rank (or
+    # color), so each draw costs one comparison per choice instead of solving the hand again
+    cap_matrix = solver.cap_matrix.astype(np.int8)
+    num_axis = cap_matrix.shape[1]
+    category = _category_map(solver)[decks]
+    rows = np.arange(len(decks))
+
+    # One column per rank (or color), then the wilds and the skips
+    hist = np.zeros((len(decks), num_axis + 2), dtype=np.int8)
+    for i in range(hand_size):
+        hist[rows, category[:, i]] += 1
+    placed = np.empty((len(decks), len(cap_matrix)), dtype=np.int8)
+    for c in range(0, len(decks), _CHUNK_ROWS):
+        block = hist[c: c + _CHUNK_ROWS, None, :num_axis]
+        placed[c: c + _CHUNK_ROWS] = np.minimum(block, cap_matrix[None]).sum(axis=2, dtype=np.int8)
+    # Pad the caps so the wilds and skips never fit in a choice of keys
+    caps = np.zeros((num_axis + 2, len(cap_matrix)), dtype=np.int8)
+    caps[:num_axis] = cap_matrix.T
+
+    for turn in range(max_turns + 1):
+        if turn > 0:
+            drawn = category[rows, hand_size + turn - 1]
+            placed += hist[np.arange(len(rows)), drawn][:, None] < caps[drawn]
+            hist[np.arange(len(rows)), drawn] += 1
+        done = placed.max(axis=1) + hist[:, num_axis] >= solver.len
+        turns[rows[done]] = turn
+        if done.all():
+            break
+        if done.any():
+            keep = ~done
+            rows, hist, placed = rows[keep], hist[keep], placed[keep]
+
+
+def _simulate_mixed(solver: PhaseSolver, decks: np.ndarray, hand_size: int, max_turns: int, turns: np.ndarray):
+    # Phases which mix colors with sets or runs need the whole hand, so every hand is solved again after each draw
+    rows = np.arange(len(decks))
+    counts = np.zeros((len(decks), NUM_CARD_CODES), dtype=np.int16)
+    for i in range(hand_size):
+        counts[rows, decks[:, i]] += 1
+
+    for turn in range(max_turns + 1):
+        if turn > 0:
+            counts[np.arange(len(rows)), decks[rows, hand_size + turn - 1]] += 1
+        done = solver.score_counts(counts) == 0
+        turns[rows[done]] = turn
+        if done.all():
+            break
+        keep = ~done
+        rows, counts = rows[keep], counts[keep]
+
+
+def simulate_turns(
+    phase: str,
+    samples: int,
+    rng: np.random.Generator,
+    max_turns: int = DEFAULT_MAX_TURNS,
+    hand_size: int = INITIAL_HAND_SIZE,
+) -> np.ndarray:
+    """
+    Simulate players trying to complete a phase
+
+    :param phase: the phase
+    :type phase: str
+    :param samples: the number of simulated players
+    :type samples: int
+    :param rng: the random number generator
+    :type rng: np.random.Generator
+    :param max_turns: players who haven't completed the phase after this many draws are stopped
+    :type max_turns: int
+    :param hand_size: the number of cards dealt
+    :type hand_size: int
+    :return: the number of draws each player needed. 0 means the phase was complete when dealt and max_turns + 1
+    means the player was stopped
+    :rtype: np.ndarray
+    """
+    solver = PhaseSolver(phase)
+    turns = np.full(samples, max_turns + 1, dtype=np.int16)
+    if solver.len == 0:
+        turns[:] = 0
+        return turns
+    max_turns = min(max_turns, len(DECK_CODES) - hand_size)
+
+    simulate = _simulate_axis if solver.axis is not None else _simulate_mixed
+    for start in range(0, samples, _BATCH_SIZE):
+        decks = deal(rng, min(_BATCH_SIZE, samples - start))
+        simulate(solver, decks, hand_size, max_turns, turns[start: start + len(decks)])
+
+    return turns
+
+
+def estimate_difficulty(
+    phase_list: list[str],
+    samples: int = DEFAULT_SAMPLES,
+    mixed_samples: int = DEFAULT_MIXED_SAMPLES,
+    seed: int | None = None,
+    max_turns: int = DEFAULT_MAX_TURNS,
+) -> list[dict]:
+    """
+    :param phase_list: the phases to estimate
+    :type phase_list: list[str]
+    :param samples: the number of simulated players per phase
+    :type samples: int
+    :param mixed_samples: the number of simulated players for phases that mix colors with sets or runs
+    :type mixed_samples: int
+    :param seed: the seed of the random number generator. None picks one at random
+    :type seed: int | None
+    :param max_turns: players are stopped after this many draws and counted as needing max_turns + 1
+    :type max_turns: int
+    :return: for every phase, the expected number of draws, the median and 90th percentile, the fraction of deals
+    that already complete the phase, and the fraction of players that were stopped
+    :rtype: list[dict]
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for phase in phase_list:
+        n = samples if PhaseSolver(phase).axis is not None else min(samples, mixed_samples)
+        start = time.perf_counter()
+        turns = simulate_turns(phase, n, rng, max_turns)
+        results.append(
+            {
+                "phase": phase,
+                "samples": n,
+                "expected_turns": float(turns.mean()),
+                "p50": float(np.percentile(turns, 50)),
+                "p90": float(np.percentile(turns, 90)),
+                "complete_on_deal": float((turns == 0).mean()),
+                "stopped": float((turns > max_turns).mean()),
+                "seconds": time.perf_counter() - start,
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="PhaseDifficulty",
+        description="Estimate the number of turns needed to complete each phase of a phase list",
+    )
+    parser.add_argument(
+        "phases",
+        nargs="*",
+        default=DEFAULT_PHASE_LIST,
+        help="The phases to estimate. By default, every phase in DEFAULT_PHASE_LIST",
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=DEFAULT_SAMPLES,
+        help=f"The number of simulated deals per phase. By default, it is set to {DEFAULT_SAMPLES}",
+    )
+    parser.add_argument(
+        "--mixed-samples",
+        type=int,
+        default=DEFAULT_MIXED_SAMPLES,
+        help=f"The number of simulated deals for phases that mix colors with sets or runs. By default, it is set to "
+             f"{DEFAULT_MIXED_SAMPLES}",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="The seed of the random number generator")
+    parser.add_argument(
+        "--max-turns",
+        type=int,
+        default=DEFAULT_MAX_TURNS,
+        help=f"Stop simulating a player after this many draws. By default, it is set to {DEFAULT_MAX_TURNS}",
+    )
+
+    parsed_args = parser.parse_args()
+    results = estimate_difficulty(
+        parsed_args.phases, parsed_args.samples, parsed_args.mixed_samples, parsed_args.seed, parsed_args.max_turns
+    )
+    print(f"{'phase':>12}  {'samples':>9}  {'expected':>8}  {'p50':>5}  {'p90':>5}  {'on deal':>7}  {'stopped':>7}")
+    for r in results:
+        print(
+            f"{r['phase']:>12}  {r['samples']:>9}  {r['expected_turns']:>8.2f}  {r['p50']:>5.0f}  {r['p90']:>5.0f}  "
+            f"{r['complete_on_deal']:>7.2%}  {r['stopped']:>7.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
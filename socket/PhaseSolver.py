@@ -0,0 +1,919 @@
+import dataclasses
+import itertools
+import re
+import threading
+import time
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from Card import Card, NUM_CARD_CODES, NUM_REGULAR_RANKS, WILD_CODE
+from CardCollection import CardCollection
+
+NUM_REGULAR_COLORS = 4
+
+# Every card we can possibly see, indexed by its code
+_CARD_BY_CODE = tuple(Card.from_code(code, "") for code in range(NUM_CARD_CODES))
+
+# The most intermediate values score_many computes at once. Larger batches are split into chunks of this size
+_BATCH_ELEMENTS = 1 << 22
+
+
+@dataclasses.dataclass(frozen=True)
+class PhaseComponent:
+    """
+    One part of a phase such as the S3 in S3+R4
+    """
+
+    # R for runs, S for sets, and C for colors
+    kind: str
+    # The number of cards in the component. 0 means that the component has no fixed size
+    size: int
+
+    def keys(self) -> range:
+        """
+        The choices that fix which cards the component can hold
+        Sets are keyed by their rank, colors by their color, and runs by their starting rank
+
+        :return: the indices of every valid key
+        :rtype: range
+        """
+        match self.kind:
+            case "S":
+                return range(NUM_REGULAR_RANKS)
+            case "C":
+                return range(NUM_REGULAR_COLORS)
+            case "R":
+                return range(NUM_REGULAR_RANKS - self.size + 1)
+
+    def groups(self, key: int) -> list[tuple[int, frozenset[int]]]:
+        """
+        Split the component into groups of slots. Every slot in a group accepts the same card codes
+
+        :param key: the rank, color, or starting rank of the component
+        :type key: int
+        :return: a list of (number of slots, card codes accepted by those slots). For runs, there is one group per
+        position in the run
+        :rtype: list[tuple[int, frozenset[int]]]
+        """
+        match self.kind:
+            case "S":
+                return [(self.size, frozenset(c * NUM_REGULAR_RANKS + key for c in range(NUM_REGULAR_COLORS)))]
+            case "C":
+                return [(self.size, frozenset(key * NUM_REGULAR_RANKS + r for r in range(NUM_REGULAR_RANKS)))]
+            case "R":
+                return [
+                    (1, frozenset(c * NUM_REGULAR_RANKS + key + i for c in range(NUM_REGULAR_COLORS)))
+                    for i in range(self.size)
+                ]
+
+    def supply(self, key: int, rank_hist: list[int], color_hist: list[int]) -> int:
+        """
+        An upper bound on how many regular cards the component can hold, ignoring the other components
+
+        :param key: the rank, color, or starting rank of the component
+        :type key: int
+        :param rank_hist: the number of regular cards of each rank
+        :type rank_hist: list[int]
+        :param color_hist: the number of regular cards of each color
+        :type color_hist: list[int]
+        :return: the number of cards
+        :rtype: int
+        """
+        match self.kind:
+            case "S":
+                supply = rank_hist[key]
+            case "C":
+                supply = color_hist[key]
+            case "R":
+                supply = sum(1 for i in range(self.size) if rank_hist[key + i])
+        return min(self.size, supply)
+
+    def caps(self, key: int) -> list[tuple[int, int]]:
+        """
+        How many cards the component can take from each rank (for sets and runs) or each color (for colors)
+
+        :param key: the rank, color, or starting rank of the component
+        :type key: int
+        :return: a list of (rank or color index, number of cards)
+        :rtype: list[tuple[int, int]]
+        """
+        match self.kind:
+            case "S" | "C":
+                return [(key, self.size)]
+            case "R":
+                return [(key + i, 1) for i in range(self.size)]
+
+
+@dataclasses.dataclass(frozen=True)
+class PhaseMatch:
+    """
+    The best way to use a collection of cards towards a phase
+    """
+
+    # The number of cards still needed to complete the phase
+    score: int
+    # The cards which make up the best (possibly partial) phase
+    # They are listed in component order and runs are in rank order so a complete phase passes RE.isFullyAccepted
+    cards: CardCollection
+    # The number of component assignments we evaluated to get the result
+    explored: int = 0
+    # False if the search ran out of budget. The score is then an upper bound and the cards are the best found so far
+    exact: bool = True
+
+    @property
+    def is_complete(self) -> bool:
+        """
+        :return: if the cards satisfy the entire phase
+        :rtype: bool
+        """
+        # Phases without a size are satisfied by any nonempty component
+        return self.score == 0 and len(self.cards) > 0
+
+
+class SearchBudget:
+    """
+    Limits how much work a single search may do
+    A search calls spend once per node it explores and stops as soon as spend returns False
+    """
+
+    def __init__(self, node_budget: int | None = None, time_budget: float | None = None):
+        """
+        :param node_budget: the most nodes to explore. None means no limit
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend. None means no limit
+        :type time_budget: float | None
+        """
+        self.node_budget = node_budget
+        self.deadline = None if time_budget is None else time.perf_counter() + time_budget
+        self.nodes = 0
+        self.exhausted = False
+
+    def spend(self) -> bool:
+        """
+        Count one explored node
+
+        :return: if the search may keep going
+        :rtype: bool
+        """
+        if self.exhausted:
+            return False
+        if self.node_budget is not None and self.nodes >= self.node_budget:
+            self.exhausted = True
+        elif self.deadline is not None and time.perf_counter() > self.deadline:
+            self.exhausted = True
+        else:
+            self.nodes += 1
+        return not self.exhausted
+
+
+class SearchStats:
+    """
+    Counters describing the work done by every search in the process so that we can monitor it
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.nodes = 0
+        self.max_nodes = 0
+        self.exhausted = 0
+
+    def record(self, budget: SearchBudget):
+        """
+        Add the work done by one search
+
+        :param budget: the budget that the search used
+        :type budget: SearchBudget
+        """
+        with self._lock:
+            self.searches += 1
+            self.nodes += budget.nodes
+            self.max_nodes = max(self.max_nodes, budget.nodes)
+            if budget.exhausted:
+                self.exhausted += 1
+
+    def snapshot(self) -> dict[str, int]:
+        """
+        :return: the number of searches, the nodes they explored, the most nodes explored by one search, and the
+        number of searches that ran out of budget
+        :rtype: dict[str, int]
+        """
+        with self._lock:
+            return {
+                "searches": self.searches,
+                "nodes": self.nodes,
+                "max_nodes": self.max_nodes,
+                "exhausted": self.exhausted,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.searches = 0
+            self.nodes = 0
+            self.max_nodes = 0
+            self.exhausted = 0
+
+
+search_stats = SearchStats()
+
+# Precomputed best choices of keys for phases made only of sets and runs, indexed by phase. See ScoreTable.py
+_score_tables: dict = {}
+
+
+def register_score_table(phase: str, table):
+    """
+    Make every PhaseSolver for phase look up its best choice of keys in a precomputed table before searching
+
+    :param phase: the phase the table was computed for
+    :type phase: str
+    :param table: the table. It needs lookup(phase, hist) and lookup_many(phase, hist) like ScoreTable
+    :type table: ScoreTable
+    """
+    _score_tables[phase] = table
+
+
+def unregister_score_table(phase: str):
+    """
+    Go back to searching for the best choice of keys for phase
+
+    :param phase: the phase the table was computed for
+    :type phase: str
+    """
+    _score_tables.pop(phase, None)
+
+
+def parse_phase(phase: str) -> tuple[PhaseComponent, ...]:
+    """
+    Split a phase into its components
+
+    :param phase: a phase such as S3+R4 or C
+    :type phase: str
+    :return: the components of the phase
+    :rtype: tuple[PhaseComponent, ...]
+    """
+    components = []
+    for phase_component in phase.split("+"):
+        m = re.fullmatch("([RCS])(\\d*)", phase_component)
+        if m is None:
+            raise Exception(f"{phase_component} is not a valid phase component in {phase}!")
+        components.append(PhaseComponent(m.group(1), int(m.group(2)) if m.group(2) else 0))
+    return tuple(components)
+
+
+def group_by_code(card_list: CardCollection) -> list[list]:
+    """
+    :param card_list: a collection of cards
+    :type card_list: CardCollection
+    :return: the cards of card_list indexed by their code
+    :rtype: list[list[Card]]
+    """
+    by_code = [[] for _ in range(NUM_CARD_CODES)]
+    for card in card_list:
+        by_code[card.code].append(card)
+    return by_code
+
+
+def count_matrix(hands: Iterable[CardCollection]) -> np.ndarray:
+    """
+    Encode hands as rows of card counts
+
+    :param hands: the collections of cards to encode
+    :type hands: Iterable[CardCollection]
+    :return: an array of shape (number of hands, NUM_CARD_CODES) where entry [i, code] is the number of cards with
+    that code in the ith hand
+    :rtype: np.ndarray
+    """
+    hands = list(hands)
+    rows = []
+    codes = []
+    # Collections like CardArray count their own cards without creating them
+    counted = []
+    for i, hand in enumerate(hands):
+        if hasattr(hand, "code_counts"):
+            counted.append(i)
+            continue
+        for card in hand:
+            rows.append(i)
+            codes.append(card.code)
+    num_hands = len(hands)
+    counts = np.zeros((num_hands, NUM_CARD_CODES), dtype=np.int16)
+    np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(codes, dtype=np.intp)), 1)
+    for i in counted:
+        counts[i] = hands[i].code_counts()
+    return counts
+
+
+def hand_signature(card_list: CardCollection) -> tuple[int, ...]:
+    """
+    A key that is the same for every hand with the same cards, no matter their order or ids
+
+    :param card_list: a collection of cards
+    :type card_list: CardCollection
+    :return: the sorted codes of the cards
+    :rtype: tuple[int, ...]
+    """
+    return tuple(sorted(card.code for card in card_list))
+
+
+def cards_from_codes(card_list: CardCollection, codes: tuple[int, ...]) -> CardCollection:
+    """
+    Pick cards out of card_list that have the given codes, in the order of the codes
+    This turns a result computed for one hand back into the actual cards of another hand with the same signature
+
+    :param card_list: the cards to pick from
+    :type card_list: CardCollection
+    :param codes: the codes of the cards to pick
+    :type codes: tuple[int, ...]
+    :return: the picked cards
+    :rtype: CardCollection
+    """
+    by_code = group_by_code(card_list)
+    for cards in by_code:
+        cards.reverse()
+    return CardCollection(by_code[code].pop() for code in codes)
+
+
+def rank_histogram(counts: list[int]) -> list[int]:
+    """
+    :param counts: the number of cards of each code
+    :type counts: list[int]
+    :return: the number of regular cards of each rank
+    :rtype: list[int]
+    """
+    return [
+        sum(counts[c * NUM_REGULAR_RANKS + r] for c in range(NUM_REGULAR_COLORS)) for r in range(NUM_REGULAR_RANKS)
+    ]
+
+
+def color_histogram(counts: list[int]) -> list[int]:
+    """
+    :param counts: the number of cards of each code
+    :type counts: list[int]
+    :return: the number of regular cards of each color
+    :rtype: list[int]
+    """
+    return [
+        sum(counts[c * NUM_REGULAR_RANKS: (c + 1) * NUM_REGULAR_RANKS]) for c in range(NUM_REGULAR_COLORS)
+    ]
+
+
+def own_histograms(card_list: CardCollection) -> tuple[list[int], list[int]] | None:
+    """
+    Collections like CardSet keep track of their own rank and color histograms (popcounts of a bitmask), so they don't
+    have to be summed up from the card counts
+
+    :param card_list: a collection of cards
+    :type card_list: CardCollection
+    :return: the rank and color histograms of the cards or None if the collection can't give them
+    :rtype: tuple[list[int], list[int]] | None
+    """
+    if not hasattr(card_list, "rank_histogram"):
+        return None
+    return [int(n) for n in card_list.rank_histogram()], [int(n) for n in card_list.color_histogram()]
+
+
+def _assign(counts: list[int], groups: list[tuple[int, frozenset[int]]]) -> tuple[int, list[dict[int, int]]]:
+    """
+    Place as many regular cards as possible into groups of slots
+    This is a maximum bipartite matching between cards and slots, solved with augmenting paths
+
+    :param counts: the number of cards of each code
+    :type counts: list[int]
+    :param groups: the groups of slots as returned by PhaseComponent.groups
+    :type groups: list[tuple[int, frozenset[int]]]
+    :return: the number of cards placed and the number of cards of each code placed into each group
+    :rtype: tuple[int, list[dict[int, int]]]
+    """
+    groups_of_code = {}
+    for g, (_, codes) in enumerate(groups):
+        for code in codes:
+            if counts[code]:
+                groups_of_code.setdefault(code, []).append(g)
+
+    load = [0] * len(groups)
+    assigned = [{} for _ in groups]
+
+    def augment(code: int, seen: set[int]) -> bool:
+        for g in groups_of_code[code]:
+            if g in seen:
+                continue
+            seen.add(g)
+            if load[g] < groups[g][0]:
+                load[g] += 1
+                assigned[g][code] = assigned[g].get(code, 0) + 1
+                return True
+            # The group is full. See if one of its cards can move somewhere else
+            for other_code, num in list(assigned[g].items()):
+                if num and augment(other_code, seen):
+                    assigned[g][other_code] -= 1
+                    assigned[g][code] = assigned[g].get(code, 0) + 1
+                    return True
+        return False
+
+    placed = 0
+    for code, group_list in groups_of_code.items():
+        for _ in range(counts[code]):
+            # If one card of this code can't be placed, no other card of the same code can be either
+            if not augment(code, set()):
+                break
+            placed += 1
+
+    return placed, assigned
+
+
+class PhaseSolver:
+    """
+    Scores collections of cards against a phase using counts of their ranks and colors
+    Which cards can go into a component only depends on its key (its rank, color, or starting rank). So for every
+    choice of keys, we compute how many regular cards fit and let the wild cards fill the rest of the slots. When
+    every component of a phase is a set or a run (or every component is a color), the cards of each rank (or color)
+    can be counted independently, so a choice of keys is evaluated by summing over the histogram. Otherwise, we
+    solve a small matching problem between card codes and slots.
+    """
+
+    def __init__(self, phase: str):
+        self.phase = phase
+        self.components = parse_phase(phase)
+        self.len = sum(component.size for component in self.components)
+
+        kinds = set(component.kind for component in self.components)
+        if kinds <= {"R", "S"}:
+            self.axis = "rank"
+        elif kinds == {"C"}:
+            self.axis = "color"
+        else:
+            self.axis = None
+
+        # Swapping the keys of two identical components (like the two sets of S3+S3) holds the same cards, so only
+        # choices where the keys of identical components don't decrease are searched. twin[i] is the index of the
+        # last identical component before the ith one or None
+        self.twin: list[int | None] = []
+        for i, component in enumerate(self.components):
+            self.twin.append(next((j for j in range(i - 1, -1, -1) if self.components[j] == component), None))
+
+        # For phases that can be counted per rank or color, record how many cards each choice of keys can hold
+        self.combos: list[tuple[tuple[int, ...], tuple[tuple[int, int], ...]]] = []
+        if self.axis is not None and self.len > 0:
+            for keys in self.key_choices():
+                caps = {}
+                for component, key in zip(self.components, keys):
+                    for index, cap in component.caps(key):
+                        caps[index] = caps.get(index, 0) + cap
+                self.combos.append((keys, tuple(caps.items())))
+
+        # The same capacities as an array of shape (number of combos, number of ranks or colors) for score_many
+        self._cap_matrix: np.ndarray | None = None
+
+    def key_choices(self) -> Iterator[tuple[int, ...]]:
+        """
+        :return: every choice of keys for the components, up to swapping the keys of identical components
+        :rtype: Iterator[tuple[int, ...]]
+        """
+        for keys in itertools.product(*(component.keys() for component in self.components)):
+            if all(j is None or keys[j] <= key for key, j in zip(keys, self.twin)):
+                yield keys
+
+    @property
+    def cap_matrix(self) -> np.ndarray:
+        """
+        :return: an array where entry [i, j] is how many cards of rank (or color) j the ith choice of keys can hold
+        :rtype: np.ndarray
+        """
+        if self._cap_matrix is None:
+            width = NUM_REGULAR_RANKS if self.axis == "rank" else NUM_REGULAR_COLORS
+            cap_matrix = np.zeros((len(self.combos), width), dtype=np.int16)
+            for i, (_, caps) in enumerate(self.combos):
+                for index, cap in caps:
+                    cap_matrix[i, index] = cap
+            self._cap_matrix = cap_matrix
+        return self._cap_matrix
+
+    def score_many(
+        self, hands: list[CardCollection], node_budget: int | None = None, time_budget: float | None = None
+    ) -> np.ndarray:
+        """
+        Score a batch of hands at once
+        The hands are encoded as rows of card counts and, for phases made only of sets and runs (or only of colors),
+        every hand is scored against every choice of keys in a few vectorized passes. Other phases are scored one
+        hand at a time
+
+        :param hands: the collections of cards to score
+        :type hands: list[CardCollection]
+        :param node_budget: the most choices of keys to evaluate per hand that is scored on its own
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend per hand that is scored on its own
+        :type time_budget: float | None
+        :return: the score of each hand
+        :rtype: np.ndarray
+        """
+        counts = count_matrix(hands)
+        return self.score_counts(counts, hands, node_budget, time_budget)
+
+    def score_counts(
+        self,
+        counts: np.ndarray,
+        hands: list[CardCollection] | None = None,
+        node_budget: int | None = None,
+        time_budget: float | None = None,
+    ) -> np.ndarray:
+        """
+        Score a batch of hands that are already encoded by count_matrix
+
+        :param counts: the card counts of each hand
+        :type counts: np.ndarray
+        :param hands: the hands themselves. Only needed for phases that can't be vectorized
+        :type hands: list[CardCollection] | None
+        :param node_budget: the most choices of keys to evaluate per hand that is scored on its own
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend per hand that is scored on its own
+        :type time_budget: float | None
+        :return: the score of each hand
+        :rtype: np.ndarray
+        """
+        num_hands = counts.shape[0]
+        if self.len == 0:
+            return np.zeros(num_hands, dtype=np.int16)
+
+        if self.axis is None:
+            if hands is None:
+                hands = [
+                    CardCollection(_CARD_BY_CODE[code] for code in range(NUM_CARD_CODES) for _ in range(row[code]))
+                    for row in counts
+                ]
+            return np.array(
+                [self.solve(hand, node_budget, time_budget).score for hand in hands], dtype=np.int16
+            )
+
+        regular = counts[:, :WILD_CODE].reshape(num_hands, NUM_REGULAR_COLORS, NUM_REGULAR_RANKS)
+        hist = regular.sum(axis=1 if self.axis == "rank" else 2)
+
+        cap_matrix = self.cap_matrix
+        placed = np.empty(num_hands, dtype=np.int16)
+        searched = np.arange(num_hands)
+        table = _score_tables.get(self.phase)
+        if table is not None:
+            # The hands that fit in the table only need to be checked against the choice of keys it recorded
+            combos, fits = table.lookup_many(self.phase, hist)
+            placed[fits] = np.minimum(hist[fits], cap_matrix[combos[fits]]).sum(axis=1)
+            searched = searched[~fits]
+
+        chunk = max(1, _BATCH_ELEMENTS // cap_matrix.size)
+        for start in range(0, len(searched), chunk):
+            rows = searched[start: start + chunk]
+            block = hist[rows, None, :]
+            placed[rows] = np.minimum(block, cap_matrix[None, :, :]).sum(axis=2).max(axis=1)
+
+        return np.maximum(0, self.len - placed - counts[:, WILD_CODE]).astype(np.int16)
+
+    def histogram(self, counts: list[int]) -> list[int]:
+        """
+        :param counts: the number of cards of each code
+        :type counts: list[int]
+        :return: the histogram along the axis of the phase
+        :rtype: list[int]
+        """
+        if self.axis == "rank":
+            return rank_histogram(counts)
+        return color_histogram(counts)
+
+    def solve(
+        self, card_list: CardCollection, node_budget: int | None = None, time_budget: float | None = None
+    ) -> PhaseMatch:
+        """
+        Find the fewest number of cards needed to complete the phase along with the cards that make up the best
+        partial phase. This gives the same score as searching the RE graph but only looks at card counts
+
+        :param card_list: the collection of cards
+        :type card_list: CardCollection
+        :param node_budget: the most choices of keys to evaluate. None means no limit
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend. None means no limit
+        :type time_budget: float | None
+        :return: the score and the cards used. If the budget runs out, the best result found so far is returned
+        with exact set to False
+        :rtype: PhaseMatch
+        """
+        by_code = group_by_code(card_list)
+        counts = [len(cards) for cards in by_code]
+
+        if self.len == 0:
+            return self._solve_unsized(by_code, counts)
+
+        budget = SearchBudget(node_budget, time_budget)
+        placed, keys = self.best_keys(counts, budget, own_histograms(card_list))
+        search_stats.record(budget)
+        score = max(0, self.len - placed - counts[WILD_CODE])
+        cards = self._witness(by_code, counts, keys)
+        return PhaseMatch(score=score, cards=cards, explored=budget.nodes, exact=not budget.exhausted)
+
+    def best_keys(
+        self,
+        counts: list[int],
+        budget: SearchBudget | None = None,
+        hists: tuple[list[int], list[int]] | None = None,
+        bounds_cache: dict | None = None,
+    ) -> tuple[int, tuple[int, ...]]:
+        """
+        Find the keys of the components which fit the most regular cards
+
+        :param counts: the number of cards of each code
+        :type counts: list[int]
+        :param budget: limits how many choices of keys are evaluated. It also records how many were
+        :type budget: SearchBudget | None
+        :param hists: the rank and color histograms of counts if they've already been computed
+        :type hists: tuple[list[int], list[int]] | None
+        :param bounds_cache: the bounds of each component for these counts, shared between phases with the same
+        components. It's filled in as components are seen
+        :type bounds_cache: dict | None
+        :return: the number of regular cards placed and the key of each component
+        :rtype: tuple[int, tuple[int, ...]]
+        """
+        if budget is None:
+            budget = SearchBudget()
+        # Once this many regular cards are placed, the wilds complete the phase
+        enough = self.len - counts[WILD_CODE]
+
+        if self.axis is not None:
+            if hists is not None:
+                hist = hists[0] if self.axis == "rank" else hists[1]
+            else:
+                hist = self.histogram(counts)
+            table = _score_tables.get(self.phase)
+            if table is not None:
+                combo = table.lookup(self.phase, hist)
+                if combo is not None and budget.spend():
+                    keys, caps = self.combos[combo]
+                    return sum(min(hist[index], cap) for index, cap in caps), keys
+
+            best = 0
+            best_keys = self.combos[0][0]
+            for keys, caps in self.combos:
+                if not budget.spend():
+                    break
+                placed = 0
+                for index, cap in caps:
+                    placed += hist[index] if hist[index] < cap else cap
+                if placed > best:
+                    best = placed
+                    best_keys = keys
+                    if best >= enough:
+                        break
+            return best, best_keys
+
+        return self._best_keys_matching(counts, enough, budget, hists, bounds_cache)
+
+    def _best_keys_matching(
+        self,
+        counts: list[int],
+        enough: int,
+        budget: SearchBudget,
+        hists: tuple[list[int], list[int]] | None = None,
+        bounds_cache: dict | None = None,
+    ) -> tuple[int, tuple[int, ...]]:
+        rank_hist, color_hist = hists if hists is not None else (rank_histogram(counts), color_histogram(counts))
+
+        # An upper bound on the number of regular cards each component can hold for each key
+        bounds = []
+        for component in self.components:
+            if bounds_cache is not None and component in bounds_cache:
+                bounds.append(bounds_cache[component])
+                continue
+            # Try the most promising keys first
+            component_bounds = sorted(
+                ((component.supply(key, rank_hist, color_hist), key) for key in component.keys()), reverse=True
+            )
+            if bounds_cache is not None:
+                bounds_cache[component] = component_bounds
+            bounds.append(component_bounds)
+
+        # The best bound of the components that haven't been given keys yet
+        remaining = [0] * (len(self.components) + 1)
+        for i in range(len(self.components) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + bounds[i][0][0]
+
+        best = [0, tuple(b[0][1] for b in bounds)]
+
+        def search(i: int, keys: list[int], positions: list[int], bound: int):
+            if best[0] >= enough or bound + remaining[i] <= best[0]:
+                return
+            if not budget.spend():
+                return
+            if i == len(self.components):
+                groups = []
+                for component, key in zip(self.components, keys):
+                    groups.extend(component.groups(key))
+                placed, _ = _assign(counts, groups)
+                if placed > best[0]:
+                    best[0] = placed
+                    best[1] = tuple(keys)
+                return
+            # Identical components share their list of bounds, so only take keys at or after the position of the
+            # previous identical component's key
+            first = 0 if self.twin[i] is None else positions[self.twin[i]]
+            for position in range(first, len(bounds[i])):
+                component_bound, key = bounds[i][position]
+                keys.append(key)
+                positions.append(position)
+                search(i + 1, keys, positions, bound + component_bound)
+                positions.pop()
+                keys.pop()
+
+        search(0, [], [], 0)
+        return best[0], best[1]
+
+    def _witness(self, by_code: list[list], counts: list[int], keys: tuple[int, ...]) -> CardCollection:
+        """
+        Pick the actual cards that fill the components once their keys are chosen
+        """
+        groups = []
+        for component, key in zip(self.components, keys):
+            groups.extend(component.groups(key))
+        _, assigned = _assign(counts, groups)
+
+        remaining = [list(cards) for cards in by_code]
+        wilds = remaining[WILD_CODE]
+        placed = sum(sum(a.values()) for a in assigned)
+        # Only use as many wilds as needed to finish the phase
+        num_wilds = min(len(wilds), self.len - placed)
+
+        cards = CardCollection()
+        g = 0
+        for component in self.components:
+            num_groups = 1 if component.kind in ("S", "C") else component.size
+            component_cards = []
+            for group in assigned[g: g + num_groups]:
+                group_cards = []
+                for code, num in group.items():
+                    for _ in range(num):
+                        group_cards.append(remaining[code].pop())
+                if component.kind == "R":
+                    # Each position of a run holds one card and a wild takes the place of a missing one
+                    if not group_cards and num_wilds:
+                        group_cards.append(wilds.pop())
+                        num_wilds -= 1
+                    component_cards.extend(group_cards)
+                else:
+                    component_cards.extend(group_cards)
+                    while len(component_cards) < component.size and num_wilds:
+                        component_cards.append(wilds.pop())
+                        num_wilds -= 1
+            cards.extend(component_cards)
+            g += num_groups
+        return cards
+
+    def _solve_unsized(self, by_code: list[list], counts: list[int]) -> PhaseMatch:
+        """
+        Phases without a size (R, S, or C) are matched by any nonempty component, so their score is always 0
+        The cards returned are the largest component we can make
+        """
+        component = self.components[0]
+        wilds = by_code[WILD_CODE]
+
+        if component.kind in ("S", "C"):
+            hist = rank_histogram(counts) if component.kind == "S" else color_histogram(counts)
+            key = max(range(len(hist)), key=lambda i: hist[i])
+            cards = CardCollection()
+            for code in component.groups(key)[0][1]:
+                cards.extend(by_code[code])
+            cards.extend(wilds)
+            return PhaseMatch(score=0, cards=cards, explored=len(hist))
+
+        # The longest run we can make is the longest window of ranks whose gaps can be covered by the wilds
+        rank_hist = rank_histogram(counts)
+        best = (0, 0, 0)
+        explored = 0
+        for start in range(NUM_REGULAR_RANKS):
+            missing = 0
+            for end in range(start, NUM_REGULAR_RANKS):
+                explored += 1
+                if rank_hist[end] == 0:
+                    missing += 1
+                    if missing > len(wilds):
+                        break
+                if missing <= end - start and end - start + 1 > best[0]:
+                    best = (end - start + 1, start, end)
+
+        cards = CardCollection()
+        if best[0] == 0:
+            # There are no regular cards so the run is just wilds
+            cards.extend(wilds[:NUM_REGULAR_RANKS])
+            return PhaseMatch(score=0, cards=cards, explored=explored)
+
+        _, start, end = best
+        wilds = list(wilds)
+        for rank in range(start, end + 1):
+            card = next(
+                (by_code[c * NUM_REGULAR_RANKS + rank][0] for c in range(NUM_REGULAR_COLORS)
+                 if by_code[c * NUM_REGULAR_RANKS + rank]),
+                None,
+            )
+            cards.append(card if card is not None else wilds.pop())
+        return PhaseMatch(score=0, cards=cards, explored=explored)
+
+
+class MultiPhaseSolver:
+    """
+    Scores hands against every phase of a phase list at once
+    The card counts and histograms of a hand are computed once and shared by every phase. Components that appear in
+    several phases (like the S3 in S3+S3 and S3+R4) only have their bounds computed once per hand, and phases with
+    the same components in a different order (like S5+S3 and S3+S5) are only solved once
+    """
+
+    def __init__(self, phase_list: list[str]):
+        """
+        :param phase_list: the phases to score against, such as Games.phase_list
+        :type phase_list: list[str]
+        """
+        self.phase_list = list(phase_list)
+        self.solvers = {phase: PhaseSolver(phase) for phase in self.phase_list}
+        # The order of the components doesn't change the score
+        self._canonical = {
+            phase: tuple(sorted((component.kind, component.size) for component in solver.components))
+            for phase, solver in self.solvers.items()
+        }
+
+    def scores(
+        self, card_list: CardCollection, node_budget: int | None = None, time_budget: float | None = None
+    ) -> list[int]:
+        """
+        Score a hand against every phase
+
+        :param card_list: the collection of cards
+        :type card_list: CardCollection
+        :param node_budget: the most choices of keys to evaluate per phase. None means no limit
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend per phase. None means no limit
+        :type time_budget: float | None
+        :return: the number of cards needed to complete each phase, in the order of phase_list
+        :rtype: list[int]
+        """
+        if hasattr(card_list, "code_counts"):
+            counts = [int(n) for n in card_list.code_counts()]
+        else:
+            counts = [0] * NUM_CARD_CODES
+            for card in card_list:
+                counts[card.code] += 1
+        hists = own_histograms(card_list) or (rank_histogram(counts), color_histogram(counts))
+        bounds_cache = {}
+
+        by_canonical = {}
+        for phase, solver in self.solvers.items():
+            canonical = self._canonical[phase]
+            if canonical in by_canonical:
+                continue
+            if solver.len == 0:
+                by_canonical[canonical] = 0
+                continue
+            budget = SearchBudget(node_budget, time_budget)
+            placed, _ = solver.best_keys(counts, budget, hists, bounds_cache)
+            search_stats.record(budget)
+            by_canonical[canonical] = max(0, solver.len - placed - counts[WILD_CODE])
+
+        return [by_canonical[self._canonical[phase]] for phase in self.phase_list]
+
+    def score_many(
+        self, hands: list[CardCollection], node_budget: int | None = None, time_budget: float | None = None
+    ) -> np.ndarray:
+        """
+        Score a batch of hands against every phase. The hands are encoded once and shared by every phase
+
+        :param hands: the collections of cards to score
+        :type hands: list[CardCollection]
+        :param node_budget: the most choices of keys to evaluate per hand and phase that can't be vectorized
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend per hand and phase that can't be vectorized
+        :type time_budget: float | None
+        :return: an array of shape (number of phases, number of hands) where entry [i, j] is the score of the jth
+        hand against the ith phase of phase_list
+        :rtype: np.ndarray
+        """
+        counts = count_matrix(hands)
+        by_canonical = {}
+        for phase, solver in self.solvers.items():
+            canonical = self._canonical[phase]
+            if canonical not in by_canonical:
+                by_canonical[canonical] = solver.score_counts(counts, hands, node_budget, time_budget)
+
+        result = np.empty((len(self.phase_list), len(hands)), dtype=np.int16)
+        for i, phase in enumerate(self.phase_list):
+            result[i] = by_canonical[self._canonical[phase]]
+        return result
+
+    def closest(
+        self, card_list: CardCollection, node_budget: int | None = None, time_budget: float | None = None
+    ) -> tuple[int, int]:
+        """
+        :param card_list: the collection of cards
+        :type card_list: CardCollection
+        :param node_budget: the most choices of keys to evaluate per phase. None means no limit
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend per phase. None means no limit
+        :type time_budget: float | None
+        :return: the index into phase_list of the phase that needs the fewest cards (the first one if there's a tie)
+        and its score
+        :rtype: tuple[int, int]
+        """
+        scores = self.scores(card_list, node_budget, time_budget)
+        index = min(range(len(scores)), key=lambda i: scores[i])
+        return index, scores[index]
@@ -9,11 +9,22 @@ import peewee
 from BaseModel import BaseModel, CardListField
 from Card import Rank, Card
 from CardCollection import CardCollection
+from CompletionOdds import completion_probability, unseen_counts
 from Gamephasedecks import Gamephasedecks
 from Games import Games
+from HandMatcher import HandMatcher
 from RE import RE
+from TurnPlanner import TurnPlanner
 from Users import Users
 
+# Bots share the server's event loop, so every search they run on their turn is given a budget
+# Once it runs out, the bot moves with the best answer found so far
+BOT_NODE_BUDGET = 20000
+BOT_TIME_BUDGET = 0.05
+# When the top of the discard pile doesn't change our score, compare the odds of completing the phase within this
+# many draws to decide where to draw from
+BOT_LOOKAHEAD_DRAWS = 2
+
 
 @dataclasses.dataclass(init=False)
 class Players(BaseModel):
@@ -33,10 +44,14 @@ class Players(BaseModel):
     completed_phase: bool = peewee.BooleanField(default=False, null=False)
     skip_cards: CardCollection = CardListField(null=False, default=CardCollection())
 
-    def make_next_move(self):
+    def make_next_move(self, node_budget: int | None = BOT_NODE_BUDGET, time_budget: float | None = BOT_TIME_BUDGET):
         """
         Calculates what the next move should be for a bot player
 
+        :param node_budget: the most nodes each search may explore
+        :type node_budget: int | None
+        :param time_budget: the most seconds each search may take
+        :type time_budget: float | None
         :return: a dictionary which can be converted into JSON. The format is meant to be passed into the handle_data method in app.py
         :rtype: dict
         """
@@ -72,18 +87,43 @@ class Players(BaseModel):
                     "action": "draw_discard",
                 }
 
-            re = RE(game.phase_list[self.phase_index])
+            re = RE.compile(game.phase_list[self.phase_index])
 
-            score = re.score(self.hand)
+            hand_with_discard = CardCollection(self.hand + [game.discard[-1]])
+            (score, score_with_discard) = re.score_many([self.hand, hand_with_discard], node_budget, time_budget)
 
             # Card in discard pile will get us closer to completing our phase
-            if re.score(CardCollection(self.hand + [game.discard[-1]])) < score:
+            if score_with_discard < score:
                 return {
                     "player_id": self.id,
                     "type": "player_action",
                     "action": "draw_discard",
                 }
 
+            # Break ties with the odds of completing the phase. This is only quick enough for phases which can be
+            # counted per rank or color
+            if score_with_discard == score > 0 and not self.completed_phase and re.solver.axis is not None:
+                known = CardCollection(self.hand + game.discard)
+                for gpd in Gamephasedecks.select().where(Gamephasedecks.game == game):
+                    known.extend(gpd.deck)
+                unseen = unseen_counts(known)
+                # Taking the discard uses up one of the draws
+                odds_with_discard = completion_probability(
+                    re,
+                    hand_with_discard,
+                    unseen,
+                    BOT_LOOKAHEAD_DRAWS - 1,
+                    node_budget,
+                    time_budget,
+                )
+                odds = completion_probability(re, self.hand, unseen, BOT_LOOKAHEAD_DRAWS, node_budget, time_budget)
+                if odds_with_discard > odds:
+                    return {
+                        "player_id": self.id,
+                        "type": "player_action",
+                        "action": "draw_discard",
+                    }
+
             return {
                 "player_id": self.id,
                 "type": "player_action",
@@ -92,9 +132,11 @@ class Players(BaseModel):
 
         else:
             if not self.completed_phase:
-                rr = RE(game.phase_list[self.phase_index])
+                rr = RE.compile(game.phase_list[self.phase_index])
 
-                (result, hand_subset) = rr.isSubsetAccepted(self.hand)
+                (result, hand_subset) = rr.isSubsetAccepted(
+                    self.hand, node_budget=node_budget, time_budget=time_budget
+                )
 
                 if result:
                     return {
@@ -121,18 +163,13 @@ class Players(BaseModel):
                                 "to": other_players[-1].user.id,
                             }
 
-                    score = rr.score(self.hand)
+                    matcher = HandMatcher(rr, self.hand, node_budget, time_budget)
+                    score = matcher.score
                     # Discard any card in our hand which isn't necessary to completing our phase
                     for i in range(len(self.hand)):
                         if self.hand[i].rank is Rank.WILD:
                             continue
-                        if (
-                            not self.drew_card
-                            and rr.score(
-                                self.hand[:i] + self.hand[i + 1 :] + [game.discard[-1]]
-                            )
-                            > score
-                        ):
+                        if matcher.score_if(remove=self.hand[i]) <= score:
                             return {
                                 "player_id": self.id,
                                 "type": "player_action",
@@ -150,45 +187,7 @@ class Players(BaseModel):
                                 "card_id": card.id,
                             }
             else:
-                gpd_list = list(
-                    Gamephasedecks.select().where(Gamephasedecks.game == game)
-                )
-
-                # if we can put down, do it
-                for gpd in gpd_list:
-                    re = RE(gpd.phase)
-                    for card in self.hand:
-                        if re.isFullyAccepted(
-                            CardCollection(CardCollection([card]) + gpd.deck)
-                        ):
-                            return {
-                                "player_id": self.id,
-                                "type": "player_action",
-                                "action": "put_down",
-                                "phase_deck_id": gpd.id,
-                                "cards": CardCollection([card]).to_json_dict(),
-                                "direction": "start",
-                            }
-                        if re.isFullyAccepted(
-                            CardCollection(gpd.deck + CardCollection([card]))
-                        ):
-                            return {
-                                "player_id": self.id,
-                                "type": "player_action",
-                                "action": "put_down",
-                                "phase_deck_id": gpd.id,
-                                "cards": CardCollection([card]).to_json_dict(),
-                                "direction": "end",
-                            }
-
-                for card in self.hand:
-                    if card.rank is not Rank.WILD:
-                        return {
-                            "player_id": self.id,
-                            "type": "player_action",
-                            "action": "discard",
-                            "card_id": card.id,
-                        }
+                return self._planned_moves(game, node_budget, time_budget)[0]
 
             # Otherwise, pick a random card to discard
             return {
@@ -198,6 +197,54 @@ class Players(BaseModel):
                 "card_id": random.choice(self.hand).id,
             }
 
+    def make_next_moves(
+        self, node_budget: int | None = BOT_NODE_BUDGET, time_budget: float | None = BOT_TIME_BUDGET
+    ) -> list[dict]:
+        """
+        Calculates as many of the next moves for a bot player as can be known ahead of time
+        Once the phase is complete and a card has been drawn, this is every put down for the rest of the turn
+        followed by the discard. Otherwise, it's the single move from make_next_move
+
+        :param node_budget: the most nodes each search may explore
+        :type node_budget: int | None
+        :param time_budget: the most seconds each search may take
+        :type time_budget: float | None
+        :return: dictionaries which can be converted into JSON and passed into the handle_data method in app.py in
+        order
+        :rtype: list[dict]
+        """
+        game = self.game
+        if game.current_player == self.user and not self.skip_cards and self.drew_card and self.completed_phase:
+            return self._planned_moves(game, node_budget, time_budget)
+        return [self.make_next_move(node_budget, time_budget)]
+
+    def _planned_moves(self, game: Games, node_budget: int | None, time_budget: float | None) -> list[dict]:
+        # Plan the rest of the turn after the phase is complete
+        gpd_list = list(Gamephasedecks.select().where(Gamephasedecks.game == game))
+        plan = TurnPlanner(gpd_list).plan(self.hand, node_budget, time_budget)
+
+        moves = [
+            {
+                "player_id": self.id,
+                "type": "player_action",
+                "action": "put_down",
+                "phase_deck_id": put_down.deck_id,
+                "cards": CardCollection([put_down.card]).to_json_dict(),
+                "direction": put_down.direction,
+            }
+            for put_down in plan.put_downs
+        ]
+        if plan.discard is not None:
+            moves.append(
+                {
+                    "player_id": self.id,
+                    "type": "player_action",
+                    "action": "discard",
+                    "card_id": plan.discard.id,
+                }
+            )
+        return moves
+
     def toJSON(self):
         return json.dumps(self.to_json_dict())
 
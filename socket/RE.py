@@ -1,14 +1,23 @@
+import argparse
 import collections
 import dataclasses
+import heapq
+import itertools
+import math
 import re
+import time
 import uuid
 from typing import Self
 
 import graphviz
+import numpy as np
 import vel_data_structures
 
-from Card import Card, Color, Rank
+from Card import Card, Color, NUM_CARD_CODES, NUM_REGULAR_RANKS, Rank, WILD_CODE
 from CardCollection import CardCollection
+from CompiledRE import CompiledRE, load_bundle, save_bundle
+from LRUCache import LRUCache
+from PhaseSolver import PhaseMatch, PhaseSolver, SearchBudget, cards_from_codes, hand_signature, search_stats
 
 
 @dataclasses.dataclass
@@ -348,6 +357,49 @@ def _strictSet(size: int) -> (_State, set[_State]):
     return start_state, final_state_set
 
 
+# Compiled phases are shared by every game and thread in the server
+# The phases of a game rarely change, so a few hundred entries covers the default phases and any custom ones
+_compiled_phases = LRUCache(maxsize=256)
+
+# Automata loaded from a bundle by RE.load_bundle, indexed by phase. RE.compile uses them instead of building graphs
+_bundled_tables: dict[str, CompiledRE] = {}
+
+# The best partial phase of every hand we've recently matched, keyed by (phase, hand_signature(hand))
+# Card ids don't matter for matching, so hands with the same cards share an entry within a turn, across turns,
+# and across games
+_matches = LRUCache(maxsize=16384)
+
+# How RE.isFullyAccepted walks the automaton
+# graph follows the _State objects directly while table uses the flat transition table in CompiledRE
+BACKENDS = ("graph", "table")
+DEFAULT_BACKEND = "table"
+
+# How RE.score finds the best partial phase
+# histogram uses PhaseSolver while bnb runs a branch-and-bound search over the RE graph. packed runs the same search
+# over the states of CompiledRE with every search state packed into integers
+SCORE_METHODS = ("histogram", "bnb", "packed")
+# How RE.isSubsetAccepted looks for a matching subset
+# histogram uses PhaseSolver while dfs runs a depth-first search over the RE graph
+SUBSET_METHODS = ("histogram", "dfs")
+
+# Where the server looks for the bundle of compiled phases at startup
+DEFAULT_BUNDLE_FILE = "phases.bundle"
+
+# The phases of a new game
+DEFAULT_PHASE_LIST = [
+    "S3+S3",
+    "S3+R4",
+    "S4+R4",
+    "R7",
+    "R8",
+    "R9",
+    "S4+S4",
+    "C7",
+    "S5+S2",
+    "S5+S3",
+]
+
+
 @dataclasses.dataclass
 class RE:
     """
@@ -360,6 +412,12 @@ class RE:
     # The start state for the graph
     startState: _State = dataclasses.field(default_factory=_State)
     len: int = 0
+    # Either graph or table (see BACKENDS)
+    backend: str = "graph"
+    # The table-driven automaton. This is only built for the table backend
+    table: CompiledRE | None = dataclasses.field(default=None, init=False, repr=False, compare=False)
+    # Scores hands using counts of ranks and colors
+    solver: PhaseSolver = dataclasses.field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         """
@@ -456,16 +514,224 @@ class RE:
         if not has_match:
             raise Exception(f"Unrecognized phase {self.phase}!")
 
-    def score(self, card_list: CardCollection) -> int:
+        self.solver = PhaseSolver(self.phase)
+
+        match self.backend:
+            case "graph":
+                pass
+            case "table":
+                self.table = CompiledRE.from_graph(self.phase, self.len, self.startState).minimize()
+            case _:
+                raise Exception(f"{self.backend} is not a valid backend! Must be one of {BACKENDS}")
+
+    @classmethod
+    def from_compiled(cls, table: CompiledRE) -> Self:
+        """
+        Create an RE around an automaton that has already been compiled without building its graph
+        The graph is only built if something needs it, such as the bnb score method or to_graphviz
+
+        :param table: the compiled automaton
+        :type table: CompiledRE
+        :return: an RE that uses the table backend
+        :rtype: RE
+        """
+        rr = cls.__new__(cls)
+        rr.phase = table.phase
+        rr.len = table.len
+        rr.backend = "table"
+        rr.table = table
+        rr.solver = PhaseSolver(table.phase)
+        return rr
+
+    def __getattr__(self, key):
+        # Only called for missing attributes, which is how an RE created by from_compiled builds its graph on demand
+        if key == "startState" and "phase" in self.__dict__:
+            start_state = RE(self.phase).startState
+            object.__setattr__(self, "startState", start_state)
+            return start_state
+        raise AttributeError(f"{type(self).__name__} has no attribute {key}")
+
+    def __setattr__(self, key, value):
+        # Compiled phases are shared between games and threads, so they must never change once they're cached
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"Cannot modify {key} of the compiled phase {self.phase}!")
+        super().__setattr__(key, value)
+
+    @classmethod
+    def compile(cls, phase: str, backend: str = DEFAULT_BACKEND) -> Self:
+        """
+        Get the RE for a phase from the process-wide cache, building it if it hasn't been compiled yet
+        The returned RE is immutable and can be shared between games and threads
+
+        :param phase: the phase to compile
+        :type phase: str
+        :param backend: how isFullyAccepted should walk the automaton (see BACKENDS)
+        :type backend: str
+        :return: the compiled RE for the phase
+        :rtype: RE
+        :raises Exception: if the phase or backend is invalid
+        """
+
+        def build():
+            if backend == "table" and phase in _bundled_tables:
+                rr = cls.from_compiled(_bundled_tables[phase])
+            else:
+                rr = cls(phase, backend=backend)
+            rr._frozen = True
+            return rr
+
+        return _compiled_phases.get_or_create((phase, backend), build)
+
+    @staticmethod
+    def save_bundle(path: str, phase_list: list[str]):
+        """
+        Compile phases for the table backend and write them to a bundle which can be loaded with load_bundle
+
+        :param path: where to write the bundle
+        :type path: str
+        :param phase_list: the phases to compile
+        :type phase_list: list[str]
+        """
+        save_bundle(path, [RE(phase, backend="table").table for phase in dict.fromkeys(phase_list)])
+
+    @staticmethod
+    def load_bundle(path: str) -> list[str]:
+        """
+        Load a bundle written by save_bundle so that compile can use its automata without building any graphs
+        Phases that aren't in the bundle are still compiled the first time they're needed
+
+        :param path: the bundle to load
+        :type path: str
+        :return: the phases in the bundle
+        :rtype: list[str]
+        """
+        tables = load_bundle(path)
+        _bundled_tables.update(tables)
+        return list(tables)
+
+    @staticmethod
+    def cache_info() -> dict[str, int | float]:
+        """
+        :return: the hit, miss, and eviction counters of the compiled phase cache
+        :rtype: dict[str, int | float]
+        """
+        return _compiled_phases.stats()
+
+    def match(
+        self, card_list: CardCollection, node_budget: int | None = None, time_budget: float | None = None
+    ) -> PhaseMatch:
+        """
+        Find the best partial phase that can be made from a collection of cards
+
+        :param card_list: the list of cards to test
+        :type card_list: CardCollection
+        :param node_budget: the most nodes to explore. None means no limit
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend. None means no limit
+        :type time_budget: float | None
+        :return: the number of cards needed to satisfy the regular expression and the cards which make up the best
+        partial phase (in the order expected by isFullyAccepted). If the budget runs out, exact is False and the
+        score is an upper bound
+        :rtype: PhaseMatch
+        """
+        key = (self.phase, hand_signature(card_list))
+        cached = _matches.get(key)
+        if cached is not None:
+            (score, codes, explored) = cached
+            return PhaseMatch(score=score, cards=cards_from_codes(card_list, codes), explored=explored)
+
+        result = self.solver.solve(card_list, node_budget, time_budget)
+        # A search that ran out of budget might not have the right answer, so it isn't remembered
+        if result.exact:
+            _matches.put(key, (result.score, tuple(card.code for card in result.cards), result.explored))
+        return result
+
+    @staticmethod
+    def match_cache_info() -> dict[str, int | float]:
+        """
+        :return: the hit, miss, and eviction counters of the cache of matched hands
+        :rtype: dict[str, int | float]
+        """
+        return _matches.stats()
+
+    @staticmethod
+    def clear_match_cache():
+        """
+        Forget every matched hand, such as before timing how long matching takes
+        """
+        _matches.clear()
+
+    def score_many(
+        self, hands: list[CardCollection], node_budget: int | None = None, time_budget: float | None = None
+    ) -> np.ndarray:
+        """
+        Score many hands with a single call. This gives the same results as calling score on each hand
+
+        :param hands: the collections of cards to score
+        :type hands: list[CardCollection]
+        :param node_budget: the most nodes to explore per hand. None means no limit
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend per hand. None means no limit
+        :type time_budget: float | None
+        :return: the score of each hand
+        :rtype: np.ndarray
+        """
+        return self.solver.score_many(hands, node_budget, time_budget)
+
+    def score(
+        self,
+        card_list: CardCollection,
+        method: str = "histogram",
+        node_budget: int | None = None,
+        time_budget: float | None = None,
+    ) -> int:
         """
         Given a collection of cards, this will assign a score to them indicating if any subset of them satisfy the regular expression
         0 means there is a subset and any other natural number indicates the number of cards needed to satisfy the regular expression
+        If the search runs out of budget, the best score found so far is returned. This is never lower than the real
+        score. Use match to find out if the score is exact
 
         :param card_list: the list of cards to test
         :type CardCollection
+        :param method: how to find the score (see SCORE_METHODS). Every method gives the same score
+        :type method: str
+        :param node_budget: the most nodes to explore. None means no limit
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend. None means no limit
+        :type time_budget: float | None
         :return: the number of cards needed to satisfy the regular expression
         :rtype: int
         """
+        match method:
+            case "histogram":
+                return self.match(card_list, node_budget, time_budget).score
+            case "bnb":
+                return self._score_bnb(card_list, SearchBudget(node_budget, time_budget))
+            case "packed":
+                return self._score_packed(card_list, SearchBudget(node_budget, time_budget))
+            case _:
+                raise Exception(f"{method} is not a valid scoring method! Must be one of {SCORE_METHODS}")
+
+    @staticmethod
+    def search_info() -> dict[str, int]:
+        """
+        :return: counters describing the work done by every search in the process
+        :rtype: dict[str, int]
+        """
+        return search_stats.snapshot()
+
+    def _score_bnb(self, card_list: CardCollection, budget: SearchBudget) -> int:
+        """
+        Compute the score with a best-first branch-and-bound search over the RE graph
+
+        :param card_list: the list of cards to test
+        :type CardCollection
+        :param budget: limits how many states are expanded
+        :type budget: SearchBudget
+        :return: the number of cards needed to satisfy the regular expression. If the budget runs out, the number of
+        cards needed to complete the largest partial phase found so far
+        :rtype: int
+        """
 
         @dataclasses.dataclass(frozen=True)
         class BNBState:
@@ -649,56 +915,247 @@ class RE:
             BNBState(deck=card_list, phase_len=self.len, curr_re_state=self.startState)
         )
         explored = {candidate_set.peek()}
+        # Any partial phase can be completed with imaginary cards, so the largest one gives an upper bound
+        most_cards = 0
 
         while candidate_set:
             candidate = candidate_set.pop()
             # print(candidate)
             if candidate.isSolution():
+                search_stats.record(budget)
                 return candidate.score()
+            if not budget.spend():
+                search_stats.record(budget)
+                return self.len - most_cards
 
+            most_cards = max(most_cards, len(candidate.hand))
             for child in candidate.expand():
                 if child in explored:
                     continue
                 candidate_set.insert(child)
                 explored.add(child)
 
+        search_stats.record(budget)
         return 0
 
+    def _score_packed(self, card_list: CardCollection, budget: SearchBudget, symmetric: bool = True) -> int:
+        """
+        Compute the score with the same best-first search as _score_bnb without creating any objects per state
+        A search state is the number of cards of each code left in the hand, the state of the compiled automaton, and
+        the number of imaginary cards used so far. The counts are packed into a single integer with a fixed number of
+        bits per code, so placing a card is a subtraction and a state is deduplicated by hashing an integer
+        Cards the automaton can't tell apart are counted under one code (only ranks matter to sets and runs and only
+        colors matter to color components). If relabeling the colors leaves the hand as it is, a position and its
+        relabeled copy are explored once
+
+        :param card_list: the list of cards to test
+        :type CardCollection
+        :param budget: limits how many states are expanded
+        :type budget: SearchBudget
+        :param symmetric: if positions that are the same up to relabeling colors are only explored once
+        :type symmetric: bool
+        :return: the same score as _score_bnb
+        :rtype: int
+        """
+        if self.len == 0:
+            search_stats.record(budget)
+            return 0
+        table = self.table if self.table is not None else RE.compile(self.phase, "table").table
+        transitions = table.transitions
+        final = table.final
+        num_states = table.num_states
+
+        if symmetric:
+            code_counts = collections.Counter(table.code_classes[card.code] for card in card_list)
+        else:
+            code_counts = collections.Counter(card.code for card in card_list)
+        codes = sorted(code_counts)
+        bits = max(code_counts.values(), default=0).bit_length()
+        mask = (1 << bits) - 1
+        packed = 0
+        for code, count in code_counts.items():
+            packed |= count << (code * bits)
+
+        # The cards of each color take up one block of bits, so relabeling colors moves whole blocks
+        block_bits = NUM_REGULAR_RANKS * bits
+        block_mask = (1 << block_bits) - 1
+        special_mask = ~((1 << (WILD_CODE * bits)) - 1)
+
+        def relabel(counts: int, perm: tuple[int, ...]) -> int:
+            result = counts & special_mask
+            for color, image in enumerate(perm):
+                result |= (counts >> (color * block_bits) & block_mask) << (image * block_bits)
+            return result
+
+        # Only the relabelings which leave the hand unchanged can be used since they map the positions we can reach
+        # onto each other
+        symmetries = []
+        if symmetric:
+            symmetries = [(perm, states) for perm, states in table.color_symmetries if relabel(packed, perm) == packed]
+
+        def key(counts: int, state: int) -> int:
+            k = counts * num_states + state
+            for perm, states in symmetries:
+                k = min(k, relabel(counts, perm) * num_states + states[state])
+            return k
+
+        # (imaginary cards used, -cards placed, packed counts, automaton state)
+        frontier = [(0, 0, packed, table.start)]
+        # The fewest imaginary cards used to reach each (packed counts, automaton state)
+        seen = {key(packed, table.start): 0}
+        most_cards = 0
+
+        while frontier:
+            (error, placed, counts, state) = heapq.heappop(frontier)
+            if final[state]:
+                search_stats.record(budget)
+                return error
+            if seen[key(counts, state)] < error:
+                continue
+            if not budget.spend():
+                search_stats.record(budget)
+                return self.len - most_cards
+            most_cards = max(most_cards, -placed)
+
+            base = state * NUM_CARD_CODES
+            # Place a card from the hand
+            for code in codes:
+                shift = code * bits
+                if not counts >> shift & mask:
+                    continue
+                next_state = transitions[base + code]
+                if next_state < 0:
+                    continue
+                next_counts = counts - (1 << shift)
+                k = key(next_counts, next_state)
+                if seen.get(k, error + 1) > error:
+                    seen[k] = error
+                    heapq.heappush(frontier, (error, placed - 1, next_counts, next_state))
+            # Or an imaginary card which can be anything
+            for next_state in set(transitions[base: base + NUM_CARD_CODES]):
+                if next_state < 0:
+                    continue
+                k = key(counts, next_state)
+                if seen.get(k, error + 2) > error + 1:
+                    seen[k] = error + 1
+                    heapq.heappush(frontier, (error + 1, placed, counts, next_state))
+
+        search_stats.record(budget)
+        return self.len - most_cards
+
     def isSubsetAccepted(
-        self, card_list: CardCollection
+        self,
+        card_list: CardCollection,
+        method: str = "histogram",
+        node_budget: int | None = None,
+        time_budget: float | None = None,
     ) -> tuple[bool, CardCollection]:
         """
         Given a collection of cards, compute if any hand created from them can satisfy the regular expression
+        If the search runs out of budget before finding a subset, we report that there is none. Use match to find out
+        if the answer is exact
 
         :param card_list: the collection of cards
         :type CardCollection
+        :param method: how to look for the subset (see SUBSET_METHODS)
+        :type method: str
+        :param node_budget: the most nodes to explore. None means no limit
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend. None means no limit
+        :type time_budget: float | None
         :return: a tuple with a boolean to indicate if a subset of cards can satisfy the regular expression and
         a collection of cards that satisfies our regular expression.
         If no such subset exists, an empty card collection is returned
         :rtype tuple[bool, CardCollection]
         """
+        match method:
+            case "histogram":
+                result = self.match(card_list, node_budget, time_budget)
+                if result.is_complete:
+                    return True, result.cards
+                return False, CardCollection()
+            case "dfs":
+                return self._isSubsetAccepted_dfs(card_list, SearchBudget(node_budget, time_budget))
+            case _:
+                raise Exception(f"{method} is not a valid subset method! Must be one of {SUBSET_METHODS}")
+
+    def _isSubsetAccepted_dfs(
+        self, card_list: CardCollection, budget: SearchBudget
+    ) -> tuple[bool, CardCollection]:
+        """
+        Look for a subset of cards that satisfies the regular expression with a depth-first search over the RE graph
+        The number of paths explored grows combinatorially with the number of cards (especially wilds)
+
+        :param card_list: the collection of cards
+        :type CardCollection
+        :param budget: limits how many states are expanded
+        :type budget: SearchBudget
+        :return: the same tuple as isSubsetAccepted
+        :rtype tuple[bool, CardCollection]
+        """
+        # Cards the automaton can't tell apart lead to the same subtree, so only one of them is tried at each node
+        table = self.table if self.table is not None else RE.compile(self.phase, "table").table
+        code_classes = table.code_classes
         stack = [(CardCollection([]), self.startState)]
 
         while stack:
             (c_list, state) = stack.pop()
             c_id_set = set(c.id for c in c_list)
             if state.is_final:
+                search_stats.record(budget)
                 return True, c_list
+            if not budget.spend():
+                break
 
             if state.emptyTransition is not None:
                 stack.append((CardCollection(c_list), state.getNext(card)))
                 continue
 
+            tried = set()
             for card in card_list:
                 if card.id in c_id_set:
                     continue
+                if code_classes[card.code] in tried:
+                    continue
+                tried.add(code_classes[card.code])
                 if not state.isAccepted(card):
                     continue
 
                 stack.append((CardCollection(c_list + [card]), state.getNext(card)))
 
+        search_stats.record(budget)
         return False, CardCollection()
 
+    def arrange(self, card_list: CardCollection) -> list[CardCollection] | None:
+        """
+        Determines if a collection of cards makes up the phase in any order and, if so, splits it into the components
+        of the phase. Unlike isFullyAccepted, the cards can be given in any order. The assignment of cards to
+        components comes from the same rank and color counts used by match
+
+        :param card_list: the cards to test. Every card must be used
+        :type card_list: CardCollection
+        :return: the cards of each component, in the order of the components, with each component in an order that
+        isFullyAccepted accepts. None if the cards don't make up the phase
+        :rtype: list[CardCollection] | None
+        """
+        if self.len == 0:
+            # Phases without a size are a single component, so only the order of the cards can be fixed
+            return [CardCollection(card_list)] if self.isFullyAccepted(card_list) else None
+
+        if len(card_list) != self.len:
+            return None
+        # A complete match of exactly len cards uses every one of them
+        m = self.match(card_list)
+        if m.score != 0 or len(m.cards) != self.len or not self.isFullyAccepted(m.cards):
+            return None
+
+        components = []
+        start = 0
+        for component in self.solver.components:
+            components.append(CardCollection(m.cards[start: start + component.size]))
+            start += component.size
+        return components
+
     def isFullyAccepted(self, card_list: CardCollection) -> bool:
         """
         Determines if a sequence of cards matches the phase exactly as stated. It must match the exact order of the
@@ -709,6 +1166,9 @@ class RE:
         :return: if the cards match the phase
         :rtype: bool
         """
+        if self.table is not None:
+            return self.table.isFullyAccepted(card_list)
+
         curr = self.startState
         for c in card_list:
             while curr.emptyTransition is not None:
@@ -720,6 +1180,32 @@ class RE:
 
         return curr.is_final
 
+    def graph_size(self) -> tuple[int, int]:
+        """
+        :return: the number of states and transitions in the graph, including the empty ones
+        :rtype: tuple[int, int]
+        """
+        q = collections.deque([self.startState])
+        visited = {self.startState}
+        num_edges = 0
+
+        while q:
+            curr = q.popleft()
+            next_states = [
+                *curr.rankTransition.values(),
+                *curr.colorTransition.values(),
+                *curr.cardTransition.values(),
+            ]
+            if curr.emptyTransition is not None:
+                next_states.append(curr.emptyTransition)
+            num_edges += len(next_states)
+            for state in next_states:
+                if state not in visited:
+                    visited.add(state)
+                    q.append(state)
+
+        return len(visited), num_edges
+
     def to_graphviz(self):
         """
         Outputs the graph to pdf format for visualization
@@ -756,7 +1242,170 @@ class RE:
         g.render()
 
 
+def automaton_report(phase_list: list[str]) -> list[dict[str, int | str]]:
+    """
+    Compare the size of the automaton for each phase as it's built, once the empty transitions are removed, and once
+    it's minimized. The graph counts one transition per rank, color, or card it reads while the tables count one
+    transition per card code. The last columns show how much the symmetries shrink the searches: the choices of keys
+    PhaseSolver tries with and without swapping identical components, the number of card codes the automaton can
+    tell apart, and the number of relabelings of the colors it's unchanged by
+
+    :param phase_list: the phases to report on
+    :type phase_list: list[str]
+    :return: one row per phase
+    :rtype: list[dict[str, int | str]]
+    """
+    rows = []
+    for phase in phase_list:
+        rr = RE(phase)
+        graph_states, graph_edges = rr.graph_size()
+        table = CompiledRE.from_graph(phase, rr.len, rr.startState)
+        minimized = table.minimize()
+        rows.append(
+            {
+                "phase": phase,
+                "graph_states": graph_states,
+                "graph_edges": graph_edges,
+                "table_states": table.num_states,
+                "table_edges": table.num_edges(),
+                "minimized_states": minimized.num_states,
+                "minimized_edges": minimized.num_edges(),
+                "key_choices": math.prod(len(component.keys()) for component in rr.solver.components),
+                "distinct_key_choices": sum(1 for _ in rr.solver.key_choices()),
+                "code_classes": len(set(minimized.code_classes)),
+                "color_symmetries": len(minimized.color_symmetries),
+            }
+        )
+    return rows
+
+
+def score_method_report(cases: list[tuple[str, CardCollection]], methods=SCORE_METHODS) -> list[dict[str, float | str]]:
+    """
+    Time every score method on the same hands and count the search nodes they explore. The packed method is also run
+    without its symmetry reduction to show how many nodes it saves. The first call for each phase builds its
+    automata, so the phases are compiled and their graphs are built before any timing starts
+
+    :param cases: a list of (phase, hand)
+    :type cases: list[tuple[str, CardCollection]]
+    :param methods: the score methods to time
+    :type methods: tuple[str, ...]
+    :return: one row per method
+    :rtype: list[dict[str, float | str]]
+    :raises Exception: if the methods disagree on a score
+    """
+    compiled = {phase: RE.compile(phase) for phase, _ in cases}
+    for rr in compiled.values():
+        # Build the graph now in case the RE was loaded from a bundle
+        rr.startState
+        if rr.len:
+            RE.compile(rr.phase, "table").table.color_symmetries
+
+    scorers = [(method, lambda rr, hand, m=method: rr.score(hand, method=m)) for method in methods]
+    if "packed" in methods:
+        scorers.append(
+            ("packed (no symmetry)", lambda rr, hand: rr._score_packed(hand, SearchBudget(), symmetric=False))
+        )
+
+    rows = []
+    expected = None
+    for name, scorer in scorers:
+        before = search_stats.snapshot()["nodes"]
+        start = time.perf_counter()
+        scores = [scorer(compiled[phase], hand) for phase, hand in cases]
+        seconds = time.perf_counter() - start
+        if expected is not None and scores != expected:
+            raise Exception(f"{name} disagrees with {scorers[0][0]}!")
+        expected = scores
+        rows.append(
+            {
+                "method": name,
+                "hands": len(cases),
+                "nodes": search_stats.snapshot()["nodes"] - before,
+                "seconds": round(seconds, 4),
+                "us_per_hand": round(seconds / max(1, len(cases)) * 1e6, 1),
+            }
+        )
+    return rows
+
+
+def score_test_cases() -> list[tuple[str, CardCollection]]:
+    """
+    :return: the hands scored by TestRE.test_score as a list of (phase, hand)
+    :rtype: list[tuple[str, CardCollection]]
+    """
+    cases = []
+    cards = [Card.from_string(c) for c in "R1 R3 B4 G5".split(" ")]
+    for n in range(len(cards) + 1):
+        for subset in itertools.combinations(cards, n):
+            for ordering in itertools.permutations(subset):
+                cases.append(("R10", CardCollection(ordering)))
+    for phase, hand in [
+        ("S3", "R3 G3 B7"),
+        ("C7", "R1 R2 R3 B1 B2 B3 B4"),
+        ("C7", "R1 R2 R3 R4 R5 B1 B2 B3 B4 B5 B6"),
+        ("S3", "R1 B1"),
+        ("R4", "R12"),
+        ("R4+S4", "R2 R3 R4 R5 R6 B2 G2 Y2"),
+        ("R4+S4", "R6 R5 R4 R3 R2 Y2 G2 B2"),
+        ("R4+S4", "R6"),
+    ]:
+        cases.append((phase, CardCollection([Card.from_string(c) for c in hand.split(" ")])))
+    return cases
+
+
+def print_rows(rows: list[dict]):
+    """
+    Print rows with the same keys as a right-aligned table
+    """
+    columns = list(rows[0].keys())
+    widths = [max(len(column), *(len(str(row[column])) for row in rows)) for column in columns]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(width) for column, width in zip(columns, widths)))
+
+
+def print_automaton_report(phase_list: list[str]):
+    """
+    Print automaton_report as a table
+    """
+    print_rows(automaton_report(phase_list))
+
+
 def main():
+    parser = argparse.ArgumentParser(prog="RE", description="Build and inspect the automata for phases")
+    parser.add_argument(
+        "phases",
+        nargs="*",
+        default=DEFAULT_PHASE_LIST,
+        help="The phases to use with --report or --bundle. By default, every phase in DEFAULT_PHASE_LIST",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Print the number of states and transitions of each automaton before and after minimization",
+    )
+    parser.add_argument(
+        "--bundle",
+        metavar="FILENAME",
+        help=f"Compile the phases into a bundle which the server loads at startup (usually {DEFAULT_BUNDLE_FILE})",
+    )
+
+    parser.add_argument(
+        "--compare-scores",
+        action="store_true",
+        help="Time every score method on the hands of TestRE.test_score",
+    )
+
+    parsed_args = parser.parse_args()
+    if parsed_args.report:
+        print_automaton_report(parsed_args.phases)
+    if parsed_args.bundle:
+        RE.save_bundle(parsed_args.bundle, parsed_args.phases)
+    if parsed_args.compare_scores:
+        print_rows(score_method_report(score_test_cases()))
+    if parsed_args.report or parsed_args.bundle or parsed_args.compare_scores:
+        return
+
     rr = RE("S3+S3+R7+C4")
     print(
         rr.isFullyAccepted(
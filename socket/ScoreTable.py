@@ -0,0 +1,329 @@
+"""
+Phases made only of sets and runs don't care about colors, so a hand boils down to how many cards it has of each rank
+(the wilds just fill whatever is left over). This program enumerates every such histogram for the phases we use
+and records which choice of component keys fits the most cards. The server memory-maps the resulting file at
+startup so that scoring a hand becomes a single lookup.
+"""
+
+import argparse
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from Card import NUM_REGULAR_RANKS
+from PhaseSolver import PhaseSolver, register_score_table
+from RE import DEFAULT_PHASE_LIST
+
+MAGIC = b"P10T"
+VERSION = 3
+# magic, version, the most regular cards in a histogram, number of phases, crc32 of everything after the header
+_HEADER = struct.Struct("<4sHBHI")
+# phase, number of combos, bytes per entry, offset of the table in the file
+_ENTRY = struct.Struct("<32sHBQ")
+# The longest phase (in UTF-8 bytes) that fits in an entry
+MAX_PHASE_BYTES = 32
+
+DEFAULT_MAX_CARDS = 11
+DEFAULT_FILE = "score_tables.bin"
+
+
+def num_histograms(num_ranks: int, max_cards: int) -> int:
+    """
+    :param num_ranks: the number of ranks
+    :type num_ranks: int
+    :param max_cards: the most cards in a histogram
+    :type max_cards: int
+    :return: the number of histograms over num_ranks ranks with at most max_cards cards
+    :rtype: int
+    """
+    if max_cards < 0:
+        return 0
+    return math.comb(max_cards + num_ranks, num_ranks)
+
+
+def _rank_offsets(max_cards: int) -> np.ndarray:
+    """
+    Histograms are numbered in lexicographic order. Entry [i, used, v] is how many histograms come before the ones
+    whose ith rank has v cards among those that share the first i ranks and have used cards in them
+
+    :param max_cards: the most cards in a histogram
+    :type max_cards: int
+    :return: an array of shape (NUM_REGULAR_RANKS, max_cards + 1, max_cards + 1)
+    :rtype: np.ndarray
+    """
+    offsets = np.zeros((NUM_REGULAR_RANKS, max_cards + 1, max_cards + 1), dtype=np.int64)
+    for i in range(NUM_REGULAR_RANKS):
+        remaining_ranks = NUM_REGULAR_RANKS - i - 1
+        for used in range(max_cards + 1):
+            total = 0
+            for v in range(max_cards - used + 1):
+                offsets[i, used, v] = total
+                total += num_histograms(remaining_ranks, max_cards - used - v)
+    return offsets
+
+
+def all_histograms(max_cards: int) -> np.ndarray:
+    """
+    :param max_cards: the most cards in a histogram
+    :type max_cards: int
+    :return: every rank histogram with at most max_cards cards in lexicographic order
+    :rtype: np.ndarray
+    """
+    memo = {}
+
+    def histograms(num_ranks: int, budget: int) -> np.ndarray:
+        if (num_ranks, budget) in memo:
+            return memo[(num_ranks, budget)]
+        if num_ranks == 0:
+            result = np.zeros((1, 0), dtype=np.uint8)
+        else:
+            parts = []
+            for v in range(budget + 1):
+                rest = histograms(num_ranks - 1, budget - v)
+                parts.append(np.hstack([np.full((len(rest), 1), v, dtype=np.uint8), rest]))
+            result = np.vstack(parts)
+        memo[(num_ranks, budget)] = result
+        return result
+
+    return histograms(NUM_REGULAR_RANKS, max_cards)
+
+
+class ScoreTable:
+    """
+    The best choice of component keys for every rank histogram of one or more phases
+    """
+
+    def __init__(self, max_cards: int, tables: dict[str, np.ndarray], num_combos: dict[str, int], mapped=None):
+        self.max_cards = max_cards
+        self.tables = tables
+        self.num_combos = num_combos
+        self._offsets = _rank_offsets(max_cards)
+        self._offsets_list = self._offsets.tolist()
+        # Keep the memory map open for as long as the tables are used
+        self._mapped = mapped
+
+    def index(self, hist: list[int]) -> int | None:
+        """
+        :param hist: the number of regular cards of each rank
+        :type hist: list[int]
+        :return: the position of the histogram in the tables or None if it has too many cards
+        :rtype: int | None
+        """
+        offsets = self._offsets_list
+        used = 0
+        position = 0
+        for i, v in enumerate(hist):
+            if used + v > self.max_cards:
+                return None
+            position += offsets[i][used][v]
+            used += v
+        return position
+
+    def index_many(self, hist: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param hist: an array of shape (number of hands, NUM_REGULAR_RANKS)
+        :type hist: np.ndarray
+        :return: the position of every histogram in the tables and a mask of the histograms that fit in the tables.
+        Positions of histograms that don't fit are 0
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        hist = hist.astype(np.int64)
+        fits = hist.sum(axis=1) <= self.max_cards
+        hist = np.where(fits[:, None], hist, 0)
+        used = np.cumsum(hist, axis=1) - hist
+        positions = self._offsets[np.arange(NUM_REGULAR_RANKS)[None, :], used, hist].sum(axis=1)
+        return positions, fits
+
+    def lookup(self, phase: str, hist: list[int]) -> int | None:
+        """
+        :param phase: the phase to look up
+        :type phase: str
+        :param hist: the number of regular cards of each rank
+        :type hist: list[int]
+        :return: the index into PhaseSolver.combos of the best choice of keys or None if the hand isn't covered
+        :rtype: int | None
+        """
+        position = self.index(hist)
+        if position is None:
+            return None
+        return int(self.tables[phase][position])
+
+    def lookup_many(self, phase: str, hist: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param phase: the phase to look up
+        :type phase: str
+        :param hist: an array of shape (number of hands, NUM_REGULAR_RANKS)
+        :type hist: np.ndarray
+        :return: the index into PhaseSolver.combos of the best choice of keys for every hand and a mask of the hands
+        that are covered by the table
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        positions, fits = self.index_many(hist)
+        return self.tables[phase][positions], fits
+
+    def install(self):
+        """
+        Make every PhaseSolver use these tables for the phases they cover
+        """
+        for phase in self.tables:
+            if len(PhaseSolver(phase).combos) != self.num_combos[phase]:
+                raise Exception(f"The score table for {phase} doesn't match this version of PhaseSolver!")
+            register_score_table(phase, self)
+
+    @staticmethod
+    def build(phase_list: list[str], max_cards: int = DEFAULT_MAX_CARDS, verbose: bool = False) -> "ScoreTable":
+        """
+        Compute the tables for every phase in phase_list that is made only of sets and runs
+
+        :param phase_list: the phases to compute tables for. Other phases are skipped
+        :type phase_list: list[str]
+        :param max_cards: the most regular cards in a hand covered by the tables
+        :type max_cards: int
+        :param verbose: print the progress
+        :type verbose: bool
+        :return: the tables
+        :rtype: ScoreTable
+        """
+        hist = all_histograms(max_cards).astype(np.int16)
+        tables = {}
+        num_combos = {}
+        for phase in dict.fromkeys(phase_list):
+            solver = PhaseSolver(phase)
+            if solver.axis != "rank" or solver.len == 0:
+                continue
+            start = time.perf_counter()
+            cap_matrix = solver.cap_matrix
+            dtype = np.uint8 if len(solver.combos) <= 256 else np.uint16
+            best = np.empty(len(hist), dtype=dtype)
+            chunk = max(1, (1 << 22) // cap_matrix.size)
+            for i in range(0, len(hist), chunk):
+                block = hist[i: i + chunk, None, :]
+                best[i: i + chunk] = np.minimum(block, cap_matrix[None, :, :]).sum(axis=2).argmax(axis=1)
+            tables[phase] = best
+            num_combos[phase] = len(solver.combos)
+            if verbose:
+                print(f"{phase}: {len(hist)} histograms in {time.perf_counter() - start:.1f} seconds")
+        return ScoreTable(max_cards, tables, num_combos)
+
+    def save(self, path: str):
+        """
+        Write the tables to a file which can be memory-mapped by load
+
+        :param path: where to write the tables
+        :type path: str
+        :raises ValueError: if a phase is longer than MAX_PHASE_BYTES. struct would cut it short and the table would
+        never be found again
+        """
+        offset = _HEADER.size + _ENTRY.size * len(self.tables)
+        entries = []
+        for phase, table in self.tables.items():
+            name = phase.encode()
+            if len(name) > MAX_PHASE_BYTES:
+                raise ValueError(f"The phase {phase} is {len(name)} bytes long, more than {MAX_PHASE_BYTES}!")
+            entries.append(_ENTRY.pack(name, self.num_combos[phase], table.dtype.itemsize, offset))
+            offset += table.nbytes
+
+        checksum = 0
+        for part in entries + [table.tobytes() for table in self.tables.values()]:
+            checksum = zlib.crc32(part, checksum)
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, self.max_cards, len(self.tables), checksum))
+            for entry in entries:
+                f.write(entry)
+            for table in self.tables.values():
+                f.write(table.tobytes())
+
+    @staticmethod
+    def load(path: str) -> "ScoreTable":
+        """
+        Memory-map tables written by save. The file is read once to check it, but the tables aren't copied
+
+        :param path: the file to read
+        :type path: str
+        :return: the tables
+        :rtype: ScoreTable
+        :raises Exception: if the file isn't a score table of this version, is cut short, or doesn't match its checksum
+        """
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                raise Exception(f"{path} is too short to be a score table!")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return ScoreTable._from_mapped(path, mapped)
+        except Exception:
+            mapped.close()
+            raise
+
+    @staticmethod
+    def _from_mapped(path: str, mapped: mmap.mmap) -> "ScoreTable":
+        (magic, version, max_cards, num_phases, checksum) = _HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version != VERSION:
+            raise Exception(f"{path} is not a version {VERSION} score table!")
+        if len(mapped) < _HEADER.size + num_phases * _ENTRY.size:
+            raise Exception(f"{path} is cut short in its list of phases!")
+        if zlib.crc32(memoryview(mapped)[_HEADER.size:]) != checksum:
+            raise Exception(f"{path} doesn't match its checksum!")
+
+        size = num_histograms(NUM_REGULAR_RANKS, max_cards)
+        # The tables are written one after the other right after the entries, which the sizes must add up to
+        expected = _HEADER.size + num_phases * _ENTRY.size
+        entries = []
+        for i in range(num_phases):
+            (name, combos, itemsize, offset) = _ENTRY.unpack_from(mapped, _HEADER.size + i * _ENTRY.size)
+            phase = name.rstrip(b"\0").decode()
+            if itemsize not in (1, 2):
+                raise Exception(f"The score table for {phase} in {path} has {itemsize} bytes per entry!")
+            if offset != expected:
+                raise Exception(f"The score table for {phase} in {path} is at {offset} instead of {expected}!")
+            expected += size * itemsize
+            if expected > len(mapped):
+                raise Exception(f"The score table for {phase} in {path} is cut short!")
+            entries.append((phase, combos, np.uint8 if itemsize == 1 else np.uint16, offset))
+        if expected != len(mapped):
+            raise Exception(f"{path} is {len(mapped)} bytes long instead of {expected}!")
+
+        # Views of the map are only made once the file is known to be good so that it can be closed otherwise
+        tables = {}
+        num_combos = {}
+        for phase, combos, dtype, offset in entries:
+            tables[phase] = np.frombuffer(mapped, dtype=dtype, count=size, offset=offset)
+            num_combos[phase] = combos
+        return ScoreTable(max_cards, tables, num_combos, mapped)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="ScoreTable",
+        description="Precompute the score tables for phases made only of sets and runs",
+    )
+    parser.add_argument(
+        "filename",
+        nargs="?",
+        default=DEFAULT_FILE,
+        help=f"Where the tables will be saved. By default, it is set to {DEFAULT_FILE}",
+    )
+    parser.add_argument(
+        "--phases",
+        nargs="+",
+        default=DEFAULT_PHASE_LIST,
+        help="The phases to compute tables for. By default, every phase in DEFAULT_PHASE_LIST",
+    )
+    parser.add_argument(
+        "--max-cards",
+        type=int,
+        default=DEFAULT_MAX_CARDS,
+        help=f"The most regular cards in a hand covered by the tables. By default, it is set to {DEFAULT_MAX_CARDS}",
+    )
+
+    parsed_args = parser.parse_args()
+    table = ScoreTable.build(parsed_args.phases, parsed_args.max_cards, verbose=True)
+    table.save(parsed_args.filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import random
+import unittest
+
+from Card import Card
+from CardArray import CardArray
+from CardCollection import CardCollection
+from PhaseSolver import color_histogram, count_matrix, rank_histogram
+from RE import RE
+
+
+class TestCardArray(unittest.TestCase):
+    def setUp(self):
+        self.deck = CardCollection.getNewDeck(2)
+        random.Random(5).shuffle(self.deck)
+        self.cards = CardArray(self.deck[:30])
+
+    def test_sequence(self):
+        deck = self.deck
+        cards = self.cards
+        self.assertEqual(len(cards), 30)
+        self.assertEqual(cards.to_collection(), CardCollection(deck[:30]))
+        self.assertEqual([card.id for card in cards], [card.id for card in deck[:30]])
+        self.assertIs(cards[3], cards[3])
+        self.assertEqual(cards[-1].id, deck[29].id)
+        with self.assertRaises(IndexError):
+            cards[30]
+        with self.assertRaises(ValueError):
+            CardArray([Card.from_string("R3")])
+        # Ids too large for a numbered deck are rejected instead of overflowing the array
+        with self.assertRaises(ValueError):
+            CardArray([Card.from_code(5, 70000)])
+        with self.assertRaises(ValueError):
+            CardArray.from_ids([70000])
+
+    def test_views(self):
+        deck = self.deck
+        cards = self.cards
+        # Slices with a step of one share the ids of the original
+        view = cards[5:20][2:]
+        self.assertEqual(view.ids().obj, cards.ids().obj)
+        self.assertEqual(list(view.ids()), [card.id for card in deck[7:20]])
+        self.assertEqual(list(cards[::3].ids()), [card.id for card in deck[:30:3]])
+        self.assertEqual(len(cards[20:5]), 0)
+        joined = cards[:10] + cards[20:] + [deck[40]]
+        self.assertEqual(joined.to_collection(), CardCollection(deck[:10] + deck[20:30] + [deck[40]]))
+        self.assertEqual(CardArray.from_ids(joined.ids()), joined)
+
+    def test_counts(self):
+        cards = self.cards
+        view = cards[7:20]
+        self.assertEqual(list(cards.code_counts()), list(count_matrix([CardCollection(self.deck[:30])])[0]))
+        view_counts = list(count_matrix([view.to_collection()])[0])
+        self.assertEqual(list(view.rank_histogram()), rank_histogram(view_counts))
+        self.assertEqual(list(view.color_histogram()), color_histogram(view_counts))
+        for phase in ["S3+S3", "C7", "S2+C3"]:
+            rr = RE.compile(phase)
+            hands = [cards[:10], view, cards[:10] + cards[20:]]
+            self.assertEqual(
+                list(rr.score_many(hands)), list(rr.score_many([hand.to_collection() for hand in hands]))
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
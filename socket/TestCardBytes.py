@@ -0,0 +1,67 @@
+import random
+import unittest
+
+from Card import Card, WILD_CODE
+from CardArray import CardArray
+from CardBytes import decode_card_array, decode_cards, encode_cards
+from CardCollection import CardCollection
+
+
+class TestCardBytes(unittest.TestCase):
+    def setUp(self):
+        self.deck = CardCollection.getNewDeck(2)
+        random.Random(6).shuffle(self.deck)
+        self.data = encode_cards(self.deck)
+        # Cards stored before decks were numbered keep their ids
+        self.legacy = CardCollection(
+            [
+                Card.from_string("R3"),
+                Card.from_code(WILD_CODE, "not a uuid"),
+                Card.from_code(5, 70000),
+                Card.from_code(7, 3),
+            ]
+        )
+        self.mixed = CardCollection(self.deck[:4] + self.legacy + self.deck[4:8])
+
+    def test_numbered(self):
+        deck = self.deck
+        self.assertEqual(len(self.data), 1 + 3 * len(deck))
+        self.assertLess(len(encode_cards(deck[:108])), len(CardCollection(deck[:108]).to_json()) // 10)
+        decoded = decode_cards(self.data)
+        self.assertEqual(decoded, deck)
+        self.assertEqual([card.id for card in decoded], [card.id for card in deck])
+        self.assertIs(decoded[0], decode_cards(memoryview(self.data))[0])
+        self.assertEqual(decode_cards(encode_cards(CardCollection())), CardCollection())
+
+    def test_card_array(self):
+        # Lists of numbered cards can be read without creating their cards
+        card_array = decode_card_array(self.data)
+        self.assertEqual(card_array, self.deck)
+        self.assertEqual(list(card_array.code_counts()), list(CardArray(self.deck).code_counts()))
+        self.assertIsNone(decode_card_array(encode_cards(self.mixed)))
+        self.assertIsNone(decode_card_array(encode_cards(self.deck[:4] + [Card.from_code(7, 3)])))
+
+    def test_legacy(self):
+        decoded = decode_cards(encode_cards(self.mixed))
+        self.assertEqual(decoded, self.mixed)
+        self.assertEqual([card.id for card in decoded], [card.id for card in self.mixed])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            decode_cards(b"")
+        with self.assertRaises(ValueError):
+            decode_cards(bytes([99]) + self.data[1:])
+        with self.assertRaises(ValueError):
+            decode_cards(encode_cards(self.mixed)[:-1])
+        with self.assertRaises(ValueError):
+            decode_cards(encode_cards(self.legacy)[:10])
+        # Negative ids can't be stored in a way that reads back as the same int
+        with self.assertRaises(ValueError):
+            encode_cards([Card.from_code(5, -3)])
+        # Ids read back as numbered cards must be ones that numbered decks can have
+        with self.assertRaises(ValueError):
+            decode_cards(bytes([1, 5, 0xFF, 0xFF]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import random
+import unittest
+
+from Card import Card, NUM_CARD_CODES
+from CardCollection import CardCollection
+from CardSet import MAX_DECK_ID, CardSet, deck_card, deck_code, is_deck_card, remove_cards
+from PhaseSolver import MultiPhaseSolver, PhaseSolver, color_histogram, rank_histogram
+
+
+class TestCardSet(unittest.TestCase):
+    def setUp(self):
+        self.deck = CardCollection.getNewDeck()
+        random.Random(4).shuffle(self.deck)
+        self.hand = CardSet(self.deck[:11])
+
+    def test_contents(self):
+        deck = self.deck
+        self.assertEqual(list(self.hand), deck[:11])
+        self.assertEqual([c.id for c in self.hand], [c.id for c in deck[:11]])
+        counts = [0] * NUM_CARD_CODES
+        for card in deck[:11]:
+            counts[card.code] += 1
+        self.assertEqual(self.hand.code_counts(), counts)
+        self.assertEqual(self.hand.rank_histogram(), rank_histogram(counts))
+        self.assertEqual(self.hand.color_histogram(), color_histogram(counts))
+
+    def test_deck_ids(self):
+        # Ids past the last numbered deck are never treated as deck cards
+        self.assertIs(deck_card(MAX_DECK_ID - 1), deck_card(MAX_DECK_ID - 1))
+        with self.assertRaises(ValueError):
+            deck_card(MAX_DECK_ID)
+        too_large = Card.from_code(deck_code(MAX_DECK_ID), MAX_DECK_ID)
+        self.assertFalse(is_deck_card(too_large))
+        self.assertFalse(CardSet.supports([too_large]))
+        with self.assertRaises(ValueError):
+            CardSet([too_large])
+        self.assertFalse(CardSet.supports([Card.from_string("R3")]))
+
+    def test_add_remove(self):
+        deck = self.deck
+        # Copies don't share their cards
+        what_if = self.hand.copy()
+        what_if.remove(deck[0])
+        self.assertIn(deck[0], self.hand)
+        self.assertNotIn(deck[0], what_if)
+        self.assertEqual(len(what_if), 10)
+        with self.assertRaises(ValueError):
+            what_if.remove(deck[0])
+        with self.assertRaises(ValueError):
+            what_if.add(deck[1])
+
+        # Removing and adding many cards keeps the order
+        for card in deck[1:8]:
+            what_if.remove(card)
+        what_if.add(deck[0])
+        what_if.add(deck[3])
+        self.assertEqual([c.id for c in what_if], [c.id for c in deck[8:11] + [deck[0], deck[3]]])
+
+        # A copy of the same kind with a different id can be taken instead
+        twin = next(c for c in deck[11:] if c == deck[8])
+        self.assertEqual(what_if.take(twin).id, deck[8].id)
+        self.assertIsNone(CardSet().take(twin))
+
+    def test_remove_cards(self):
+        deck = self.deck
+        # Either every card is removed or none are
+        cards = CardCollection(deck[:5])
+        self.assertIsNone(remove_cards(cards, deck[1:3]))
+        self.assertEqual(cards, CardCollection([deck[0]] + deck[3:5]))
+        self.assertEqual(remove_cards(cards, [deck[0], deck[1]]), deck[1])
+        self.assertEqual(len(cards), 3)
+        legacy = CardCollection(Card.from_string(c) for c in "R3 R3 B4".split(" "))
+        self.assertIsNone(remove_cards(legacy, [Card.from_string("R3")]))
+        self.assertEqual(len(legacy), 2)
+        # A hand holding the same id twice can't be a CardSet, so it's checked card by card
+        doubled = CardCollection([deck[0], deck[0], deck[1]])
+        self.assertIsNone(remove_cards(doubled, [deck[0]]))
+        self.assertEqual([c.id for c in doubled], [deck[0].id, deck[1].id])
+
+        # A CardSet hand is changed in place
+        held = CardSet(deck[:5])
+        self.assertIsNone(remove_cards(held, deck[1:3]))
+        self.assertEqual(list(held), [deck[0]] + deck[3:5])
+        self.assertEqual(remove_cards(held, [deck[0], deck[1]]), deck[1])
+        self.assertEqual(list(held), [deck[0]] + deck[3:5])
+
+    def test_solvers(self):
+        # The solvers use the histograms the CardSet keeps
+        phase_list = ["S3+S3", "C7", "R4+S2", "S2+C3"]
+        multi = MultiPhaseSolver(phase_list)
+        for size in [0, 5, 11, 20]:
+            cards = CardCollection(self.deck[20: 20 + size])
+            self.assertEqual(multi.scores(CardSet(cards)), multi.scores(cards))
+            for phase in phase_list:
+                self.assertEqual(PhaseSolver(phase).solve(CardSet(cards)).score, PhaseSolver(phase).solve(cards).score)
+
+
+if __name__ == "__main__":
+    unittest.main()
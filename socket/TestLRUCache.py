@@ -0,0 +1,33 @@
+import unittest
+
+from LRUCache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LRUCache(maxsize=2)
+        self.cache.put("a", 1)
+        self.cache.put("b", 2)
+
+    def test_eviction(self):
+        self.assertEqual(self.cache.get("a"), 1)
+        # b is now the least recently used entry
+        self.cache.put("c", 3)
+        self.assertNotIn("b", self.cache)
+        self.assertEqual(self.cache.get_or_create("b", lambda: 4), 4)
+        self.assertNotIn("a", self.cache)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_stats(self):
+        self.cache.get("a")
+        self.cache.put("c", 3)
+        self.cache.get_or_create("b", lambda: 4)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["evictions"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
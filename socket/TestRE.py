@@ -1,12 +1,27 @@
+import dataclasses
 import itertools
+import math
+import os
+import pickle
 import random
+import tempfile
+import types
 import unittest
 
 import more_itertools
+import numpy as np
 
-from Card import Card
-from CardCollection import CardCollection
-from RE import RE
+from Card import Card, NUM_CARD_CODES, WILD_CODE
+from CardCollection import CardCollection, DECK_SIZE
+from Benchmark import build_table, random_hands, run_benchmark
+from CompiledRE import MAX_PHASE_BYTES, CompiledRE, load_bundle, save_bundle
+from CompletionOdds import completion_probability, unseen_counts
+from HandMatcher import HandMatcher
+from PhaseDifficulty import deal, estimate_difficulty, simulate_turns
+from PhaseSolver import MultiPhaseSolver, PhaseSolver, SearchBudget, unregister_score_table
+from RE import DEFAULT_PHASE_LIST, RE, _bundled_tables
+from ScoreTable import ScoreTable
+from TurnPlanner import TurnPlanner
 
 
 class TestRE(unittest.TestCase):
@@ -243,6 +258,595 @@ class TestRE(unittest.TestCase):
         self.assertEqual(rr.score(CardCollection([Card.from_string(c) for c in "R6 R5 R4 R3 R2 Y2 G2 B2".split(" ")])), 0)
         self.assertEqual(rr.score(CardCollection([Card.from_string(c) for c in "R6".split(" ")])), 7)
 
+    def test_histogram_score(self):
+        deck = CardCollection.getNewDeck()
+        for phase in ["S3+S3", "S3+R4", "R7", "C7", "S5+S3", "R4+S4", "C3+S2", "R3+C2"]:
+            rr = RE(phase)
+            for _ in range(30):
+                hand = CardCollection(random.sample(deck, random.randint(0, 5)))
+                self.assertEqual(rr.score(hand), rr.score(hand, method="bnb"), f"{phase} {hand}")
+                self.assertEqual(rr.score(hand), rr.score(hand, method="packed"), f"{phase} {hand}")
+
+                result = rr.match(hand)
+                self.assertEqual(result.score, rr.score(hand))
+                for card in result.cards:
+                    self.assertIn(card.id, set(c.id for c in hand))
+                if result.score == 0:
+                    self.assertTrue(rr.isFullyAccepted(result.cards))
+
+        rr = RE("S5+S3")
+        hand = CardCollection([Card.from_string(c) for c in "G4 W W B10 W W G11 W Y2 S Y4".split(" ")])
+        result = rr.match(hand)
+        self.assertEqual(result.score, 0)
+        self.assertTrue(rr.isFullyAccepted(result.cards))
+
+        rr = RE("R")
+        hand = CardCollection([Card.from_string(c) for c in "R1 B3 W Y9 G5".split(" ")])
+        result = rr.match(hand)
+        self.assertEqual(result.score, 0)
+        self.assertEqual(len(result.cards), 3)
+        self.assertTrue(rr.isFullyAccepted(result.cards))
+
+        with self.assertRaises(Exception):
+            rr.score(hand, method="guess")
+
+    def test_histogram_subset(self):
+        deck = CardCollection.getNewDeck()
+        for phase in ["R", "S", "C", "S3+S3", "S3+R4", "R7", "C4", "R4+S4", "C3+S2"]:
+            rr = RE(phase)
+            for _ in range(30):
+                hand = CardCollection(random.sample(deck, random.randint(0, 8)))
+                (result, cards) = rr.isSubsetAccepted(hand)
+                self.assertEqual(result, rr.isSubsetAccepted(hand, method="dfs")[0], f"{phase} {hand}")
+                if result:
+                    self.assertTrue(rr.isFullyAccepted(cards))
+                    self.assertTrue(set(c.id for c in cards) <= set(c.id for c in hand))
+                else:
+                    self.assertEqual(len(cards), 0)
+
+        # Lots of wilds doesn't make the search any harder
+        rr = RE("S5+S3+R7")
+        hand = CardCollection([Card.from_string(c) for c in "G4 W W W W W W W W W W W W Y8 B8".split(" ")])
+        result = rr.match(hand)
+        self.assertTrue(result.is_complete)
+        self.assertTrue(rr.isFullyAccepted(result.cards))
+        self.assertLessEqual(result.explored, 12 * 12 * 6)
+
+        hand = CardCollection([Card.from_string(c) for c in "S S W".split(" ")])
+        self.assertFalse(rr.isSubsetAccepted(hand)[0])
+        self.assertFalse(RE("S").isSubsetAccepted(CardCollection())[0])
+
+        with self.assertRaises(Exception):
+            rr.isSubsetAccepted(hand, method="bfs")
+
+    def test_score_many(self):
+        deck = CardCollection.getNewDeck()
+        for phase in ["R", "S3+S3", "S3+R4", "R9", "C7", "S5+S3", "C3+S2"]:
+            rr = RE(phase)
+            hands = [CardCollection(random.sample(deck, random.randint(0, 14))) for _ in range(50)]
+            self.assertEqual(list(rr.score_many(hands)), [rr.score(hand) for hand in hands], phase)
+            self.assertEqual(len(rr.score_many([])), 0)
+
+    def test_hand_matcher(self):
+        deck = CardCollection.getNewDeck()
+        for phase in ["S3+S3", "R9", "C7", "S5+S3", "C3+S2", "R"]:
+            rr = RE(phase)
+            hand = CardCollection(random.sample(deck, 6))
+            matcher = HandMatcher(rr, hand)
+            hand_ids = set(c.id for c in hand)
+            pool = [c for c in deck if c.id not in hand_ids]
+
+            for _ in range(100):
+                self.assertEqual(matcher.score, rr.score(hand), f"{phase} {hand}")
+                self.assertEqual(matcher.match().score, matcher.score)
+
+                # Asking what-if questions doesn't change the hand
+                removed = random.choice(hand)
+                added = random.choice(pool)
+                expected = rr.score(CardCollection([c for c in hand if c.id != removed.id] + [added]))
+                self.assertEqual(matcher.score_if(remove=removed, add=added), expected)
+                self.assertEqual(matcher.score, rr.score(hand))
+                self.assertEqual(len(matcher), len(hand))
+
+                if len(hand) < 4 or (random.random() < 0.5 and len(hand) < 14):
+                    card = pool.pop(random.randrange(len(pool)))
+                    hand.append(card)
+                    matcher.add(card)
+                else:
+                    card = hand.pop(random.randrange(len(hand)))
+                    pool.append(card)
+                    matcher.remove(card)
+
+        with self.assertRaises(Exception):
+            matcher.remove(pool[0])
+        # Adding a card twice would count it twice
+        size = len(matcher)
+        with self.assertRaises(ValueError):
+            matcher.add(hand[0])
+        with self.assertRaises(ValueError):
+            matcher.score_if(add=hand[0])
+        self.assertEqual(len(matcher), size)
+        self.assertEqual(matcher.score, rr.score(hand))
+
+    def test_budget(self):
+        rr = RE("S3+S3+R7+C4")
+        hand = CardCollection([Card.from_string(c) for c in "R3 B3 Y3 R7 B7 G7 G2 Y3 B4 B5 Y6 R8 Y8 Y11".split(" ")])
+        before = RE.search_info()
+        limited = rr.match(hand, node_budget=3)
+        self.assertFalse(limited.exact)
+        exact = rr.match(hand)
+        self.assertTrue(exact.exact)
+
+        self.assertLessEqual(limited.explored, 3)
+        # Running out of budget never makes a hand look better than it is
+        self.assertGreaterEqual(limited.score, exact.score)
+        # Once the exact answer is known, it's remembered and the budget doesn't matter
+        self.assertEqual(rr.score(hand, node_budget=3), exact.score)
+        self.assertTrue(rr.match(hand, time_budget=0).exact)
+
+        after = RE.search_info()
+        self.assertGreater(after["searches"], before["searches"])
+        self.assertGreater(after["exhausted"], before["exhausted"])
+
+        rr = RE("R4+S4")
+        hand = CardCollection([Card.from_string(c) for c in "R2 R3 R4 R5 R6 B2 G2 Y2".split(" ")])
+        self.assertGreaterEqual(rr.score(hand, method="bnb", node_budget=5), 0)
+        self.assertEqual(rr.score(hand, method="bnb", node_budget=100000), 0)
+        self.assertGreater(rr.score(hand, method="packed", node_budget=5), 0)
+        self.assertEqual(rr.score(hand, method="packed", node_budget=100000), 0)
+        self.assertFalse(rr.isSubsetAccepted(hand, method="dfs", node_budget=1)[0])
+        self.assertTrue(rr.isSubsetAccepted(hand, node_budget=100)[0])
+
+    def test_symmetry(self):
+        # Identical components only get their keys in one order
+        solver = PhaseSolver("S3+R4+S3")
+        self.assertEqual(solver.twin, [None, None, 0])
+        self.assertTrue(all(keys[0] <= keys[2] for keys in solver.key_choices()))
+        self.assertEqual(len(PhaseSolver("S3+S3").combos), 12 * 13 // 2)
+
+        # Sets and runs only see ranks, colors only see colors
+        self.assertEqual(len(set(RE.compile("S3+S3").table.code_classes)), 14)
+        self.assertEqual(len(set(RE.compile("C7").table.code_classes)), 6)
+        self.assertEqual(len(set(RE.compile("R4+C4").table.code_classes)), 50)
+        self.assertEqual(len(RE.compile("S3+S3").table.color_symmetries), 0)
+        self.assertEqual(len(RE.compile("R4+C4").table.color_symmetries), 23)
+
+        # Green and yellow are interchangeable for this hand
+        rr = RE("S2+C3")
+        hand = CardCollection([Card.from_string(c) for c in "R5 B5 W".split(" ")])
+        symmetric = SearchBudget()
+        plain = SearchBudget()
+        self.assertEqual(rr._score_packed(hand, symmetric), 2)
+        self.assertEqual(rr._score_packed(hand, plain, symmetric=False), 2)
+        self.assertLess(symmetric.nodes, plain.nodes)
+
+        deck = CardCollection.getNewDeck()
+        for phase in ["S3+S3", "C7", "R4+C4", "S2+C3"]:
+            rr = RE(phase)
+            for _ in range(20):
+                hand = CardCollection(random.sample(deck, random.randint(0, 9)))
+                self.assertEqual(rr._score_packed(hand, SearchBudget()), rr.score(hand), f"{phase} {hand}")
+                self.assertEqual(rr.isSubsetAccepted(hand, method="dfs")[0], rr.score(hand) == 0, f"{phase} {hand}")
+
+    def test_benchmark(self):
+        # The same seed deals the same hands
+        first = random_hands(random.Random(3), 5, 15, 0.5, 0.2)
+        second = random_hands(random.Random(3), 5, 15, 0.5, 0.2)
+        self.assertEqual([[c.code for c in hand] for hand in first], [[c.code for c in hand] for hand in second])
+        for hand in first:
+            self.assertEqual(len(hand), 15)
+            self.assertLessEqual(sum(c.code == WILD_CODE for c in hand), 8)
+
+        # The build rows time compiling the table, not building the graph
+        rr = build_table("S3+S3")
+        self.assertEqual(rr.backend, "table")
+        self.assertIsNotNone(rr.table)
+
+        rows = run_benchmark(["S3+S3", "C3+S2"], num_hands=2, sizes=range(1, 4), score_methods=("histogram", "packed"))
+        self.assertEqual(
+            [row["operation"] for row in rows[:5]],
+            ["build", "isFullyAccepted", "isSubsetAccepted[histogram]", "score[histogram]", "score[packed]"],
+        )
+        self.assertEqual(rows[1]["calls"], 6)
+        for row in rows:
+            self.assertLessEqual(row["p50_us"], row["max_us"])
+
+    def test_card_kinds(self):
+        deck = CardCollection.getNewDeck()
+        # Every copy of a card shares its kind
+        self.assertEqual(len(set(id(card.kind) for card in deck)), NUM_CARD_CODES)
+        for card in deck:
+            self.assertIs(card.kind, Card.from_code(card.code).kind)
+            self.assertEqual(hash(card), card.code)
+            self.assertEqual(card, Card(card.color, card.rank))
+            decoded = Card.fromJSONDict(card.to_json_dict())
+            self.assertIs(decoded.kind, card.kind)
+            self.assertEqual(decoded.id, card.id)
+        self.assertFalse(hasattr(deck[0], "__dict__"))
+
+        card = Card.from_string("B11")
+        with self.assertRaises(AttributeError):
+            card.rank = Card.from_string("B12").rank
+        # The id is made up once and then kept
+        self.assertEqual(card.id, card.id)
+        self.assertEqual(pickle.loads(pickle.dumps(card)).id, card.id)
+        with self.assertRaises(Exception):
+            Card(Card.from_string("W").color, card.rank)
+        with self.assertRaises(Exception):
+            Card.fromJSONDict({"color": "W", "rank": "3", "id": "x"})
+
+    def test_deck_ids(self):
+        deck = CardCollection.getNewDeck()
+        self.assertEqual([card.id for card in deck], list(range(DECK_SIZE)))
+        self.assertEqual(sorted(card.id for card in CardCollection.getNewDeck(2)), list(range(2 * DECK_SIZE)))
+        self.assertEqual(CardCollection.from_json(deck.to_json()), deck)
+        self.assertEqual([card.id for card in CardCollection.from_json(deck.to_json())], list(range(DECK_SIZE)))
+
+        # Older clients send ids as strings and older games stored uuids
+        card = Card.fromJSONDict({"color": "R", "rank": "3", "id": "17"})
+        self.assertEqual(card.id, 17)
+        self.assertEqual(Card.normalize_id(17), 17)
+        legacy = "0b4a8a37-4b0e-4d4c-9f0b-8f1f5e8d3e6a"
+        self.assertEqual(Card.fromJSONDict({"color": "R", "rank": "3", "id": legacy}).id, legacy)
+
+    def test_compile_cache(self):
+        rr = RE.compile("S3+S3")
+        self.assertIs(rr, RE.compile("S3+S3"))
+        self.assertIsNot(rr, RE.compile("S3+R4"))
+        self.assertGreaterEqual(RE.cache_info()["hits"], 1)
+
+        # The cached phases are shared, so they can't be modified
+        with self.assertRaises(AttributeError):
+            rr.phase = "R7"
+        with self.assertRaises(Exception):
+            RE.compile("Q7")
+
+        deck = CardCollection([Card.from_string(c) for c in "R1 B1 G1 W Y4 Y4".split(" ")])
+        self.assertTrue(rr.isFullyAccepted(deck))
+        self.assertEqual(rr.score(deck), RE("S3+S3").score(deck))
+
+    def test_table_backend(self):
+        phase_list = ["R", "S", "C", "R4", "S4", "C4", "R12", "S3+S3", "S3+R4", "R4+S4", "C7", "S5+S2", "S3+S3+R7+C4"]
+        deck_list = [
+            "R1 R2 R3 R4",
+            "W W W R7",
+            "R7 W W W",
+            "B1 G2 Y3 R4",
+            "R1 B1 G1 Y1",
+            "R1 R2 R11 R3",
+            "R1 B1 W R4 R5 W",
+            "R2 R3 R4 R5 R6 B2 G2 Y2",
+            "W B3 W R7 B7 W G2 W B4 B5 Y6 W R8 Y8 Y3 W W",
+            "R3 B3 Y3 R7 B7 G7 G2 Y3 B4 B5 Y6 R7 R8 Y8 Y3 Y11 Y4",
+            "W W W W W W W W W W W W",
+            "S W W",
+            "",
+        ]
+        for phase in phase_list:
+            graph = RE(phase)
+            table = RE(phase, backend="table")
+            self.assertEqual(table.table.len, graph.len)
+
+            for deck in deck_list:
+                cards = CardCollection([Card.from_string(c) for c in deck.split(" ") if c])
+                self.assertEqual(table.isFullyAccepted(cards), graph.isFullyAccepted(cards), f"{phase} {deck}")
+
+            for _ in range(200):
+                size = max(graph.len, 1) + random.randint(-1, 1)
+                cards = CardCollection(
+                    Card.from_code(random.choice([random.randrange(NUM_CARD_CODES), 48])) for _ in range(size)
+                )
+                self.assertEqual(table.isFullyAccepted(cards), graph.isFullyAccepted(cards), f"{phase} {cards}")
+
+        with self.assertRaises(Exception):
+            RE("R4", backend="tree")
+
+    def test_minimize(self):
+        deck = [Card.from_code(code) for code in range(NUM_CARD_CODES) for _ in range(2)]
+        for phase in ["R", "S", "R4", "C4", "S3+S3", "S3+R4", "C7", "S5+S2", "S3+S3+R7+C4"]:
+            rr = RE(phase)
+            table = CompiledRE.from_graph(phase, rr.len, rr.startState)
+            minimized = table.minimize()
+            self.assertLessEqual(minimized.num_states, table.num_states)
+            # Minimizing twice changes nothing
+            self.assertEqual(minimized.minimize(), minimized)
+
+            # Completed phases and small changes to them so that both accepted and rejected sequences are tested
+            sequences = []
+            for _ in range(150):
+                m = rr.solver.solve(CardCollection(random.sample(deck, 30)))
+                cards = list(m.cards)
+                sequences.append(cards)
+                if len(cards) > 1:
+                    i, j = random.sample(range(len(cards)), 2)
+                    swapped = list(cards)
+                    swapped[i], swapped[j] = swapped[j], swapped[i]
+                    sequences.append(swapped)
+                    sequences.append(cards[:i] + [random.choice(deck)] + cards[i + 1:])
+                    sequences.append(cards[:-1])
+            for cards in sequences:
+                self.assertEqual(minimized.isFullyAccepted(cards), table.isFullyAccepted(cards), f"{phase} {cards}")
+                self.assertEqual(minimized.isFullyAccepted(cards), rr.isFullyAccepted(cards), f"{phase} {cards}")
+
+    def test_bundle(self):
+        phase_list = ["S2+R5+C3", "R", "S4+C2"]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "phases.bundle")
+            RE.save_bundle(path, phase_list)
+            self.assertEqual(RE.load_bundle(path), phase_list)
+
+            # Truncated or corrupted bundles are caught by the checksum
+            with open(path, "rb") as f:
+                data = f.read()
+            for damaged in [data[:-7], data[:40] + bytes([data[40] ^ 1]) + data[41:]]:
+                with open(path, "wb") as f:
+                    f.write(damaged)
+                with self.assertRaises(ValueError):
+                    load_bundle(path)
+
+            # Long phases fit in the header and phases too long for it are rejected clearly
+            table = RE.compile("S2").table
+            long_table = dataclasses.replace(table, phase="S" * 300)
+            save_bundle(path, [long_table])
+            self.assertEqual(load_bundle(path), {long_table.phase: long_table})
+            with self.assertRaises(ValueError):
+                dataclasses.replace(table, phase="S" * (MAX_PHASE_BYTES + 1)).to_bytes()
+        try:
+            for phase in phase_list:
+                expected = RE(phase, backend="table")
+                rr = RE.compile(phase)
+                self.assertEqual(rr.table, expected.table)
+                self.assertEqual(rr.len, expected.len)
+                # Nothing needed the graph yet
+                self.assertNotIn("startState", rr.__dict__)
+
+                for _ in range(50):
+                    m = rr.match(CardCollection(Card.from_code(random.randrange(NUM_CARD_CODES)) for _ in range(20)))
+                    self.assertEqual(rr.isFullyAccepted(m.cards), expected.isFullyAccepted(m.cards))
+                    # The bnb method builds the graph on demand
+                    self.assertEqual(rr.score(m.cards, method="bnb"), expected.score(m.cards, method="bnb"))
+                self.assertIn("startState", rr.__dict__)
+        finally:
+            for phase in phase_list:
+                _bundled_tables.pop(phase, None)
+
+    def test_arrange(self):
+        rr = RE.compile("S3+S3+R7+C4")
+        ordered = [Card.from_string(c) for c in "W B3 W R7 B7 W G2 W B4 B5 Y6 W R8 Y8 Y3 W W".split(" ")]
+        self.assertTrue(rr.isFullyAccepted(ordered))
+        for _ in range(20):
+            cards = CardCollection(ordered)
+            random.shuffle(cards)
+            components = rr.arrange(cards)
+            self.assertIsNotNone(components)
+            self.assertEqual([len(component) for component in components], [3, 3, 7, 4])
+            self.assertTrue(rr.isFullyAccepted(list(itertools.chain(*components))))
+            # Every submitted card is used exactly once
+            self.assertEqual(sorted(id(c) for c in itertools.chain(*components)), sorted(id(c) for c in cards))
+
+        # One card too many, one too few, and a card that doesn't fit
+        self.assertIsNone(rr.arrange(CardCollection(ordered + [Card.from_string("R1")])))
+        self.assertIsNone(rr.arrange(CardCollection(ordered[1:])))
+        self.assertIsNone(rr.arrange(CardCollection(ordered[:-1] + [Card.from_string("S")])))
+
+        # Runs are put in rank order with the wilds filling the gaps
+        rr = RE.compile("R4")
+        cards = CardCollection(Card.from_string(c) for c in "R5 W B2 G3".split(" "))
+        self.assertEqual([str(c) for c in rr.arrange(cards)[0]], ["B2", "G3", "W", "R5"])
+
+    def test_multi_phase_solver(self):
+        phase_list = DEFAULT_PHASE_LIST + ["S3+R4+C2", "R4+S3+C2", "C", "S3+S3+R7+C4"]
+        solver = MultiPhaseSolver(phase_list)
+        deck = [Card.from_code(code) for code in range(NUM_CARD_CODES) for _ in range(2)]
+        hands = [CardCollection(random.sample(deck, random.randint(0, 12))) for _ in range(40)]
+
+        batch = solver.score_many(hands)
+        self.assertEqual(batch.shape, (len(phase_list), len(hands)))
+        for j, hand in enumerate(hands):
+            expected = [RE.compile(phase).score(hand) for phase in phase_list]
+            self.assertEqual(solver.scores(hand), expected)
+            self.assertEqual(list(batch[:, j]), expected)
+            index, score = solver.closest(hand)
+            self.assertEqual(score, min(expected))
+            self.assertEqual(index, expected.index(score))
+
+    def test_extension_masks(self):
+        deck_list = [
+            ("S", "R3 W B3"),
+            ("R", "W R4 B5"),
+            ("C", "G2 G9 W"),
+            ("R", "R1 R2 R3 R4 R5 R6 R7 R8 R9 R10 R11 R12"),
+            ("S", ""),
+        ]
+        for phase, deck in deck_list:
+            table = RE.compile(phase).table
+            cards = CardCollection(Card.from_string(c) for c in deck.split(" ") if c)
+            state = table.run(cards)
+            end_mask = table.final_mask(state)
+            start_mask = table.prefix_mask(cards)
+            for code in range(NUM_CARD_CODES):
+                card = Card.from_code(code)
+                self.assertEqual(bool(end_mask >> code & 1), table.isFullyAccepted(cards + [card]), f"{phase} {card}")
+                self.assertEqual(bool(start_mask >> code & 1), table.isFullyAccepted([card] + cards), f"{phase} {card}")
+                # Reading on from the saved state gives the same answer as reading the whole deck again
+                next_state = table.run([card], state) if state >= 0 else -1
+                self.assertEqual(next_state >= 0 and table.final[next_state], table.isFullyAccepted(cards + [card]))
+
+            # The run map updated one card at a time from either side is the one read from the whole deck
+            run_map = table.run_map([])
+            pile = CardCollection()
+            for n, card in enumerate(cards):
+                if n % 2:
+                    run_map = table.run_map([card], run_map)
+                    pile.append(card)
+                else:
+                    run_map = table.prepend_run_map([card], run_map)
+                    pile.insert(0, card)
+                self.assertEqual(run_map, table.run_map(pile), f"{phase} {pile}")
+            self.assertEqual(run_map[table.start], table.run(pile))
+            self.assertEqual(table.start_mask(run_map), table.prefix_mask(pile))
+
+    def test_turn_planner(self):
+        decks = [
+            types.SimpleNamespace(id="run", phase="R", deck=[Card.from_string(c) for c in "R3 R4 R5".split(" ")]),
+            types.SimpleNamespace(id="set", phase="S", deck=[Card.from_string(c) for c in "B7 G7 R7".split(" ")]),
+        ]
+        hand = CardCollection(Card.from_string(c) for c in "R6 B1 S Y7 W R2 G9".split(" "))
+        plan = TurnPlanner(decks).plan(hand)
+        self.assertTrue(plan.exact)
+        # B1 only fits once R2 is down, and G9 only fits after R6 and the wild
+        self.assertEqual(len(plan.put_downs), 6)
+        self.assertEqual(str(plan.discard), "S")
+
+        piles = {deck.id: CardCollection(deck.deck) for deck in decks}
+        for put_down in plan.put_downs:
+            pile = piles[put_down.deck_id]
+            if put_down.direction == "start":
+                pile.insert(0, put_down.card)
+            else:
+                pile.append(put_down.card)
+            phase = "R" if put_down.deck_id == "run" else "S"
+            self.assertTrue(RE.compile(phase).isFullyAccepted(pile), f"{phase} {pile}")
+        self.assertEqual(str(piles["run"][0]), "B1")
+        self.assertEqual(str(piles["run"][-1]), "G9")
+
+        # The index kept by Gamephasedecks is used instead of reading the decks again
+        indexed = []
+        for deck in decks:
+            table = RE.compile(deck.phase).table
+            run_map = table.run_map(deck.deck)
+            indexed.append(
+                types.SimpleNamespace(
+                    id=deck.id,
+                    phase=deck.phase,
+                    deck=deck.deck,
+                    run_map=list(run_map),
+                    start_mask=table.start_mask(run_map),
+                    automaton=table.fingerprint,
+                )
+            )
+        planner = TurnPlanner(indexed)
+        self.assertEqual(planner.states, TurnPlanner(decks).states)
+        self.assertEqual(len(planner._start_masks), len(decks))
+        self.assertEqual(planner.plan(hand).put_downs, plan.put_downs)
+
+        # Emptying the hand doesn't need a discard
+        plan = TurnPlanner(decks).plan(CardCollection([Card.from_string("R6"), Card.from_string("Y7")]))
+        self.assertEqual(len(plan.put_downs), 2)
+        self.assertIsNone(plan.discard)
+
+    def test_completion_probability(self):
+        deck = CardCollection.getNewDeck()
+        for phase in ["S3+R4", "R7", "C7", "S2+C3"]:
+            rr = RE.compile(phase)
+            for _ in range(3):
+                random.shuffle(deck)
+                hand = CardCollection(deck[:10])
+                unseen = unseen_counts(hand + deck[10:40])
+                codes = [code for code in range(NUM_CARD_CODES) if unseen[code]]
+                for draws in (1, 2):
+                    # Add up the probability of every multiset of drawn cards
+                    expected = 0
+                    for drawn in itertools.combinations_with_replacement(codes, draws):
+                        if rr.score(CardCollection(hand + [Card.from_code(code) for code in drawn])) > 0:
+                            continue
+                        ways = 1
+                        for code in set(drawn):
+                            ways *= math.comb(unseen[code], drawn.count(code))
+                        expected += ways
+                    expected /= math.comb(sum(unseen), draws)
+                    self.assertAlmostEqual(completion_probability(rr, hand, unseen, draws), expected, f"{phase}")
+
+        # Nothing left to draw
+        rr = RE.compile("S3+S3")
+        hand = CardCollection(Card.from_string(c) for c in "R1 B1 W R2".split(" "))
+        self.assertEqual(completion_probability(rr, hand, [0] * NUM_CARD_CODES, 3), 0)
+        hand.extend([Card.from_string("G2"), Card.from_string("Y2")])
+        self.assertEqual(completion_probability(rr, hand, [0] * NUM_CARD_CODES, 3), 1)
+
+    def test_phase_difficulty(self):
+        for phase in ["S3+S3", "R7", "C7", "S2+C3"]:
+            rr = RE.compile(phase)
+            turns = simulate_turns(phase, 20, np.random.default_rng(7), max_turns=15)
+            # Replay the same deals one card at a time
+            for deck, turn in zip(deal(np.random.default_rng(7), 20), turns):
+                cards = [Card.from_code(int(code)) for code in deck]
+                expected = next((t for t in range(16) if rr.score(CardCollection(cards[:10 + t])) == 0), 16)
+                self.assertEqual(turn, expected, f"{phase}")
+
+        results = estimate_difficulty(["S4+S4", "S3+R4"], samples=2000, seed=1)
+        self.assertEqual([r["phase"] for r in results], ["S4+S4", "S3+R4"])
+        self.assertGreater(results[0]["expected_turns"], results[1]["expected_turns"])
+        # The same seed deals the same hands
+        again = estimate_difficulty(["S4+S4", "S3+R4"], samples=2000, seed=1)
+        self.assertEqual([r["expected_turns"] for r in results], [r["expected_turns"] for r in again])
+
+    def test_match_cache(self):
+        rr = RE.compile("S3+S3+R7+C4")
+        hand = CardCollection([Card.from_string(c) for c in "R3 B3 Y3 R7 B7 G7 G2 Y3 B4 B5 Y6 R8 Y8 Y11 W W".split(" ")])
+        first = rr.match(hand)
+
+        # The same cards in a different order with different ids
+        other = CardCollection([Card(c.color, c.rank) for c in hand])
+        random.shuffle(other)
+        before = RE.match_cache_info()
+        second = rr.match(other)
+        self.assertEqual(RE.match_cache_info()["hits"], before["hits"] + 1)
+
+        self.assertEqual(second.score, first.score)
+        self.assertEqual([str(c) for c in second.cards], [str(c) for c in first.cards])
+        # The result is made of the caller's cards
+        other_ids = set(c.id for c in other)
+        self.assertEqual(len(set(c.id for c in second.cards)), len(second.cards))
+        self.assertTrue(all(c.id in other_ids for c in second.cards))
+        self.assertTrue(rr.isFullyAccepted(second.cards) or second.score > 0)
+
+    def test_score_table(self):
+        phase_list = ["S3+R4", "R7", "C4"]
+        table = ScoreTable.build(phase_list, max_cards=6)
+        # Only phases made of sets and runs get a table
+        self.assertEqual(sorted(table.tables), ["R7", "S3+R4"])
+
+        deck = [Card.from_code(code) for code in range(NUM_CARD_CODES) for _ in range(2)]
+        hands = [CardCollection(random.sample(deck, random.randint(0, 9))) for _ in range(300)]
+        expected = {phase: [PhaseSolver(phase).solve(hand).score for hand in hands] for phase in table.tables}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "score_tables.bin")
+            table.save(path)
+            loaded = ScoreTable.load(path)
+            loaded.install()
+            try:
+                for phase in loaded.tables:
+                    solver = PhaseSolver(phase)
+                    self.assertEqual([solver.solve(hand).score for hand in hands], expected[phase])
+                    self.assertEqual(list(solver.score_many(hands)), expected[phase])
+                    for hand in hands:
+                        m = solver.solve(hand)
+                        if m.score == 0:
+                            self.assertTrue(RE(phase).isFullyAccepted(m.cards))
+            finally:
+                for phase in loaded.tables:
+                    unregister_score_table(phase)
+                del loaded
+
+            # Names that don't fit in an entry are rejected instead of being cut short
+            long_phase = "+".join(["S2"] * 12)
+            long_path = os.path.join(directory, "long.bin")
+            with self.assertRaises(ValueError):
+                ScoreTable(6, {long_phase: table.tables["R7"]}, {long_phase: 1}).save(long_path)
+            self.assertFalse(os.path.exists(long_path))
+
+            # Files that are cut short, changed, or empty are rejected
+            with open(path, "rb") as f:
+                data = f.read()
+            broken_path = os.path.join(directory, "broken.bin")
+            for broken in [data[:-1], data[:20], data[:-1] + bytes([data[-1] ^ 1]), data + b"\0", b""]:
+                with open(broken_path, "wb") as f:
+                    f.write(broken)
+                with self.assertRaises(Exception):
+                    ScoreTable.load(broken_path)
+
 
 if __name__ == "__main__":
     unittest.main()
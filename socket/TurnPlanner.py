@@ -0,0 +1,175 @@
+import dataclasses
+from typing import Any
+
+from Card import Card, NUM_CARD_CODES, SKIP_CODE, WILD_CODE
+from CardCollection import CardCollection
+from PhaseSolver import SearchBudget, group_by_code, search_stats
+from RE import RE
+
+
+@dataclasses.dataclass(frozen=True)
+class PutDown:
+    """
+    One card put down on a phase deck
+    """
+
+    # The id of the Gamephasedecks row
+    deck_id: Any
+    card: Card
+    # start or end
+    direction: str
+
+
+@dataclasses.dataclass(frozen=True)
+class TurnPlan:
+    """
+    Everything a player who has completed their phase does for the rest of their turn
+    """
+
+    # The put downs in the order they must be made
+    put_downs: tuple[PutDown, ...]
+    # The card to discard at the end of the turn. None if the put downs empty the hand
+    discard: Card | None
+    # The number of positions we evaluated to get the plan
+    explored: int = 0
+    # False if the search ran out of budget. The plan is then the best one found so far
+    exact: bool = True
+
+    @property
+    def num_cards(self) -> int:
+        """
+        :return: the number of cards that leave the hand
+        :rtype: int
+        """
+        return len(self.put_downs) + (self.discard is not None)
+
+
+class TurnPlanner:
+    """
+    Finds the order of put downs which gets rid of the most cards from a hand
+    Each deck is tracked by its run map (see CompiledRE.run_map), which says where every state of its automaton ends
+    up after reading the deck. Putting a card at either end of a deck updates the run map without reading the deck,
+    and the run maps, start masks, and end states kept by Gamephasedecks are used as they are. Cards with the same
+    color and rank are interchangeable, so the search works with card codes and skips positions it has already seen.
+    """
+
+    def __init__(self, decks: list):
+        """
+        :param decks: the phase decks of the game. Anything with an id, phase, and deck like Gamephasedecks
+        :type decks: list[Gamephasedecks]
+        """
+        self.deck_ids = [deck.id for deck in decks]
+        self.tables = [RE.compile(deck.phase).table for deck in decks]
+        self._start_masks: dict[tuple[int, tuple[int, ...]], int] = {}
+        self.run_maps = []
+        for i, (deck, table) in enumerate(zip(decks, self.tables)):
+            run_map = getattr(deck, "run_map", None)
+            # Use the index kept by Gamephasedecks when it belongs to the same automaton
+            if run_map is not None and getattr(deck, "automaton", None) == table.fingerprint:
+                run_map = tuple(run_map)
+                if getattr(deck, "start_mask", None) is not None:
+                    self._start_masks[(i, run_map)] = deck.start_mask
+            else:
+                run_map = table.run_map(deck.deck)
+            self.run_maps.append(run_map)
+
+    @property
+    def states(self) -> list[int]:
+        """
+        :return: the state each automaton ends in after reading its deck
+        :rtype: list[int]
+        """
+        return [run_map[table.start] for run_map, table in zip(self.run_maps, self.tables)]
+
+    def _start_mask(self, i: int, run_map: tuple[int, ...]) -> int:
+        # The codes that can be put at the start of a version of the ith deck
+        key = (i, run_map)
+        mask = self._start_masks.get(key)
+        if mask is None:
+            mask = self._start_masks[key] = self.tables[i].start_mask(run_map)
+        return mask
+
+    def plan(
+        self, card_list: CardCollection, node_budget: int | None = None, time_budget: float | None = None
+    ) -> TurnPlan:
+        """
+        :param card_list: the hand
+        :type card_list: CardCollection
+        :param node_budget: the most positions to evaluate. None means no limit
+        :type node_budget: int | None
+        :param time_budget: the most seconds to spend. None means no limit
+        :type time_budget: float | None
+        :return: the put downs which get rid of the most cards followed by the card to discard
+        :rtype: TurnPlan
+        """
+        by_code = group_by_code(card_list)
+        counts = [len(cards) for cards in by_code]
+        # Skip cards can never be put down
+        placeable = len(card_list) - counts[SKIP_CODE]
+        # Try regular cards before wilds since wilds fit almost anywhere
+        codes = [code for code in range(NUM_CARD_CODES) if code != SKIP_CODE]
+
+        run_maps = list(self.run_maps)
+
+        budget = SearchBudget(node_budget, time_budget)
+        best: list = [[]]
+        moves: list[tuple[int, int, str]] = []
+        seen = set()
+
+        def search(first: int):
+            if len(moves) > len(best[0]):
+                best[0] = list(moves)
+            if len(best[0]) == placeable or len(moves) + sum(counts) - counts[SKIP_CODE] <= len(best[0]):
+                return
+            key = (first, tuple(counts), tuple(run_maps))
+            if key in seen or not budget.spend():
+                return
+            seen.add(key)
+
+            # Put downs on different decks don't affect each other, so every plan can be reordered to finish with
+            # one deck before moving on to the next. We only search plans in that order
+            for i in range(first, len(self.tables)):
+                table = self.tables[i]
+                for code in codes:
+                    if not counts[code]:
+                        continue
+                    run_map = run_maps[i]
+                    state = run_map[table.start]
+                    if state >= 0:
+                        next_state = table.transitions[state * NUM_CARD_CODES + code]
+                        if next_state >= 0 and table.final[next_state]:
+                            counts[code] -= 1
+                            run_maps[i] = tuple(
+                                table.transitions[s * NUM_CARD_CODES + code] if s >= 0 else -1 for s in run_map
+                            )
+                            moves.append((i, code, "end"))
+                            search(i)
+                            moves.pop()
+                            run_maps[i] = run_map
+                            counts[code] += 1
+
+                    if self._start_mask(i, run_map) >> code & 1:
+                        counts[code] -= 1
+                        run_maps[i] = tuple(
+                            run_map[t] if (t := table.transitions[s * NUM_CARD_CODES + code]) >= 0 else -1
+                            for s in range(table.num_states)
+                        )
+                        moves.append((i, code, "start"))
+                        search(i)
+                        moves.pop()
+                        run_maps[i] = run_map
+                        counts[code] += 1
+
+        search(0)
+        search_stats.record(budget)
+
+        put_downs = []
+        for i, code, direction in best[0]:
+            put_downs.append(PutDown(self.deck_ids[i], by_code[code].pop(), direction))
+
+        # Anything left over can't be put down, so get rid of a card that isn't a wild if we can
+        remaining = [card for code in range(NUM_CARD_CODES) for card in by_code[code]]
+        discard = None
+        if remaining:
+            discard = next((card for card in remaining if card.code != WILD_CODE), remaining[0])
+        return TurnPlan(tuple(put_downs), discard, explored=budget.nodes, exact=not budget.exhausted)
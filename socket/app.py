@@ -1,6 +1,7 @@
 import asyncio
 import datetime
 import json
+import os
 import random
 from configparser import ConfigParser
 
@@ -9,11 +10,13 @@ import websockets
 
 from Card import Card, Rank
 from CardCollection import CardCollection
+from CardSet import remove_cards
 from GameMessage import GameMessage
-from Gamephasedecks import Gamephasedecks
+from Gamephasedecks import DIRECTIONS, Gamephasedecks
 from Games import Games
 from Players import Players
-from RE import RE
+from RE import DEFAULT_BUNDLE_FILE, DEFAULT_PHASE_LIST, RE
+from ScoreTable import DEFAULT_FILE as SCORE_TABLE_FILE, ScoreTable
 from Users import Users
 
 DEBUG = False
@@ -22,19 +25,6 @@ connected = set()
 socket_to_player_id = {}
 next_player_list = []
 
-DEFAULT_PHASE_LIST = [
-	"S3+S3",
-	"S3+R4",
-	"S4+R4",
-	"R7",
-	"R8",
-	"R9",
-	"S4+S4",
-	"C7",
-	"S5+S2",
-	"S5+S3",
-]
-
 INITIAL_HAND_SIZE = 10
 
 # Create databases
@@ -71,6 +61,16 @@ if DEBUG:
 
 # create_databases()
 db.create_tables([Users, Games, Players, Gamephasedecks, GameMessage])
+# Columns added after the tables were first created
+db.execute_sql(
+	"""
+alter table gamephasedecks add column if not exists end_state integer;
+alter table gamephasedecks add column if not exists start_mask bigint;
+alter table gamephasedecks add column if not exists end_mask bigint;
+alter table gamephasedecks add column if not exists automaton bigint;
+alter table gamephasedecks add column if not exists run_map json;
+"""
+)
 
 # Create the bots
 for name in set(f"Bot{i + 1}" for i in range(6)) - set(
@@ -317,11 +317,7 @@ def player_action(data):
 			)
 			cards = CardCollection([Card.fromJSONDict(x) for x in data["cards"]])
 			
-			if data["direction"] == "start":
-				deckToTest = CardCollection(cards + gamePhaseDeck.deck)
-			elif data["direction"] == "end":
-				deckToTest = CardCollection(gamePhaseDeck.deck + cards)
-			else:
+			if data["direction"] not in DIRECTIONS:
 				return json.dumps(
 					{
 						"type": "rejection",
@@ -329,25 +325,20 @@ def player_action(data):
 					}
 				)
 			
-			phase = gamePhaseDeck.phase
-			
-			rr = RE(phase)
-			
-			if rr.isFullyAccepted(deckToTest):
+			# The deck keeps the state of its automaton, so only the new cards are checked
+			if gamePhaseDeck.accepts(cards, data["direction"]):
 				# Remove the cards from the player's hand
-				for card in cards:
-					if card not in hand:
-						return json.dumps(
-							{
-								"type": "rejection",
-								"message": f"{str(card)} is not in your hand",
-							}
-						)
-					else:
-						hand.remove(card)
+				missing = remove_cards(hand, cards)
+				if missing is not None:
+					return json.dumps(
+						{
+							"type": "rejection",
+							"message": f"{str(missing)} is not in your hand",
+						}
+					)
 				player.save()
 				
-				gamePhaseDeck.deck = deckToTest
+				gamePhaseDeck.extend(cards, data["direction"])
 				gamePhaseDeck.save()
 			else:
 				return json.dumps(
@@ -367,37 +358,36 @@ def player_action(data):
 				)
 			
 			cards = CardCollection(Card.fromJSONDict(x) for x in data["cards"])
+			# Make sure these cards are in the player's hand
+			remaining = CardCollection(hand)
+			missing = remove_cards(remaining, cards)
+			if missing is not None:
+				return json.dumps(
+					{
+						"type": "rejection",
+						"message": f"This card {missing} is not in your hand!",
+					}
+				)
+			
 			phase = game.phase_list[player.phase_index]
-			rr = RE(phase)
-			if rr.isFullyAccepted(cards):
-				for phase_comp in phase.split("+"):
-					num_cards = int(phase_comp[1:])
-					
-					card_component = CardCollection(cards[:num_cards])
-					# Make sure these cards are in the player's hand
-					for card in card_component:
-						if card not in hand:
-							return json.dumps(
-								{
-									"type": "rejection",
-									"message": f"This card {card} is not in your hand!",
-								}
-							)
-					
-					# Remove the cards from the player's hand
-					for card in card_component:
-						hand.remove(card)
-					player.completed_phase = True
-					cards = CardCollection(cards[num_cards:])
+			rr = RE.compile(phase)
+			# The cards can be sent in any order. They're split into the components of the phase here
+			components = rr.arrange(cards)
+			if components is not None:
+				# Remove the cards from the player's hand
+				hand[:] = remaining
+				for phase_comp, card_component in zip(phase.split("+"), components):
 					# Create a new gamePhaseDeck
 					gamePhaseDeck = Gamephasedecks(
 						game=Games.get_by_id(player.game),
 						phase=phase_comp[:1],
 						deck=card_component,
 					)
+					gamePhaseDeck.refresh_index()
 					gamePhaseDeck.save(force_insert=True)
-					
-					player.save()
+				
+				player.completed_phase = True
+				player.save()
 			
 			else:
 				return json.dumps(
@@ -446,7 +436,7 @@ def player_action(data):
 				)
 		
 		case "discard":
-			card_id = data["card_id"]
+			card_id = Card.normalize_id(data["card_id"])
 			selected_card = None
 			for card in hand:
 				if card.id == card_id:
@@ -941,7 +931,7 @@ def handle_data(data, websocket):
 			# Make sure every phase is valid
 			try:
 				for phase in new_phase:
-					RE(phase)
+					RE.compile(phase)
 			except Exception as e:
 				return json.dumps(
 					{
@@ -1072,8 +1062,11 @@ async def handler(websocket):
 							next_player.user.is_bot
 							and next_player.game.current_player == next_player.user
 						):
-							next_player.make_next_move()
-							handle_data(next_player.make_next_move(), websocket)
+							# The rest of a bot's turn is planned at once and every move is sent before broadcasting
+							for next_move in next_player.make_next_moves():
+								result = json.loads(handle_data(next_move, websocket) or "{}")
+								if result.get("type") == "rejection":
+									break
 							await send_games()
 							await send_users()
 							await send_players()
@@ -1103,8 +1096,10 @@ async def handler(websocket):
 				]
 				
 				for next_player in bot_players_ready_to_go:
-					next_move = next_player.make_next_move()
-					handle_data(next_move, websocket)
+					for next_move in next_player.make_next_moves():
+						result = json.loads(handle_data(next_move, websocket) or "{}")
+						if result.get("type") == "rejection":
+							break
 					await send_games()
 					await send_users()
 					await send_players()
@@ -1122,6 +1117,14 @@ async def handler(websocket):
 
 
 async def main():
+	# Load the compiled default phases if they've been bundled (python RE.py --bundle phases.bundle)
+	# Any other phase is compiled the first time it's used
+	if os.path.exists(DEFAULT_BUNDLE_FILE):
+		RE.load_bundle(DEFAULT_BUNDLE_FILE)
+	# Score hands of the default phases with a lookup if the tables have been built (python ScoreTable.py)
+	if os.path.exists(SCORE_TABLE_FILE):
+		ScoreTable.load(SCORE_TABLE_FILE).install()
+
 	async with websockets.serve(handler, "", 8005):
 		await asyncio.Future()  # run forever
 
@@ -2,11 +2,42 @@ from configparser import ConfigParser
 
 import psycopg2
 
+from CardBytes import CARD_COLUMN_TYPES
+
+# The views over the tables. Dropping or retyping a column they use means dropping them first
+VIEWS = """
+
+        CREATE OR REPLACE VIEW public.players_with_names
+        AS SELECT u.name,
+            p.game_id,
+            p.hand,
+            p.turn_index,
+            p.phase_index,
+            p.skip_cards,
+            p.drew_card,
+            p.completed_phase,
+            p.id
+           FROM players p
+             JOIN users u ON p.user_id = u.id
+          ORDER BY p.game_id, p.turn_index;
+
+        CREATE OR REPLACE VIEW public.completed_games AS select g.id, u."name" as "current player", g.phase_list, g.deck,
+        g."discard", u2."name" as "host", g.in_progress, u3.name as "winner" from games g join users u on
+        g.current_player =u.id join users u2 on u2.id = g.host join users u3 on g.winner = u3.id;
+
+
+        CREATE OR REPLACE VIEW public.noncompleted_games AS select g.id, u."name" as "current player", g.phase_list, g.deck,
+        g."discard", u2."name" as "host", g.in_progress, g.winner from games g join users u on g.current_player = u.id join
+        users u2 on u2.id = g.host where g.winner is null;
+
+        """
+
 
 def create_databases():
     parser = ConfigParser()
     parser.read('database.ini')
     config = dict(parser.items('postgresql'))
+    card_type = CARD_COLUMN_TYPES[parser.get('cards', 'encoding', fallback='json')]
     
     with psycopg2.connect(**config) as conn:
         cur = conn.cursor()
@@ -33,13 +64,13 @@ def create_databases():
             when duplicate_object then null;
         end $$;
         """)
-        cur.execute("""
+        cur.execute(f"""
         
         CREATE TABLE IF NOT EXISTS public.games (
             id uuid NOT NULL,
             phase_list json NOT NULL,
-            deck json NOT NULL,
-            "discard" json NOT NULL,
+            deck {card_type} NOT NULL,
+            "discard" {card_type} NOT NULL,
             current_player uuid NOT NULL,
             host uuid NOT NULL,
             in_progress boolean DEFAULT false NOT NULL,
@@ -54,17 +85,17 @@ def create_databases():
         );
     
         """)
-        cur.execute("""
+        cur.execute(f"""
         CREATE TABLE IF NOT EXISTS public.players (
             id uuid NOT NULL,
             game_id uuid NOT NULL,
             user_id uuid NOT NULL,
-            hand json NOT NULL,
+            hand {card_type} NOT NULL,
             turn_index serial NOT NULL,
             phase_index int NOT NULL,
             drew_card boolean DEFAULT false NOT NULL,
             completed_phase boolean DEFAULT false NOT NULL,
-            skip_cards json NOT NULL,
+            skip_cards {card_type} NOT NULL,
             created_at timestamp NOT NULL,
             updated_at timestamp NOT NULL,
             CONSTRAINT players_pk PRIMARY KEY (id),
@@ -75,12 +106,17 @@ def create_databases():
         CREATE UNIQUE INDEX IF NOT EXISTS players_game_id_turn_index_idx ON public.players (game_id,turn_index);
     
         """)
-        cur.execute("""
+        cur.execute(f"""
         CREATE TABLE IF NOT EXISTS public.gamephasedecks (
             id uuid NOT NULL,
             game_id uuid NOT NULL,
             phase text NOT NULL,
-            deck json NOT NULL,
+            deck {card_type} NOT NULL,
+            end_state int NULL,
+            start_mask bigint NULL,
+            end_mask bigint NULL,
+            automaton bigint NULL,
+            run_map json NULL,
             created_at timestamp NOT NULL,
             updated_at timestamp NOT NULL,
             CONSTRAINT gamephasedecks_pk PRIMARY KEY (id),
@@ -89,32 +125,7 @@ def create_databases():
     
         """)
         
-        cur.execute("""
-
-        CREATE OR REPLACE VIEW public.players_with_names
-        AS SELECT u.name,
-            p.game_id,
-            p.hand,
-            p.turn_index,
-            p.phase_index,
-            p.skip_cards,
-            p.drew_card,
-            p.completed_phase,
-            p.id
-           FROM players p
-             JOIN users u ON p.user_id = u.id
-          ORDER BY p.game_id, p.turn_index;
-
-        CREATE OR REPLACE VIEW public.completed_games AS select g.id, u."name" as "current player", g.phase_list, g.deck,
-        g."discard", u2."name" as "host", g.in_progress, u3.name as "winner" from games g join users u on
-        g.current_player =u.id join users u2 on u2.id = g.host join users u3 on g.winner = u3.id;
-
-
-        CREATE OR REPLACE VIEW public.noncompleted_games AS select g.id, u."name" as "current player", g.phase_list, g.deck,
-        g."discard", u2."name" as "host", g.in_progress, g.winner from games g join users u on g.current_player = u.id join
-        users u2 on u2.id = g.host where g.winner is null;
-
-        """)
+        cur.execute(VIEWS)
         
         conn.commit()
 